@@ -0,0 +1,120 @@
+# apps/sidecar/api/admin.py
+from __future__ import annotations
+import tracemalloc
+from typing import Callable, Literal
+from urllib.parse import parse_qs
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from apps.sidecar.core import profiling
+from apps.sidecar.core.security import require_api_key
+from apps.sidecar.repositories import alerts_repo, buffers
+from apps.sidecar.services.response_cache import get_cache
+
+# Admin-only diagnostics (X-API-Key): request profiles and memory snapshots.
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_api_key)])
+
+@router.get("/profiles")
+def profiles():
+    """Recently profiled requests, newest first."""
+    return {"items": profiling.list_profiles()}
+
+@router.get("/profiles/{profile_id}")
+def profile(
+    profile_id: str,
+    format: Literal["folded", "tree"] = Query("folded", description="folded stacks (text) or JSON call tree"),
+    top: int = Query(20, ge=1, le=200, description="leaf frames listed in tree output"),
+):
+    """One profile: folded stacks for flamegraph.pl / speedscope, or a call tree + top self frames."""
+    record = profiling.get_profile(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown profile id")
+    prof = record["profiler"]
+    if format == "folded":
+        return PlainTextResponse(prof.folded())
+    info = {k: v for k, v in record.items() if k != "profiler"}
+    return {**info, "top_self": prof.top_self(top), "tree": prof.tree()}
+
+@router.post("/tracemalloc/start")
+def tracemalloc_start(frames: int = Query(25, ge=1, le=100)):
+    """Start tracing allocations (only allocations made from now on are attributed)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+@router.post("/tracemalloc/stop")
+def tracemalloc_stop():
+    tracemalloc.stop()
+    return {"tracing": False}
+
+@router.get("/memory")
+def memory(
+    limit: int = Query(20, ge=1, le=200),
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    diff: bool = Query(False, description="rank sites by growth since the previous call"),
+):
+    """
+    Sizes the in-memory structures report about themselves, plus a tracemalloc
+    snapshot (when tracing) attributing allocations to those structures.
+    """
+    return {
+        "accounted": {
+            "buffers": buffers.stats(),
+            "alerts_repo": alerts_repo.stats(),
+            "response_cache": get_cache().stats(),
+        },
+        "tracemalloc": profiling.memory_report(limit=limit, group_by=group_by, diff=diff),
+    }
+
+
+def _wants_profile(scope: dict) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value not in (b"", b"0")
+    if b"profile=" in scope.get("query_string", b""):
+        return parse_qs(scope["query_string"].decode("latin-1")).get("profile", ["0"])[0] not in ("", "0")
+    return False
+
+
+class ProfileMiddleware:
+    """
+    Profiles a single request when it carries `X-Profile: 1` (or `?profile=1`)
+    and a valid X-API-Key. The response is unchanged apart from an
+    `X-Profile-Id` header; fetch the result from /admin/profiles/{id}.
+    One request is profiled at a time; others get `X-Profile-Id: busy`.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        api_key = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"x-api-key"), None)
+        try:
+            await require_api_key(api_key)
+        except HTTPException as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+
+        prof = profiling.try_begin()
+        header = (prof.id if prof is not None else "busy").encode("latin-1")
+        status = 500
+
+        async def _send(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", header)]}
+            await send(message)
+
+        if prof is None:
+            await self.app(scope, receive, _send)
+            return
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profiling.finish(prof, method=scope["method"], path=scope["path"],
+                             query=scope.get("query_string", b"").decode("latin-1"), status=status)
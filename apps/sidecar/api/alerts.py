@@ -1,26 +1,32 @@
 # apps/sidecar/api/alerts.py
 from __future__ import annotations
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request, Response
 from apps.sidecar.models.alerts import AlertsResp
+from apps.sidecar.repositories import alerts_repo
 from apps.sidecar.services import alerts_service as svc
+from apps.sidecar.services.response_cache import cached_json, conditional_response
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
 @router.get("", response_model=AlertsResp)
 def alerts(
+    request: Request,
     sensor_id: str = Query("ai_test", description="Sensor identifier"),
-    window_s: int = Query(600, ge=1, description="Rolling window (seconds) used to detect anomalies"),
-    alpha: float = Query(0.3, ge=0.01, le=0.99, description="EWMA smoothing"),
-    z_thresh: float = Query(3.0, ge=1.0, le=10.0, description="Z-score threshold for anomalies"),
-    limit: int = Query(25, ge=1, le=200, description="Max alerts to return (most recent first)")
-) -> AlertsResp:
+    window_s: int = Query(600, ge=1, deprecated=True, description="Ignored: alerts are detected at ingest"),
+    alpha: float = Query(0.3, ge=0.01, le=0.99, deprecated=True, description="Ignored: alerts are detected at ingest"),
+    z_thresh: float = Query(3.0, ge=1.0, le=10.0, description="Only return alerts with |z| >= z_thresh (alerts are recorded at the ingest threshold)"),
+    after: int | None = Query(None, ge=0, description="Cursor: only alerts recorded or updated since it (use the previous response's `cursor`)"),
+    limit: int = Query(25, ge=1, le=200, description="Max alerts to return")
+) -> Response:
     """
-    Recompute anomalies over the rolling window and return the most recent `limit` alerts.
+    Return alerts from the per-sensor alert log (detected once, at ingest).
+    Without `after`: the most recent `limit`. With `after`: the next `limit` inserted or updated since.
+    Shared across viewers via the response cache; send If-None-Match for a 304.
     """
-    return svc.refresh_and_get(
-        sensor_id,
-        window_s=window_s,
-        alpha=alpha,
-        z_thresh=z_thresh,
-        limit=limit,
+    key = ("alerts", sensor_id, z_thresh, after, limit)
+    body, etag = cached_json(
+        key,
+        alerts_repo.version(sensor_id),
+        lambda: svc.query(sensor_id, z_thresh=z_thresh, after=after, limit=limit),
     )
+    return conditional_response(request, body, etag)
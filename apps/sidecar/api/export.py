@@ -0,0 +1,37 @@
+# apps/sidecar/api/export.py
+from __future__ import annotations
+import re
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from apps.sidecar.core.security import require_api_key
+from apps.sidecar.core.settings import EXPORT_CHUNK_ROWS
+from apps.sidecar.services import export_service
+
+router = APIRouter(prefix="/export", tags=["export"], dependencies=[Depends(require_api_key)])
+
+@router.get("/samples")
+def export_samples(
+    sensor_id: str = Query(..., min_length=1, max_length=128),
+    start_ts: float | None = Query(None, description="Epoch seconds, inclusive; default: oldest stored"),
+    end_ts: float | None = Query(None, description="Epoch seconds, inclusive; default: newest stored"),
+    format: Literal["csv", "npy", "arrow"] = Query("csv", description="csv, npy (one array per chunk) or arrow (IPC stream)"),
+    chunk_rows: int = Query(EXPORT_CHUNK_ROWS, ge=1_000, le=1_000_000, description="Samples per chunk"),
+) -> StreamingResponse:
+    """
+    Raw samples of one sensor over a time range, streamed chunk by chunk
+    (memory stays flat however long the range). Arrow needs pyarrow installed.
+    """
+    if format == "arrow" and not export_service.arrow_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Arrow export needs pyarrow installed; use format=npy or csv",
+        )
+    media_type, ext, _ = export_service.FORMATS[format]
+    filename = re.sub(r"[^A-Za-z0-9._-]+", "_", sensor_id) + "." + ext
+    return StreamingResponse(
+        export_service.export_samples(sensor_id, format, start_ts, end_ts, chunk_rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
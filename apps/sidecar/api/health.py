@@ -3,9 +3,11 @@ from __future__ import annotations
 import time
 from fastapi import APIRouter
 
+from apps.sidecar.workers import retention
+
 router = APIRouter(prefix="/health", tags=["health"])
 
 @router.get("")
 def health():
-    """Simple liveness probe with server timestamp."""
-    return {"status": "ok", "ts": time.time()}
+    """Simple liveness probe with server timestamp (+ last retention pass, if any)."""
+    return {"status": "ok", "ts": time.time(), "retention": retention.last_report()}
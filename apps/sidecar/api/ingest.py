@@ -1,16 +1,18 @@
 from __future__ import annotations
 
+import math
+import queue
 import time
-from typing import Optional
-from fastapi import APIRouter, Depends
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
-from apps.sidecar.repositories.storage.sample_repo import SampleRepo
-from apps.sidecar.repositories.storage.alert_repo import AlertRepo
-from apps.sidecar.core.anomaly import run_predictions
 from apps.sidecar.core.security import require_api_key
-from apps.sidecar.core.settings import ANOMALY_Z_THRESHOLD
-from apps.sidecar.services.notify import notify_alert
+from apps.sidecar.core.settings import INGEST_BATCH_MAX, INGEST_FRAMES_MAX, INGEST_DICT_SIZE_MAX, SAMPLE_BACKEND
+from apps.sidecar.repositories.storage.writer import wait_async
+from apps.sidecar.services import binary_ingest, ingest_service
+from apps.sidecar.services.ingest_service import Reading, submit_grouped, submit_many
 
 router = APIRouter(tags=["ingest"])
 
@@ -19,52 +21,153 @@ class IngestPayload(BaseModel):
     v: float
     t: Optional[float] = Field(None, description="Epoch seconds; defaults to server time")
 
+class IngestBatchPayload(BaseModel):
+    items: List[IngestPayload] = Field(..., min_length=1, max_length=INGEST_BATCH_MAX)
+
+class SensorDictPayload(BaseModel):
+    sensor_ids: List[str] = Field(..., min_length=1, max_length=INGEST_DICT_SIZE_MAX)
+
+async def _submit(readings: List[Reading], wait: bool) -> List[dict]:
+    """Queue readings without blocking the event loop; optionally await the group commit."""
+    # checked here rather than in the models: a 422 echoing a NaN input would not serialise
+    bad = [i for i, (_sid, t, v) in enumerate(readings) if not (math.isfinite(v) and math.isfinite(t) and t >= 0)]
+    if bad:
+        raise HTTPException(status_code=422, detail=f"v must be finite and t finite and >= 0 (items {bad[:5]})")
+    sensor_ids = {sensor_id for sensor_id, _t, _v in readings}
+    if ingest_service.cold(sensor_ids):
+        # first reading of a sensor in this process: seeding reads SQLite
+        await run_in_threadpool(ingest_service.warm, sensor_ids)
+    try:
+        if SAMPLE_BACKEND == "segments":
+            # segment appends (and fdatasync) run in the caller
+            items, futures = await run_in_threadpool(submit_many, readings, block=False)
+        else:
+            items, futures = submit_many(readings, block=False)
+    except queue.Full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Write queue full, retry later",
+        )
+    if wait:
+        await wait_async(futures)
+    return items
+
 @router.post("/ingest")
 async def ingest_reading(
     payload: IngestPayload,
+    wait: bool = Query(True, description="Ack only after the sample is committed"),
     _auth: None = Depends(require_api_key),
 ):
     """
     Ingest a single reading. Minimal behavior:
-      1) Append sample to SQLite
-      2) Recompute z on recent window
-      3) If |z_last| >= threshold, persist an alert
-    Returns a tiny ack so devices can confirm write.
+      1) Queue sample for the SQLite writer (group commit)
+      2) Update the sensor's streaming detector (O(1), no history re-read)
+      3) Feed the sensor's alert episode (opened once |z| >= threshold)
+    Returns a tiny ack so devices can confirm write (`durable` tells whether
+    the commit was awaited).
     """
-    sensor_id = payload.sensor_id
     t = float(payload.t) if payload.t is not None else time.time()
-    v = float(payload.v)
+    items = await _submit([(payload.sensor_id, t, float(payload.v))], wait)
+    return {"ok": True, "durable": wait, **items[0]}
 
-    samples = SampleRepo()
-    alerts = AlertRepo()
-
-    # 1) write sample
-    samples.add_sample(sensor_id, t, v)
-
-    # 2) recompute on recent history (keep it small for fast writes)
-    series = samples.get_series(sensor_id=sensor_id, start_ts=None, end_ts=None, limit=600)
-    ts = [tv[0] for tv in series]
-    vals = [tv[1] for tv in series]
-    preds, _fts, _fp, _idx, z = run_predictions(ts, vals, window_s=600, alpha=0.3, future_steps=0)
+@router.post("/ingest/batch")
+async def ingest_batch(
+    payload: IngestBatchPayload,
+    wait: bool = Query(True, description="Ack only after the batch is committed"),
+    _auth: None = Depends(require_api_key),
+):
+    """
+    Ingest many readings in one request (e.g. a gateway flushing its buffer).
+    One auth check, one multi-row insert, one scoring pass.
+    Returns per-item z / alerted in input order.
+    """
+    now = time.time()
+    readings = [
+        (it.sensor_id, float(it.t) if it.t is not None else now, float(it.v))
+        for it in payload.items
+    ]
+    items = await _submit(readings, wait)
+    return {
+        "ok": True,
+        "durable": wait,
+        "count": len(items),
+        "alerted": sum(1 for it in items if it["alerted"]),
+        "items": items,
+    }
 
-    # 3) optional alert
-    z_last = z[-1] if z else 0.0
-    alerted = False
-    if abs(z_last) >= ANOMALY_Z_THRESHOLD:
-        msg = f"ingest anomaly z={z_last:.2f}"
-        alerts.add_alert(sensor_id=sensor_id, t=t, v=v, z=z_last, msg=msg)
-        # best-effort fanout (email/webhook); do not block request if it fails
-        try:
-            notify_alert(sensor_id=sensor_id, t=t, v=v, z=z_last, msg=msg)
-        except Exception:
-            pass
-        alerted = True
+@router.post("/ingest/dict")
+def register_sensor_dict(
+    payload: SensorDictPayload,
+    _auth: None = Depends(require_api_key),
+):
+    """
+    Register the sensor ids a device will reference by index in binary
+    frames. Returns the dictionary id to send as `X-Sensor-Dict`.
+    Idempotent: the same list always yields the same id.
+    """
+    bad = [sid for sid in payload.sensor_ids if not 1 <= len(sid) <= 128]
+    if bad:
+        raise HTTPException(status_code=422, detail=f"sensor ids must be 1-128 characters: {bad[:5]}")
+    return {"dict_id": binary_ingest.register(payload.sensor_ids), "size": len(payload.sensor_ids)}
 
+def _submit_frames(did: str, body: bytearray) -> dict:
+    """
+    Resolve the dictionary, decode and queue the frames. Runs in the threadpool:
+    the dictionary may come from SQLite, and the per-reading detector pass over
+    a large body would otherwise hold the event loop.
+    """
+    names = binary_ingest.lookup(did)
+    if names is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Unknown sensor dictionary; register it with POST /ingest/dict",
+        )
+    try:
+        groups = binary_ingest.decode(body, names)
+    except binary_ingest.FrameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        alerted, futures = submit_grouped(groups, block=False)
+    except queue.Full:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Write queue full, retry later",
+        )
+    count = sum(ts.size for _sid, ts, _vs in groups)
     return {
-        "ok": True,
-        "sensor_id": sensor_id,
-        "t": t,
-        "v": v,
-        "z": z_last,
+        "count": count,
+        "dropped": len(body) // binary_ingest.FRAME_DTYPE.itemsize - count,
+        "sensors": len(groups),
         "alerted": alerted,
+        "futures": futures,
     }
+
+@router.post("/ingest/frames")
+async def ingest_frames(
+    request: Request,
+    x_sensor_dict: str = Header(..., description="Id returned by POST /ingest/dict"),
+    wait: bool = Query(True, description="Ack only after the readings are committed"),
+    _auth: None = Depends(require_api_key),
+):
+    """
+    Binary ingest: the body is back-to-back little-endian 20-byte frames
+    (u32 sensor index, f64 t, f64 v; t=NaN means server time), decoded
+    without JSON or per-reading models. Returns counts only; `dropped`
+    frames had a non-finite v or an infinite/negative t.
+    """
+    max_bytes = INGEST_FRAMES_MAX * binary_ingest.FRAME_DTYPE.itemsize
+    too_large = HTTPException(status_code=413, detail=f"At most {INGEST_FRAMES_MAX} frames per request")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise too_large
+    # chunked / lying clients: cap while reading instead of buffering everything first
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    result = await run_in_threadpool(_submit_frames, x_sensor_dict, body)
+    futures = result.pop("futures")
+    if wait:
+        await wait_async(futures)
+    return {"ok": True, "durable": wait, **result}
@@ -0,0 +1,61 @@
+# apps/sidecar/api/metrics.py
+from __future__ import annotations
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from apps.sidecar.core import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def scrape() -> PlainTextResponse:
+    """Prometheus text exposition of this process's metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency. Routes are labelled by
+    their template ("/alerts", "/static") rather than the raw path, so label
+    cardinality stays bounded; unrouted requests (404s) share "unmatched".
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+        self._routes: Optional[Dict[Any, str]] = None
+
+    def _route(self, scope: dict) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None or endpoint not in self._routes:
+            # the router stores the matched route's endpoint (or mounted app) in the scope
+            self._routes = {
+                getattr(r, "endpoint", None) or getattr(r, "app", None): r.path
+                for r in scope["app"].routes
+            }
+            self._routes.setdefault(endpoint, "unmatched")
+        return self._routes[endpoint]
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def _send(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            metrics.HTTP_REQUEST_SECONDS.labels(scope["method"], self._route(scope), status).observe(
+                time.perf_counter() - start
+            )
@@ -1,20 +1,89 @@
 # apps/sidecar/api/predictive.py
 from __future__ import annotations
-from fastapi import APIRouter, Query
-from apps.sidecar.models.predictive import SeriesResp
-from apps.sidecar.services.predictive_service import get_series, ingest_point
+import fnmatch
+import time
+from typing import List, Literal
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from apps.sidecar.core.settings import FLEET_MAX_SENSORS
+from apps.sidecar.models.predictive import FleetResp, HistoryResp, SeriesResp
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.services.predictive_service import get_fleet_series, get_history, get_series, ingest_point
+from apps.sidecar.services.response_cache import cached_json, conditional_response
 
 router = APIRouter(prefix="/predictive", tags=["predictive"])
 
 @router.get("/series", response_model=SeriesResp)
 def series(
+    request: Request,
     sensor_id: str = Query("ai_test"),
     window_s: int = Query(600, ge=1, description="Rolling window size in seconds"),
     alpha: float = Query(0.3, ge=0.01, le=0.99, description="EWMA smoothing factor"),
-    future_steps: int = Query(30, ge=0, description="How many future points to predict")
-) -> SeriesResp:
-    """Return rolling predictive overlay for one sensor."""
-    return get_series(sensor_id, window_s, alpha, future_steps)
+    future_steps: int = Query(30, ge=0, description="How many future points to predict"),
+    max_points: int | None = Query(None, ge=10, le=100_000, description="Downsample observed points to about this many (anomalies always kept)"),
+    downsample: Literal["lttb", "minmax"] = Query("lttb", description="Downsampling algorithm when max_points is set"),
+) -> Response:
+    """
+    Return rolling predictive overlay for one sensor.
+    Shared across viewers via the response cache; send If-None-Match for a 304.
+    """
+    key = ("series", sensor_id, window_s, alpha, future_steps, max_points, downsample)
+    body, etag = cached_json(
+        key,
+        sample_store.version(sensor_id),
+        lambda: get_series(sensor_id, window_s, alpha, future_steps, max_points=max_points, downsample=downsample),
+    )
+    return conditional_response(request, body, etag)
+
+@router.get("/fleet", response_model=FleetResp)
+def fleet(
+    request: Request,
+    sensor_id: List[str] = Query([], description="Repeat to select several sensors"),
+    pattern: str | None = Query(None, description="Glob over known sensors, e.g. 'pump-*.flow'"),
+    prefix: str | None = Query(None, description="Select every known sensor starting with this"),
+    window_s: int = Query(600, ge=1, description="Rolling window size in seconds"),
+    alpha: float = Query(0.3, ge=0.01, le=0.99, description="EWMA smoothing factor"),
+    future_steps: int = Query(30, ge=0, description="How many future points to predict"),
+    max_points: int | None = Query(None, ge=10, le=100_000, description="Downsample each sensor to about this many points"),
+    downsample: Literal["lttb", "minmax"] = Query("lttb", description="Downsampling algorithm when max_points is set"),
+) -> Response:
+    """
+    Predictive overlay for many sensors in one request (fleet / wall views).
+    Selection is the union of `sensor_id`s, `pattern` and `prefix` matches.
+    All sensors are scored in one vectorized pass; cached like /series.
+    """
+    selected = dict.fromkeys(sensor_id)
+    if pattern is not None or prefix is not None:
+        for sid in sorted(sample_store.sensors()):
+            if (pattern is not None and fnmatch.fnmatchcase(sid, pattern)) or (
+                prefix is not None and sid.startswith(prefix)
+            ):
+                selected.setdefault(sid)
+    sensors = list(selected)
+    if not sensors:
+        raise HTTPException(status_code=400, detail="Select sensors with sensor_id, pattern or prefix")
+    if len(sensors) > FLEET_MAX_SENSORS:
+        raise HTTPException(status_code=400, detail=f"Too many sensors ({len(sensors)} > {FLEET_MAX_SENSORS})")
+    key = ("fleet", tuple(sensors), window_s, alpha, future_steps, max_points, downsample)
+    body, etag = cached_json(
+        key,
+        tuple(sample_store.version(sid) for sid in sensors),
+        lambda: get_fleet_series(sensors, window_s, alpha, future_steps, max_points=max_points, downsample=downsample),
+    )
+    return conditional_response(request, body, etag)
+
+@router.get("/history", response_model=HistoryResp)
+def history(
+    sensor_id: str = Query("ai_test"),
+    window_s: int = Query(86_400, ge=60, le=90 * 86_400, description="Range length in seconds, ending at `end`"),
+    end: float | None = Query(None, description="Range end (UNIX seconds); defaults to now"),
+    max_points: int = Query(1000, ge=10, le=100_000, description="Point budget; picks raw, 1m or 1h resolution to fit"),
+) -> HistoryResp:
+    """
+    Stored history for trend charts (24h, 7d, ...). Reads pre-aggregated 1m/1h
+    rollups once raw samples would exceed `max_points`.
+    """
+    end_ts = time.time() if end is None else end
+    return get_history(sensor_id, end_ts - window_s, end_ts, max_points)
 
 @router.post("/ingest")
 def ingest(sensor_id: str, v: float, t: float | None = None):
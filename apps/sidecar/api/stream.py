@@ -0,0 +1,50 @@
+# apps/sidecar/api/stream.py
+from __future__ import annotations
+import asyncio
+import json
+from typing import List
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from apps.sidecar.core.settings import STREAM_HEARTBEAT_S
+from apps.sidecar.services.stream_hub import DROPPED, get_hub
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+@router.get("")
+async def stream(
+    request: Request,
+    sensor_id: List[str] = Query(["ai_test"], description="Repeat to subscribe to several sensors"),
+):
+    """
+    Server-Sent Events feed of live data for the given sensors.
+    Events: `sample` {sensor_id, t, v, pred, z} and `alert` {sensor_id, t, v, z, msg, n, last_t, active},
+    pushed when an alert episode opens and again when it closes.
+    Slow clients whose backlog overflows get a final `dropped` event and are
+    disconnected (EventSource reconnects on its own).
+    """
+    hub = get_hub()
+    sub = hub.subscribe(sensor_id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    name, data = await asyncio.wait_for(sub.queue.get(), timeout=STREAM_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+                if (name, data) == DROPPED:
+                    break
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,342 @@
+# apps/sidecar/bench.py
+"""
+Offline benchmark suite for the sidecar hot paths.
+
+    python -m apps.sidecar.bench                         # full run, JSON to stdout
+    python -m apps.sidecar.bench --quick --out bench.json
+    python -m apps.sidecar.bench --baseline bench.json   # compare, flag regressions
+
+Everything runs in-process against a throwaway data dir (no network, no
+running server, startup hooks not fired). Inputs are seeded, so runs are
+comparable across commits and machines. Each case reports latency
+percentiles and throughput; with --baseline the p50 of every shared case is
+compared and cases slower by more than --threshold are listed as regressions
+(exit code 1 with --fail-on-regression).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+_TOKEN = "bench-token"
+_SEED = 1234
+
+
+def _isolate() -> str:
+    """Point settings at a fresh data dir; must run before any apps.sidecar import."""
+    data_dir = tempfile.mkdtemp(prefix="sidecar-bench-")
+    os.environ["SIDECAR_DATA_DIR"] = data_dir
+    os.environ["SIDECAR_DB_PATH"] = os.path.join(data_dir, "sidecar.db")
+    os.environ["SIDECAR_CORTEX_DB_PATH"] = os.path.join(data_dir, "cortex.db")
+    os.environ["SIDECAR_API_TOKEN"] = _TOKEN
+    os.environ["SIDECAR_EMAIL_ENABLED"] = "0"
+    os.environ["SIDECAR_WEBHOOK_ENABLED"] = "0"
+    return data_dir
+
+
+# ---------- measurement ------------------------------------------------------
+
+def _stats(samples_ns: List[int], ops_per_call: int = 1, wall_s: Optional[float] = None) -> Dict[str, float]:
+    arr = np.asarray(samples_ns, dtype=np.float64) / 1e6  # ms
+    total_s = wall_s if wall_s is not None else float(arr.sum()) / 1e3
+    return {
+        "n": int(arr.size),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p99_ms": round(float(np.percentile(arr, 99)), 4),
+        "mean_ms": round(float(arr.mean()), 4),
+        "ops_s": round(arr.size * ops_per_call / total_s, 1) if total_s > 0 else None,
+    }
+
+
+def _time(fn: Callable[[], Any], repeat: int, warmup: int = 2) -> List[int]:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn()
+        out.append(time.perf_counter_ns() - t0)
+    return out
+
+
+# ---------- cases ------------------------------------------------------------
+
+def bench_ingest(results: Dict[str, Any], quick: bool) -> None:
+    """POST /ingest (+ /ingest/batch) through the ASGI app, sequential and concurrent."""
+    import httpx
+    from fastapi.testclient import TestClient
+    from apps.sidecar.main import app
+
+    n = 300 if quick else 2000
+    headers = {"X-API-Key": _TOKEN}
+    client = TestClient(app)  # no `with`: startup hooks (simulator etc.) stay off
+    rng = np.random.default_rng(_SEED)
+    t0 = 1_700_000_000.0
+
+    for wait in (True, False):
+        vals = rng.normal(50.0, 1.0, n + 2)
+        i = iter(range(n + 2))
+
+        def post() -> None:
+            k = next(i)
+            r = client.post(f"/ingest?wait={'true' if wait else 'false'}", headers=headers,
+                            json={"sensor_id": f"bench-ingest-{wait}", "t": t0 + k, "v": float(vals[k])})
+            assert r.status_code == 200, r.text
+
+        start = time.perf_counter()
+        samples = _time(post, n)
+        results[f"ingest.single.sequential.wait={str(wait).lower()}"] = {
+            **_stats(samples, wall_s=time.perf_counter() - start), "params": {"requests": n},
+        }
+
+    batch = 100
+    nb = 20 if quick else 100
+    j = iter(range(nb + 2))
+
+    def post_batch() -> None:
+        k = next(j)
+        items = [{"sensor_id": "bench-batch", "t": t0 + k * batch + m, "v": 50.0 + (m % 7)} for m in range(batch)]
+        r = client.post("/ingest/batch", headers=headers, json={"items": items})
+        assert r.status_code == 200, r.text
+
+    start = time.perf_counter()
+    samples = _time(post_batch, nb)
+    results["ingest.batch100.sequential"] = {
+        **_stats(samples, ops_per_call=batch, wall_s=time.perf_counter() - start),
+        "params": {"requests": nb, "batch": batch},
+    }
+
+    # concurrent single-reading requests: exercises the writer's group commit
+    conc = 16
+
+    async def drive() -> Dict[str, Any]:
+        transport = httpx.ASGITransport(app=app)
+        lat: List[int] = []
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as ac:
+            counter = iter(range(n))
+
+            async def worker(w: int) -> None:
+                for k in counter:
+                    s = time.perf_counter_ns()
+                    r = await ac.post("/ingest", headers=headers,
+                                      json={"sensor_id": f"bench-conc-{w}", "t": t0 + k, "v": 50.0})
+                    lat.append(time.perf_counter_ns() - s)
+                    assert r.status_code == 200, r.text
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(w) for w in range(conc)))
+            wall = time.perf_counter() - start
+        return {**_stats(lat, wall_s=wall), "params": {"requests": n, "concurrency": conc}}
+
+    results[f"ingest.single.concurrent{conc}"] = asyncio.run(drive())
+
+
+def bench_sample_repo(results: Dict[str, Any], quick: bool) -> None:
+    """SampleRepo.add_sample / get_series as storage grows, for the SQLite and segment backends."""
+    from apps.sidecar.repositories.storage.sample_repo import SqliteSampleRepo
+    from apps.sidecar.repositories.storage.segment_repo import SegmentSampleRepo
+
+    backends = [
+        ("repo", SqliteSampleRepo()),
+        ("repo.segments", SegmentSampleRepo(os.path.join(os.environ["SIDECAR_DATA_DIR"], "bench-segments"))),
+    ]
+    sizes = [1_000, 10_000] if quick else [1_000, 10_000, 100_000, 1_000_000]
+    repeat = 50 if quick else 200
+    sensor = "bench-repo"
+    t0 = 1_600_000_000.0
+    for prefix, repo in backends:
+        rng = np.random.default_rng(_SEED)
+        filled = 0
+        for idx, size in enumerate(sizes):
+            # grow storage with a few other sensors mixed in (realistic index shape)
+            while filled < size:
+                m = min(50_000, size - filled)
+                vals = rng.normal(50.0, 1.0, m)
+                repo.add_samples(
+                    (sensor if k % 4 == 0 else f"bench-other-{k % 4}", t0 + filled + k, float(vals[k]))
+                    for k in range(m)
+                )
+                filled += m
+            tail = [t0 + 1e8 * (idx + 1)]  # appended rows stay clear of later fills
+
+            def add() -> None:
+                tail[0] += 1.0
+                repo.add_sample(sensor, tail[0], 50.0)
+
+            results[f"{prefix}.add_sample.rows={size}"] = {**_stats(_time(add, repeat)), "params": {"rows": size}}
+            results[f"{prefix}.get_series.limit600.rows={size}"] = {
+                **_stats(_time(lambda: repo.get_series(sensor, limit=600), repeat)),
+                "params": {"rows": size, "limit": 600},
+            }
+            results[f"{prefix}.get_series.range4h.rows={size}"] = {
+                **_stats(_time(lambda: repo.get_series(sensor, t0, t0 + 3600 * 4), repeat)),
+                "params": {"rows": size, "range_s": 3600 * 4},
+            }
+
+
+def bench_detection(results: Dict[str, Any], quick: bool) -> None:
+    """Batch anomaly math across series lengths / windows."""
+    from apps.sidecar.core.anomaly import run_predictions
+    from apps.sidecar.predictive.predictive import analyze_series
+
+    rng = np.random.default_rng(_SEED)
+    sizes = [600, 2_000, 10_000] if not quick else [600, 10_000]
+    repeat = 10 if quick else 30
+    for n in sizes:
+        ts = np.arange(n, dtype=np.float64)
+        vals = 50.0 + np.sin(ts / 30.0) + rng.normal(0.0, 0.3, n)
+        ts_l, vals_l = ts.tolist(), vals.tolist()
+        for window in (60, 600):
+            results[f"detect.run_predictions.n={n}.window={window}"] = {
+                **_stats(_time(lambda: run_predictions(ts, vals, window, 0.3, 30), repeat)),
+                "params": {"n": n, "window": window},
+            }
+        results[f"detect.analyze_series.n={n}"] = {
+            **_stats(_time(lambda: analyze_series(ts_l, vals_l, alpha=0.3, future_steps=30), repeat)),
+            "params": {"n": n},
+        }
+
+
+def bench_series(results: Dict[str, Any], quick: bool) -> None:
+    """GET /predictive/series vs buffer size and sensor count (cold = fresh data each call)."""
+    from fastapi.testclient import TestClient
+    from apps.sidecar.main import app
+    from apps.sidecar.repositories import buffers
+
+    client = TestClient(app)
+    rng = np.random.default_rng(_SEED)
+    sizes = [1_000, 10_000]
+    sensor_counts = [1, 10] if quick else [1, 10, 50]
+    repeat = 20 if quick else 60
+    for size in sizes:
+        for count in sensor_counts:
+            now = time.time()
+            sensors = [f"bench-series-{size}-{count}-{k}" for k in range(count)]
+            for sid in sensors:
+                ts = now - size + np.arange(size, dtype=np.float64)
+                buffers.extend(sid, ts.tolist(), (50.0 + rng.normal(0.0, 1.0, size)).tolist())
+            for max_points in (None, 1000):
+                step = iter(range(10**9))
+
+                def get() -> None:
+                    k = next(step)
+                    sid = sensors[k % count]
+                    buffers.append(sid, time.time(), 50.0)  # new version: defeats the response cache
+                    params = {"sensor_id": sid, "window_s": size + 60}
+                    if max_points:
+                        params["max_points"] = max_points
+                    r = client.get("/predictive/series", params=params)
+                    assert r.status_code == 200, r.text
+
+                results[f"series.points={size}.sensors={count}.max_points={max_points}"] = {
+                    **_stats(_time(get, repeat)),
+                    "params": {"points": size, "sensors": count, "max_points": max_points},
+                }
+        # cached path: same version, If-None-Match → 304
+        sid = f"bench-series-{size}-1-0"
+        first = client.get("/predictive/series", params={"sensor_id": sid, "window_s": size + 60})
+        etag = first.headers.get("etag")
+        results[f"series.points={size}.cached304"] = {
+            **_stats(_time(lambda: client.get(
+                "/predictive/series",
+                params={"sensor_id": sid, "window_s": size + 60},
+                headers={"If-None-Match": etag},
+            ), repeat)),
+            "params": {"points": size},
+        }
+
+
+SUITES: Dict[str, Callable[[Dict[str, Any], bool], None]] = {
+    "ingest": bench_ingest,
+    "repo": bench_sample_repo,
+    "detect": bench_detection,
+    "series": bench_series,
+}
+
+
+# ---------- reporting --------------------------------------------------------
+
+def _meta(quick: bool) -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             timeout=5).stdout.strip() or None
+    except Exception:
+        rev = None
+    return {
+        "ts": time.time(),
+        "git": rev,
+        "quick": quick,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """p50 ratio (current / baseline) for every case present in both runs."""
+    cases = {}
+    regressions = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = cur["p50_ms"] / base["p50_ms"]
+        cases[name] = {"baseline_p50_ms": base["p50_ms"], "p50_ms": cur["p50_ms"], "ratio": round(ratio, 3)}
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+    return {"baseline_git": baseline.get("meta", {}).get("git"), "threshold": threshold,
+            "cases": cases, "regressions": regressions}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m apps.sidecar.bench", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--only", action="append", choices=sorted(SUITES), help="Run only these suites (repeatable)")
+    ap.add_argument("--quick", action="store_true", help="Smaller sizes / fewer repeats (CI smoke)")
+    ap.add_argument("--out", help="Write JSON results here (default: stdout)")
+    ap.add_argument("--baseline", help="Previous JSON results to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown before flagging (0.10 = 10%%)")
+    ap.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when any case regresses")
+    args = ap.parse_args(argv)
+
+    data_dir = _isolate()
+    results: Dict[str, Any] = {}
+    for name in args.only or list(SUITES):
+        print(f"[bench] {name} ...", file=sys.stderr)
+        SUITES[name](results, args.quick)
+
+    from apps.sidecar.repositories.storage.writer import close_writer
+    close_writer()
+
+    report: Dict[str, Any] = {"meta": {**_meta(args.quick), "data_dir": data_dir}, "results": results}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.threshold)
+        for name in report["comparison"]["regressions"]:
+            c = report["comparison"]["cases"][name]
+            print(f"[bench] REGRESSION {name}: {c['baseline_p50_ms']} -> {c['p50_ms']} ms (x{c['ratio']})",
+                  file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.fail_on_regression and report.get("comparison", {}).get("regressions"):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
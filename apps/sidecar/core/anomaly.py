@@ -1,53 +1,176 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+from typing import List, Sequence, Tuple, Union
 import math
 
-def ewma(series: List[float], alpha: float) -> List[float]:
-    """Simple EWMA baseline."""
-    if not series:
-        return []
-    out = [series[0]]
-    a = float(alpha)
-    for x in series[1:]:
-        out.append(a * x + (1 - a) * out[-1])
+import numpy as np
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+# Largest growth factor allowed inside one EWMA block (see ewma_filter)
+_EWMA_BLOCK_RANGE = 1e150
+
+def ewma_filter(x: np.ndarray, alpha: float, init: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Vectorized recursive filter out[0] = init, out[i] = a*x[i] + (1-a)*out[i-1],
+    along the last axis (2-D input filters every row at once; `init` per row).
+    Within a block starting after `prev`:
+        out[s+m] = d^(m+1)*prev + a*d^m * cumsum(x[s+k] * d^-k)[m],   d = 1-a
+    Blocks are cut so d^-k stays below _EWMA_BLOCK_RANGE (no overflow). The
+    filter runs on x - init (then shifts back): a large constant offset adds no
+    rounding, and a series that stays at init comes out exactly init, as in
+    the sequential loop.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    if n == 0:
+        return np.empty(x.shape, dtype=np.float64)
+    base = np.asarray(init, dtype=np.float64)[..., None]
+    out = _ewma_centered(x - base, float(alpha))
+    out += base
+    return out
+
+def _ewma_centered(x: np.ndarray, a: float) -> np.ndarray:
+    # ewma_filter with init = 0
+    n = x.shape[-1]
+    out = np.empty(x.shape, dtype=np.float64)
+    d = 1.0 - a
+    out[..., 0] = 0.0
+    if n == 1:
+        return out
+    if not 0.0 < d < 1.0:
+        # alpha outside (0, 1): no decay to exploit, run the recurrence as is
+        for i in range(1, n):
+            out[..., i] = a * x[..., i] + d * out[..., i - 1]
+        return out
+    block = max(1, int(math.log(_EWMA_BLOCK_RANGE) / -math.log(d)))
+    k = np.arange(block, dtype=np.float64)
+    inv_pow = d ** -k            # d^-k
+    pow_m = d ** k               # d^m
+    pow_m1 = pow_m * d           # d^(m+1)
+    prev = out[..., 0:1].copy()
+    for s in range(1, n, block):
+        e = min(n, s + block)
+        m = e - s
+        acc = np.cumsum(x[..., s:e] * inv_pow[:m], axis=-1)
+        seg = pow_m1[:m] * prev + a * pow_m[:m] * acc
+        out[..., s:e] = seg
+        prev = seg[..., -1:]
     return out
 
-def z_scores(vals: List[float], baseline: List[float], window_s: int) -> List[float]:
+def ewma(series: ArrayLike, alpha: float) -> np.ndarray:
+    """Simple EWMA baseline."""
+    y = np.asarray(series, dtype=np.float64)
+    if y.size == 0:
+        return y
+    return ewma_filter(y, alpha, y[..., 0])
+
+def rolling_mean_std(
+    x: ArrayLike, w: Union[int, np.ndarray], start: Union[int, np.ndarray] = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and sample variance (ddof=1, floor of 1 in the denominator) of the
+    trailing window x[max(start, i-w+1) : i+1] for every i, via cumulative sums,
+    along the last axis. For 2-D input `w` and `start` may be per row (rows
+    left-padded up to `start`; values before it are ignored).
+    Safeguards: data is centered on its mean before squaring (keeps the sums
+    small so E[x^2]-E[x]^2 does not cancel) and negative variances from
+    rounding are clipped to 0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    if n == 0:
+        return x.copy(), x.copy()
+    start = np.asarray(start)[..., None]
+    w = np.asarray(w)
+    col = np.arange(n)
+    if not start.any():
+        shift = x.mean(axis=-1, keepdims=True)
+        c = x - shift
+    else:
+        valid = col >= start
+        shift = np.where(valid, x, 0.0).sum(axis=-1, keepdims=True) / np.maximum(1, valid.sum(axis=-1, keepdims=True))
+        c = np.where(valid, x - shift, 0.0)  # zero padding: prefix sums stay 0 up to `start`
+    s1 = np.cumsum(c, axis=-1)
+    s2 = np.cumsum(c * c, axis=-1)
+    # window sum = s[i] - s[i-w]; slicing per distinct w (rows shorter than the window differ)
+    sum1, sum2 = s1.copy(), s2.copy()
+    if w.ndim == 0:
+        groups = [(int(w), Ellipsis)]
+    else:
+        groups = [(int(wk), w == wk) for wk in np.unique(w)]
+    for wk, rows in groups:
+        if wk < n:
+            sum1[rows, wk:] -= s1[rows, :-wk]
+            sum2[rows, wk:] -= s2[rows, :-wk]
+    cnt = np.maximum(1, np.minimum(col + 1 - start, w[..., None])).astype(np.float64)
+    mean_c = sum1 / cnt
+    var = (sum2 - sum1 * mean_c) / np.maximum(1.0, cnt - 1.0)
+    np.maximum(var, 0.0, out=var)
+    return mean_c + shift, var
+
+def _window_len(n: Union[int, np.ndarray], window_s: int) -> Union[int, np.ndarray]:
+    # fallback if caller passes seconds; UI already passes 600
+    return np.maximum(5, np.minimum(n, int(window_s)))
+
+def _safe_sd(var: np.ndarray) -> np.ndarray:
+    # sd with the same epsilon floor as the original loop
+    sd = np.sqrt(var)
+    sd[var <= 1e-9] = 1e-6
+    return sd
+
+def z_scores(vals: ArrayLike, baseline: ArrayLike, window_s: int) -> np.ndarray:
     """
     Z scores based on residuals using a rolling std over the same window length (samples).
     Assumes vals and baseline are aligned and same length.
     """
-    n = len(vals)
+    v = np.asarray(vals, dtype=np.float64)
+    n = v.size
     if n == 0:
-        return []
+        return v.copy()
     # crude rolling std over residuals with a minimum epsilon
-    res = [vals[i] - baseline[i] for i in range(n)]
-    w = max(5, min(n, int(window_s)))  # fallback if caller passes seconds; UI already passes 600
-    out: List[float] = []
-    for i in range(n):
-        lo = max(0, i - w + 1)
-        window = res[lo : i + 1]
-        mu = sum(window) / len(window)
-        var = sum((r - mu) ** 2 for r in window) / max(1, (len(window) - 1))
-        sd = math.sqrt(var) if var > 1e-9 else 1e-6
-        out.append((res[i] - mu) / sd)
-    return out
+    res = v - np.asarray(baseline, dtype=np.float64)
+    mu, var = rolling_mean_std(res, int(_window_len(n, window_s)))
+    return (res - mu) / _safe_sd(var)
+
+def score_matrix(
+    vals: np.ndarray, lengths: np.ndarray, window_s: int, alpha: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    2-D counterpart of ewma + z_scores for many series at once.
+    `vals` is (sensors, L) with row i right-aligned: its lengths[i] samples sit
+    in the last columns. Returns (preds, z) of the same shape; each row's valid
+    tail equals run_predictions on that series alone, the padding is garbage.
+    """
+    vals = np.asarray(vals, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    L = vals.shape[-1]
+    start = L - lengths
+    first = np.take_along_axis(vals, np.minimum(start, L - 1)[:, None], axis=-1)
+    # pad with each row's first sample: the EWMA stays at it through the padding
+    x = np.where(np.arange(L) >= start[:, None], vals, first) if start.any() else vals
+    preds = ewma_filter(x, alpha, first[:, 0])
+    res = x - preds
+    mu, var = rolling_mean_std(res, _window_len(lengths, window_s), start)
+    return preds, (res - mu) / _safe_sd(var)
 
 def project_future(last_value: float, steps: int) -> List[float]:
     """Hold-last-value projection for now (UI expects something)."""
     return [last_value] * max(0, int(steps))
 
 def run_predictions(
-    ts: List[float], vals: List[float], window_s: int, alpha: float, future_steps: int
+    ts: ArrayLike, vals: ArrayLike, window_s: int, alpha: float, future_steps: int
 ) -> Tuple[List[float], List[float], List[float], List[int], List[float]]:
     """
     Returns: preds, future_ts, future_preds, anomalies_idx, z
     Keeps the math minimal & deterministic so API and worker share behavior.
     """
-    preds = ewma(vals, alpha) if vals else []
-    z = z_scores(vals, preds, window_s) if vals else []
+    v = np.asarray(vals, dtype=np.float64)
+    if v.size == 0:
+        return [], [], [], [], []
+    preds = ewma(v, alpha)
+    z = z_scores(v, preds, window_s)
     future_ts = []
-    future_preds = project_future(preds[-1], future_steps) if preds else []
-    anomalies_idx = [i for i, z_i in enumerate(z) if abs(z_i) >= 3.0]
-    return preds, future_ts, future_preds, anomalies_idx, z
+    future_preds = project_future(float(preds[-1]), future_steps)
+    anomalies_idx = np.flatnonzero(np.abs(z) >= 3.0).tolist()
+    return preds.tolist(), future_ts, future_preds, anomalies_idx, z.tolist()
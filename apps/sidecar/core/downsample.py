@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Visual downsampling for chart payloads. Both algorithms return sorted indices
+# into the input so callers can slice any aligned column (vals, preds, ...).
+
+def lttb_indices(ts: np.ndarray, vals: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keep first/last, then from each of
+    n_out-2 equal-count buckets the point forming the largest triangle with
+    the previously kept point and the next bucket's centroid.
+    Area math is vectorized per bucket.
+    """
+    n = ts.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(ts, dtype=np.float64)
+    y = np.asarray(vals, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out-2 buckets over [1, n-1)
+    # centroid of every bucket (plus the last point as a final "bucket")
+    starts, ends = edges[:-1], edges[1:]
+    csx = np.concatenate(([0.0], np.cumsum(x)))
+    csy = np.concatenate(([0.0], np.cumsum(y)))
+    cnt = np.maximum(ends - starts, 1)
+    cx = np.append((csx[ends] - csx[starts]) / cnt, x[-1])
+    cy = np.append((csy[ends] - csy[starts]) / cnt, y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = starts[b], max(ends[b], starts[b] + 1)
+        px, py = x[lo:hi], y[lo:hi]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx[b + 1]) * (py - ay) - (ax - px) * (cy[b + 1] - ay))
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return np.unique(out)
+
+
+def minmax_indices(ts: np.ndarray, vals: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min/max per bucket (n_out // 2 equal-count buckets), fully vectorized.
+    Preserves spikes exactly; first and last points are always kept.
+    """
+    n = ts.size
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    nb = n_out // 2
+    y = np.asarray(vals, dtype=np.float64)
+    bucket = (np.arange(n) * nb) // n
+    order = np.lexsort((y, bucket))              # by bucket, then value
+    first = np.searchsorted(bucket[order], np.arange(nb), side="left")
+    last = np.searchsorted(bucket[order], np.arange(nb), side="right") - 1
+    keep = np.concatenate((order[first], order[last], [0, n - 1]))
+    return np.unique(keep)
+
+
+def downsample_indices(
+    ts: np.ndarray,
+    vals: np.ndarray,
+    max_points: int,
+    mode: str = "lttb",
+    keep: Optional[Iterable[int]] = None,
+) -> np.ndarray:
+    """
+    Indices of a ~max_points subset of the series (sorted, unique).
+    Indices in `keep` (e.g. anomalies) are always retained on top of the budget.
+    """
+    if mode == "minmax":
+        idx = minmax_indices(ts, vals, max_points)
+    else:
+        idx = lttb_indices(ts, vals, max_points)
+    if keep is not None:
+        k = np.fromiter(keep, dtype=np.int64)
+        if k.size:
+            idx = np.union1d(idx, k[(k >= 0) & (k < ts.size)])
+    return idx
+
+
+def remap_indices(kept: np.ndarray, original_idx: Iterable[int]) -> np.ndarray:
+    """Positions of `original_idx` inside `kept` (all must be present in `kept`)."""
+    o = np.fromiter(original_idx, dtype=np.int64)
+    return np.searchsorted(kept, o)
@@ -0,0 +1,188 @@
+# apps/sidecar/core/episodes.py
+"""
+Alert episodes: one alert per sustained anomaly instead of one per sample.
+
+An EpisodeTracker follows a sensor's scored samples with hysteresis:
+
+- an episode opens on the first sample with |z| >= enter_z;
+- while open, every sample with |z| >= exit_z (< enter_z) counts towards it,
+  extends last_t and may raise the peak (v, z);
+- it closes at the first sample more than quiet_s after last_t, so a signal
+  hovering around enter_z stays a single episode; a sensor that goes silent
+  has its episode closed by the periodic sweep (`close_idle`).
+
+Trackers only keep state; callers drain the episodes changed since the last
+drain and persist them (services/alerts_service.py), holding `flush_lock` from
+drain until the write is queued so an episode's insert and updates reach the
+writer in order.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from apps.sidecar.core.settings import ALERT_EXIT_Z, ALERT_QUIET_S, ANOMALY_Z_THRESHOLD
+
+
+class Episode:
+    """
+    One anomaly episode: t = first sample, (v, z) = peak, n = samples counted.
+    `id` is its alerts row once the insert has run; copies share it, so
+    snapshots drained before that insert committed still find the row.
+    """
+
+    __slots__ = ("sensor_id", "t", "last_t", "v", "z", "n", "active", "_row")
+
+    def __init__(self, sensor_id: str, t: float, v: float, z: float, n: int = 1,
+                 last_t: Optional[float] = None, active: bool = True, id: Optional[int] = None):
+        self.sensor_id = sensor_id
+        self.t = t
+        self.last_t = t if last_t is None else last_t
+        self.v = v
+        self.z = z
+        self.n = n
+        self.active = active
+        self._row: List[Optional[int]] = [id]
+
+    @property
+    def id(self) -> Optional[int]:
+        return self._row[0]
+
+    @id.setter
+    def id(self, value: Optional[int]) -> None:
+        self._row[0] = value
+
+    @property
+    def msg(self) -> str:
+        return f"Anomaly peak z={self.z:.2f} over {self.n} sample{'s' if self.n != 1 else ''}"
+
+    def copy(self) -> "Episode":
+        ep = Episode(self.sensor_id, self.t, self.v, self.z, self.n, self.last_t, self.active)
+        ep._row = self._row
+        return ep
+
+
+class EpisodeTracker:
+    """Per-sensor episode state machine (thread-safe)."""
+
+    def __init__(self, sensor_id: str, enter_z: float = ANOMALY_Z_THRESHOLD,
+                 exit_z: float = ALERT_EXIT_Z, quiet_s: float = ALERT_QUIET_S):
+        self.sensor_id = sensor_id
+        self.enter_z = float(enter_z)
+        self.exit_z = min(float(exit_z), self.enter_z)
+        self.quiet_s = max(0.0, float(quiet_s))
+        self.current: Optional[Episode] = None
+        self._dirty: Dict[float, Episode] = {}  # start t -> episode changed since last drain
+        self._new: set = set()                  # start t of episodes never drained
+        self._lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def wants(self, z: float) -> bool:
+        """Cheap pre-check: whether `update` could change anything for this z."""
+        return self.current is not None or abs(z) >= self.exit_z
+
+    def update(self, t: float, v: float, z: float) -> None:
+        """Feed one scored sample."""
+        a = abs(z)
+        with self._lock:
+            ep = self.current
+            if ep is not None and t - ep.last_t > self.quiet_s:
+                ep.active = False
+                self._dirty[ep.t] = ep
+                self.current = ep = None
+            if ep is None:
+                if a >= self.enter_z:
+                    ep = self.current = Episode(self.sensor_id, t, v, z)
+                    self._dirty[t] = ep
+                    self._new.add(t)
+                return
+            if a < self.exit_z:
+                return
+            ep.n += 1
+            if t > ep.last_t:
+                ep.last_t = t
+            if a > abs(ep.z):
+                ep.v, ep.z = v, z
+            self._dirty[ep.t] = ep
+
+    def close_idle(self, now: float) -> bool:
+        """Close the open episode if nothing extended it for more than quiet_s before `now`."""
+        with self._lock:
+            ep = self.current
+            if ep is None or now - ep.last_t <= self.quiet_s:
+                return False
+            ep.active = False
+            self._dirty[ep.t] = ep
+            self.current = None
+            return True
+
+    def resume(self, ep: Episode) -> None:
+        """Continue an episode persisted as still open (e.g. after a restart)."""
+        with self._lock:
+            if self.current is None:
+                self.current = ep
+
+    def restore(self, changed: List[Tuple[Episode, bool]]) -> None:
+        """Mark drained episodes dirty again (their write could not be queued)."""
+        with self._lock:
+            for ep, new in changed:
+                live = self.current if self.current is not None and self.current.t == ep.t else ep
+                self._dirty.setdefault(ep.t, live)
+                if new:
+                    self._new.add(ep.t)
+
+    def drain(self) -> List[Tuple[Episode, bool]]:
+        """Snapshots of the episodes changed since the last call, as (episode, opened since)."""
+        with self._lock:
+            if not self._dirty:
+                return []
+            out = [(ep.copy(), t in self._new) for t, ep in self._dirty.items()]
+            self._dirty.clear()
+            self._new.clear()
+        return out
+
+
+# ---------- per-sensor registry ---------------------------------------------
+
+_TRACKERS: Dict[str, EpisodeTracker] = {}
+_LOCK = threading.Lock()
+
+
+def get_tracker(
+    sensor_id: str,
+    seed: Optional[Callable[[], Optional[Episode]]] = None,
+) -> EpisodeTracker:
+    """
+    Return the tracker for a sensor, creating it on first use.
+    `seed` is called once at creation and may return the sensor's still-open
+    episode to continue.
+    """
+    tr = _TRACKERS.get(sensor_id)
+    if tr is not None:
+        return tr
+    with _LOCK:
+        tr = _TRACKERS.get(sensor_id)
+        if tr is None:
+            tr = EpisodeTracker(sensor_id)
+            ep = seed() if seed is not None else None
+            if ep is not None:
+                tr.resume(ep)
+            _TRACKERS[sensor_id] = tr
+    return tr
+
+
+def peek(sensor_id: str) -> Optional[EpisodeTracker]:
+    """The sensor's tracker if it exists (never creates or seeds one)."""
+    return _TRACKERS.get(sensor_id)
+
+
+def trackers() -> List[EpisodeTracker]:
+    """Snapshot of every tracker in this process."""
+    with _LOCK:
+        return list(_TRACKERS.values())
+
+
+def reset(sensor_id: str) -> None:
+    """Drop a sensor's episode state (useful for tests)."""
+    with _LOCK:
+        _TRACKERS.pop(sensor_id, None)
@@ -0,0 +1,76 @@
+# apps/sidecar/core/gorilla.py
+"""
+Lossless compression of (t, v) float64 sample blocks, after Facebook's
+Gorilla: timestamps as delta-of-delta, values as XOR with the previous value.
+
+Gorilla bit-packs both streams with per-sample control codes, which means a
+per-sample loop to decode. Here both transforms are done on the raw IEEE-754
+bits with NumPy instead:
+
+- t: the float64 bits read as int64 (monotonic for positive floats), delta
+  of delta (wrapping int64 arithmetic, exact), zigzag so small magnitudes of
+  either sign have zero high bytes;
+- v: bits XOR previous bits, so repeated/slowly changing values keep their
+  sign, exponent and high mantissa bytes at zero;
+
+then each stream is split into byte planes (all first bytes, all second
+bytes, ...) and the lot is deflated once. The zero planes cost next to
+nothing, and decoding is a decompress plus two cumsums and one
+xor-accumulate.
+
+Block layout: b"GZ1" | u32 sample count | zlib(t planes + v planes).
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+MAGIC = b"GZ1"
+_HEADER = struct.Struct("<3sI")
+
+
+def _planes(words: np.ndarray) -> bytes:
+    """uint64 words → byte planes (n bytes of byte 0, then byte 1, ...)."""
+    return words.astype("<u8", copy=False).view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unplanes(buf: bytes, n: int) -> np.ndarray:
+    return np.frombuffer(buf, dtype=np.uint8).reshape(8, n).T.copy().view("<u8").reshape(n)
+
+
+def encode(ts: np.ndarray, vs: np.ndarray, level: int = 6) -> bytes:
+    """Compress samples sorted by t (any order is lossless, sorted is small)."""
+    ts = np.ascontiguousarray(ts, dtype="<f8")
+    vs = np.ascontiguousarray(vs, dtype="<f8")
+    n = ts.size
+    if vs.size != n:
+        raise ValueError("ts and vs differ in length")
+    bits = ts.view("<i8")
+    with np.errstate(over="ignore"):
+        dod = np.diff(bits, n=1, prepend=np.int64(0))  # [t0, d1, d2, ...]
+        dod[2:] = np.diff(dod[1:])                    # [t0, d1, d2-d1, ...]
+    zz = (dod << 1) ^ (dod >> 63)                     # zigzag
+    vbits = vs.view("<u8")
+    xor = vbits ^ np.concatenate([np.zeros(1, dtype="<u8"), vbits[:-1]]) if n else vbits
+    return _HEADER.pack(MAGIC, n) + zlib.compress(_planes(zz.view("<u8")) + _planes(xor), level)
+
+
+def decode(blob: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """(ts, vs) float64 arrays of a block written by `encode`."""
+    magic, n = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not a sample block")
+    raw = zlib.decompress(memoryview(blob)[_HEADER.size:])
+    if len(raw) != 16 * n:
+        raise ValueError("truncated sample block")
+    zz = _unplanes(raw[: 8 * n], n)
+    dod = ((zz >> np.uint64(1)) ^ np.negative(zz & np.uint64(1))).view("<i8")  # un-zigzag
+    with np.errstate(over="ignore"):
+        if n > 2:
+            dod[1:] = np.cumsum(dod[1:])               # deltas
+        bits = np.cumsum(dod)                          # t bits
+    vs = np.bitwise_xor.accumulate(_unplanes(raw[8 * n:], n)) if n else np.empty(0, dtype="<u8")
+    return bits.view("<f8"), vs.view("<f8")
@@ -0,0 +1,29 @@
+# apps/sidecar/core/leader.py
+"""
+One-of-N election for singleton background jobs when uvicorn runs several
+workers: the first process to flock DATA_DIR/<name>.lock wins and keeps the
+lock (and the fd) until it exits, at which point the kernel releases it.
+"""
+from __future__ import annotations
+
+import fcntl
+import os
+from typing import Dict
+
+from apps.sidecar.core.settings import DATA_DIR
+
+_HELD: Dict[str, int] = {}
+
+
+def claim(name: str) -> bool:
+    """True if this process holds (or just acquired) the named role."""
+    if name in _HELD:
+        return True
+    fd = os.open(str(DATA_DIR / f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _HELD[name] = fd
+    return True
@@ -0,0 +1,315 @@
+# apps/sidecar/core/metrics.py
+"""
+In-process metrics rendered in the Prometheus text format (GET /metrics),
+without the prometheus_client dependency.
+
+Counters, gauges and histograms with labels: an update is a dict lookup plus
+a short lock, cheap enough for per-request and per-batch hot paths.
+Values that are cheaper to read on demand (buffer sizes, queue depths) are
+filled in by `collector` callbacks right before a scrape. All metrics are
+per process (each uvicorn worker exposes its own).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# seconds; covers sub-ms SQLite reads up to slow notification sends
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_REGISTRY: Dict[str, "_Metric"] = {}
+_COLLECTORS: List[Callable[[], None]] = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _fmt(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelstr(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Timer:
+    """Context manager observing elapsed seconds into a histogram child."""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class _ValueChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self._bounds, value)  # first bound >= value ("le" is inclusive)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        with _REGISTRY_LOCK:
+            _REGISTRY[name] = self
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def labels(self, *values: object):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def clear(self) -> None:
+        """Drop every labelled series (collectors re-fill gauges each scrape)."""
+        with self._lock:
+            self._children = {}
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, child in self._items():
+            yield f"{self.name}{_labelstr(self.labelnames, key)} {_fmt(child.value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, child in self._items():
+            with child._lock:
+                counts, total, n = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                le = 'le="' + _fmt(bound) + '"'
+                yield f"{self.name}_bucket{_labelstr(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labelstr(self.labelnames, key)} {_fmt(total)}"
+            yield f"{self.name}_count{_labelstr(self.labelnames, key)} {n}"
+
+
+def timed(hist: Histogram, *labels: object) -> Callable[[Callable], Callable]:
+    """Decorator observing each call's duration into `hist` (labels fixed up front)."""
+    child = hist.labels(*labels)
+
+    def wrap(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with child.time():
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def collector(fn: Callable[[], None]) -> Callable[[], None]:
+    """Register `fn` to refresh on-demand gauges before every scrape."""
+    _COLLECTORS.append(fn)
+    return fn
+
+
+def render() -> str:
+    """Text exposition (format 0.0.4) of every registered metric."""
+    for fn in list(_COLLECTORS):
+        try:
+            fn()
+        except Exception:
+            pass  # a broken collector must not take the endpoint down
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- metric catalogue ----------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "sidecar_http_request_duration_seconds",
+    "HTTP request latency by route template (streaming responses count until they close).",
+    ("method", "route", "status"),
+)
+INGEST_SAMPLES = Counter(
+    "sidecar_ingest_samples_total", "Samples ingested, per sensor.", ("sensor_id",),
+)
+INGEST_REJECTED = Counter(
+    "sidecar_ingest_rejected_total",
+    "Readings dropped at ingest: value not finite, timestamp infinite or negative.", ("source",),
+)
+SQLITE_COMMIT_SECONDS = Histogram(
+    "sidecar_sqlite_commit_seconds", "Writer thread group commit duration (BEGIN..COMMIT).",
+)
+SQLITE_COMMIT_JOBS = Counter(
+    "sidecar_sqlite_commit_jobs_total", "Write jobs committed by the writer thread, by outcome.", ("outcome",),
+)
+SQLITE_WRITE_QUEUE = Gauge(
+    "sidecar_sqlite_write_queue_depth", "Write jobs waiting for the writer thread.",
+)
+SQLITE_QUERY_SECONDS = Histogram(
+    "sidecar_sqlite_query_seconds", "Repository read duration (query + fetch).", ("op",),
+)
+PREDICT_SECONDS = Histogram(
+    "sidecar_predict_seconds", "Time spent in anomaly scoring kernels.", ("fn",),
+)
+NOTIFY_SEND_SECONDS = Histogram(
+    "sidecar_notify_send_seconds", "Notification send attempt duration.", ("channel", "outcome"),
+)
+NOTIFY_FAILURES = Counter(
+    "sidecar_notify_failures_total", "Failed notification send attempts.", ("channel",),
+)
+NOTIFY_DEADLETTERS = Counter(
+    "sidecar_notify_deadletters_total", "Notifications given up on and written to the dead-letter log.", ("channel",),
+)
+NOTIFY_QUEUE = Gauge(
+    "sidecar_notify_queue_depth", "Notifications waiting for a dispatcher worker.",
+)
+MQTT_MESSAGES = Counter(
+    "sidecar_mqtt_messages_total",
+    "MQTT bridge messages by outcome (ingested, invalid, dropped = queue full, failed = store error).",
+    ("outcome",),
+)
+BUFFER_SAMPLES = Gauge(
+    "sidecar_buffer_samples", "Samples held in the sensor's ring buffer.", ("sensor_id",),
+)
+BUFFER_BYTES = Gauge(
+    "sidecar_buffer_bytes", "Memory reserved by the sensor's ring buffer.", ("sensor_id",),
+)
+EVENT_LOOP_LAG = Histogram(
+    "sidecar_event_loop_lag_seconds", "How late the event loop ran a periodic timer.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_LAG_LAST = Gauge(
+    "sidecar_event_loop_lag_last_seconds", "Event loop lag at the most recent probe.",
+)
+
+
+async def monitor_loop_lag(interval_s: float) -> None:
+    """Sleep `interval_s` forever, recording how late each wake-up is (run as a task)."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval_s)
+        lag = max(0.0, loop.time() - start - interval_s)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+_LAG_TASK: Optional[asyncio.Task] = None
+
+
+def start_loop_monitor(interval_s: float) -> None:
+    """Start the lag probe on the running loop (async startup hook)."""
+    global _LAG_TASK
+    if _LAG_TASK is None:
+        _LAG_TASK = asyncio.get_running_loop().create_task(monitor_loop_lag(interval_s))
+
+
+def stop_loop_monitor() -> None:
+    global _LAG_TASK
+    if _LAG_TASK is not None:
+        _LAG_TASK.cancel()
+        _LAG_TASK = None
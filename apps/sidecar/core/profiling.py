@@ -0,0 +1,270 @@
+# apps/sidecar/core/profiling.py
+"""
+On-demand diagnostics without a debugger:
+
+- SamplingProfiler: a background thread samples every thread's Python stack
+  (sys._current_frames) while one request runs, and aggregates them into
+  folded stacks ("thread;pkg/mod.py:func;... count", what flamegraph.pl and
+  speedscope read) or a nested call tree. For a request only the threads
+  that serve it are sampled (event loop, threadpool workers, SQLite writer),
+  and threads parked in the stdlib's waiting primitives (selectors, queue,
+  Condition.wait) are skipped, so idle time does not drown the work. Samples are only taken when the sampler gets the
+  GIL, so CPU-bound stretches are sampled at the interpreter switch interval
+  (5 ms by default) rather than every interval.
+- memory_report: tracemalloc snapshot statistics, with allocations
+  attributed to the sidecar's in-memory structures by traceback filename.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from apps.sidecar.core.settings import PROFILE_INTERVAL_MS, PROFILE_MAX_S, PROFILE_KEEP
+
+_MAX_DEPTH = 128
+
+# threads that do work on behalf of a request besides the event loop itself
+REQUEST_THREAD_PREFIXES = ("AnyIO worker", "sqlite-writer")
+
+# leaf frames that mean "this thread is blocked waiting", not working
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+}
+
+_PATHS = sorted({p for p in sys.path if p}, key=len, reverse=True)
+_LABELS: Dict[Any, str] = {}
+
+
+def _label(code) -> str:
+    label = _LABELS.get(code)
+    if label is None:
+        path = code.co_filename
+        for prefix in _PATHS:
+            if path.startswith(prefix + os.sep):
+                path = path[len(prefix) + 1:]
+                break
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _LABELS[code] = f"{path}:{name}".replace(";", ":")
+    return label
+
+
+def _stack(frame) -> Optional[Tuple[str, ...]]:
+    """Root→leaf labels, or None for a thread parked in a waiting primitive."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+        return None
+    out: List[str] = []
+    while frame is not None and len(out) < _MAX_DEPTH:
+        out.append(_label(frame.f_code))
+        frame = frame.f_back
+    out.reverse()
+    return tuple(out)
+
+
+class SamplingProfiler:
+    """
+    Samples thread stacks every `interval_s` until stopped (or `max_s`).
+    `thread_filter(ident, name)` restricts sampling (default: every thread).
+    """
+
+    def __init__(self, interval_s: float = PROFILE_INTERVAL_MS / 1000.0, max_s: float = PROFILE_MAX_S,
+                 thread_filter: Optional[Callable[[int, str], bool]] = None):
+        self.thread_filter = thread_filter
+        self.interval_s = max(0.0001, float(interval_s))
+        self.max_s = float(max_s)
+        self.id = uuid.uuid4().hex[:12]
+        self.stacks: "Counter[Tuple[str, ...]]" = Counter()
+        self.samples = 0
+        self.wall_s = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval_s):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                name = names.get(tid, str(tid))
+                if self.thread_filter is not None and not self.thread_filter(tid, name):
+                    continue
+                stack = _stack(frame)
+                if stack is not None:
+                    self.stacks[(name,) + stack] += 1
+            self.samples += 1
+            if time.perf_counter() - started > self.max_s:
+                break
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.wall_s = time.perf_counter() - self._started
+        return self
+
+    def folded(self) -> str:
+        """One "frame;frame;... count" line per distinct stack (flamegraph.pl / speedscope)."""
+        lines = [";".join(stack) + f" {n}" for stack, n in self.stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def tree(self) -> Dict[str, Any]:
+        """Nested {"name", "value", "children"} call tree (d3-flame-graph layout)."""
+        root: Dict[str, Any] = {"name": "all", "value": 0, "children": {}}
+        for stack, n in self.stacks.items():
+            node = root
+            node["value"] += n
+            for name in stack:
+                node = node["children"].setdefault(name, {"name": name, "value": 0, "children": {}})
+                node["value"] += n
+
+        def _freeze(node: Dict[str, Any]) -> Dict[str, Any]:
+            kids = sorted(node["children"].values(), key=lambda c: -c["value"])
+            return {"name": node["name"], "value": node["value"], "children": [_freeze(k) for k in kids]}
+
+        return _freeze(root)
+
+    def top_self(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Leaf frames by sample count: where the time is actually spent."""
+        leaves: "Counter[str]" = Counter()
+        for stack, n in self.stacks.items():
+            leaves[stack[-1]] += n
+        total = sum(leaves.values()) or 1
+        return [{"frame": f, "samples": n, "share": round(n / total, 4)} for f, n in leaves.most_common(limit)]
+
+
+# ---------- recent request profiles ----------
+
+_PROFILES: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_PROFILES_LOCK = threading.Lock()
+_ACTIVE = threading.Lock()  # one profiled request at a time (samples are process-wide)
+
+
+def try_begin(loop_thread: Optional[int] = None) -> Optional[SamplingProfiler]:
+    """
+    Start sampling for a request served on `loop_thread` (the event loop's
+    thread id), or return None if another profile is running.
+    """
+    if not _ACTIVE.acquire(blocking=False):
+        return None
+    loop_thread = threading.get_ident() if loop_thread is None else loop_thread
+    return SamplingProfiler(
+        thread_filter=lambda tid, name: tid == loop_thread or name.startswith(REQUEST_THREAD_PREFIXES),
+    ).start()
+
+
+def finish(prof: SamplingProfiler, **info: Any) -> str:
+    """Stop sampling and keep the result under the profiler's id (returned)."""
+    try:
+        prof.stop()
+    finally:
+        _ACTIVE.release()
+    pid = prof.id
+    record = {"id": pid, "ts": time.time(), "wall_ms": round(prof.wall_s * 1000.0, 3),
+              "samples": prof.samples, "interval_ms": prof.interval_s * 1000.0, **info, "profiler": prof}
+    with _PROFILES_LOCK:
+        _PROFILES[pid] = record
+        while len(_PROFILES) > max(1, PROFILE_KEEP):
+            _PROFILES.popitem(last=False)
+    return pid
+
+
+def get_profile(pid: str) -> Optional[Dict[str, Any]]:
+    with _PROFILES_LOCK:
+        return _PROFILES.get(pid)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    with _PROFILES_LOCK:
+        records = list(_PROFILES.values())
+    return [{k: v for k, v in r.items() if k != "profiler"} for r in reversed(records)]
+
+
+# ---------- memory ----------
+
+# traceback filename patterns attributing allocations to in-memory structures
+MEMORY_COMPONENTS: Dict[str, Tuple[str, ...]] = {
+    "buffers": ("*/repositories/buffers.py", "*/repositories/shared_buffers.py"),
+    "alerts_repo": ("*/repositories/alerts_repo.py",),
+    "response_cache": ("*/services/response_cache.py",),
+    "detectors": ("*/core/streaming.py",),
+    "profiles": (__file__,),
+}
+
+_LAST_SNAPSHOT: Optional[tracemalloc.Snapshot] = None
+
+
+def _where(tb: tracemalloc.Traceback) -> str:
+    # most recent frame, path relative to sys.path like the profiler labels
+    if not len(tb):
+        return "?"
+    frame = tb[-1]
+    path = frame.filename
+    for prefix in _PATHS:
+        if path.startswith(prefix + os.sep):
+            path = path[len(prefix) + 1:]
+            break
+    return f"{path}:{frame.lineno}"
+
+
+def memory_report(limit: int = 20, group_by: str = "lineno", diff: bool = False) -> Dict[str, Any]:
+    """
+    tracemalloc view of live allocations: totals per component (an allocation
+    counts for a component if any frame of its traceback is in one of the
+    component's files) and the top `limit` sites. With `diff`, sites are
+    ranked by growth since the previous report. Only allocations made while
+    tracing are visible.
+    """
+    global _LAST_SNAPSHOT
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    snap = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    components = {}
+    for name, patterns in MEMORY_COMPONENTS.items():
+        sub = snap.filter_traces([tracemalloc.Filter(True, p, all_frames=True) for p in patterns])
+        stats = sub.statistics("filename")
+        components[name] = {"bytes": sum(s.size for s in stats), "blocks": sum(s.count for s in stats)}
+    if diff and _LAST_SNAPSHOT is not None:
+        top = [
+            {"where": _where(s.traceback), "bytes": s.size, "bytes_diff": s.size_diff, "blocks": s.count, "blocks_diff": s.count_diff}
+            for s in snap.compare_to(_LAST_SNAPSHOT, group_by)[:limit]
+        ]
+    else:
+        top = [
+            {"where": _where(s.traceback), "bytes": s.size, "blocks": s.count}
+            for s in snap.statistics(group_by)[:limit]
+        ]
+    _LAST_SNAPSHOT = snap
+    return {
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "components": components,
+        "top": top,
+    }
@@ -18,12 +18,105 @@ DATA_DIR = Path(os.getenv("SIDECAR_DATA_DIR", "data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = os.getenv("SIDECAR_DB_PATH", str(DATA_DIR / "sidecar.db"))
 
+# --- Write pipeline (single writer thread, group commit) ---
+WRITE_QUEUE_MAX = _getenv_int("SIDECAR_WRITE_QUEUE_MAX", 10000)  # pending write jobs before backpressure
+WRITE_BATCH_MAX = _getenv_int("SIDECAR_WRITE_BATCH_MAX", 500)    # jobs per commit
+WRITE_BATCH_MS = _getenv_float("SIDECAR_WRITE_BATCH_MS", 2.0)    # max wait to fill a group
+
+# --- Read connections (one query_only connection per thread) ---
+READ_CACHE_KB = _getenv_int("SIDECAR_READ_CACHE_KB", 8192)              # page cache per reader
+READ_MMAP_BYTES = _getenv_int("SIDECAR_READ_MMAP_BYTES", 256 * 1024 * 1024)  # shared via OS page cache
+
+# --- In-memory sample buffers ---
+# Value dtype for the per-sensor ring buffers ("float64" or "float32"; timestamps stay float64)
+BUFFER_VALUE_DTYPE = os.getenv("SIDECAR_BUFFER_VALUE_DTYPE", "float64")
+# "memory" (per process) or "shared" (mmap'd file every uvicorn worker maps)
+# (detectors and alert episodes stay per process: route each sensor to one worker, see README)
+BUFFER_BACKEND = os.getenv("SIDECAR_BUFFER_BACKEND", "memory")
+BUFFER_SHM_PATH = os.getenv("SIDECAR_BUFFER_SHM_PATH", str(DATA_DIR / "buffers.mmap"))
+BUFFER_SHM_MAX_SENSORS = _getenv_int("SIDECAR_BUFFER_SHM_MAX_SENSORS", 1024)  # directory size (slots never freed)
+# Hydrate every sensor's buffer from SQLite at startup (else on first access), newest samples within this many hours
+SAMPLE_WARM_START = os.getenv("SIDECAR_SAMPLE_WARM_START", "1") == "1"
+SAMPLE_WARM_HOURS = _getenv_float("SIDECAR_SAMPLE_WARM_HOURS", 24.0)  # 0 = no age limit
+# Sensor ids with no stored samples are not probed again for this long (another worker may write them)...
+SAMPLE_MISS_TTL_S = _getenv_float("SIDECAR_SAMPLE_MISS_TTL_S", 5.0)
+SAMPLE_MISS_MAX = _getenv_int("SIDECAR_SAMPLE_MISS_MAX", 10_000)  # ...and at most this many are remembered
+
+# --- Raw sample storage behind SampleRepo ---
+# "sqlite" (samples table) or "segments" (append-only mmap'd files per sensor; rollups stay in SQLite)
+SAMPLE_BACKEND = os.getenv("SIDECAR_SAMPLE_BACKEND", "sqlite")
+SEGMENT_DIR = os.getenv("SIDECAR_SEGMENT_DIR", str(DATA_DIR / "segments"))
+SEGMENT_MAX_BYTES = _getenv_int("SIDECAR_SEGMENT_MAX_BYTES", 16 * 1024 * 1024)  # roll over at this size...
+SEGMENT_SPAN_S = _getenv_float("SIDECAR_SEGMENT_SPAN_S", 3600.0)                # ...or this much sample time
+SEGMENT_INDEX_STRIDE = _getenv_int("SIDECAR_SEGMENT_INDEX_STRIDE", 1024)        # records per sparse index entry
+SEGMENT_OPEN_MAX = _getenv_int("SIDECAR_SEGMENT_OPEN_MAX", 256)                 # mapped segments kept (each holds an fd)
+SEGMENT_FSYNC = os.getenv("SIDECAR_SEGMENT_FSYNC", "0") == "1"                  # fdatasync every append
+# sqlite backend: the retention pass compresses raw samples older than this into sample_blocks (0 = never)
+SAMPLE_COLD_HOURS = _getenv_float("SIDECAR_SAMPLE_COLD_HOURS", 6.0)
+SAMPLE_BLOCK_S = _getenv_float("SIDECAR_SAMPLE_BLOCK_S", 3600.0)     # one block per sensor per this much sample time...
+SAMPLE_BLOCK_MAX = _getenv_int("SIDECAR_SAMPLE_BLOCK_MAX", 65536)    # ...split at this many samples
+
+# --- Shared response cache for /predictive/series and /alerts ---
+RESPONSE_CACHE_MAX_ENTRIES = _getenv_int("SIDECAR_RESPONSE_CACHE_MAX_ENTRIES", 1024)
+RESPONSE_CACHE_TTL_S = _getenv_float("SIDECAR_RESPONSE_CACHE_TTL_S", 5.0)  # bounds staleness of time windows
+
+# --- Live push (GET /stream) ---
+STREAM_QUEUE_MAX = _getenv_int("SIDECAR_STREAM_QUEUE_MAX", 1000)     # per-client backlog before it is dropped
+STREAM_HEARTBEAT_S = _getenv_float("SIDECAR_STREAM_HEARTBEAT_S", 15.0)
+
+# --- MQTT ingest bridge (needs paho-mqtt) ---
+MQTT_ENABLED = os.getenv("SIDECAR_MQTT_ENABLED", "0") == "1"
+MQTT_HOST = os.getenv("SIDECAR_MQTT_HOST", "127.0.0.1")
+MQTT_PORT = _getenv_int("SIDECAR_MQTT_PORT", 1883)
+MQTT_TOPIC = os.getenv("SIDECAR_MQTT_TOPIC", "sensors/#")
+MQTT_QOS = _getenv_int("SIDECAR_MQTT_QOS", 1)
+MQTT_BATCH_MAX = _getenv_int("SIDECAR_MQTT_BATCH_MAX", 500)      # readings per store/score batch
+MQTT_BATCH_MS = _getenv_float("SIDECAR_MQTT_BATCH_MS", 50.0)     # max wait to fill a batch
+MQTT_QUEUE_MAX = _getenv_int("SIDECAR_MQTT_QUEUE_MAX", 20000)    # parsed readings buffered ahead of storage
+MQTT_BLOCK_S = _getenv_float("SIDECAR_MQTT_BLOCK_S", 5.0)        # backpressure wait before a reading is dropped
+MQTT_CLIENT_ID = os.getenv("SIDECAR_MQTT_CLIENT_ID", "")           # set for a persistent session (unacked messages redelivered)
+
 # --- Retention window used by optional pruning ---
 RETENTION_HOURS = _getenv_int("SIDECAR_RETENTION_HOURS", 24)
+# Per-table windows (hours, 0 = keep forever); default to RETENTION_HOURS
+RETENTION_SAMPLES_HOURS = _getenv_int("SIDECAR_RETENTION_SAMPLES_HOURS", RETENTION_HOURS)
+RETENTION_ALERTS_HOURS = _getenv_int("SIDECAR_RETENTION_ALERTS_HOURS", RETENTION_HOURS)
+RETENTION_READINGS_HOURS = _getenv_int("SIDECAR_RETENTION_READINGS_HOURS", RETENTION_HOURS)
+# Rollups are small and outlive raw samples (1h kept forever by default)
+RETENTION_ROLLUP_1M_HOURS = _getenv_int("SIDECAR_RETENTION_ROLLUP_1M_HOURS", 24 * 30)
+RETENTION_ROLLUP_1H_HOURS = _getenv_int("SIDECAR_RETENTION_ROLLUP_1H_HOURS", 0)
+# Per-sensor overrides for sample data, e.g. "pump-1=168,ai_test=6"
+RETENTION_SENSOR_HOURS = os.getenv("SIDECAR_RETENTION_SENSOR_HOURS", "")
+RETENTION_ENABLED = os.getenv("SIDECAR_RETENTION_ENABLED", "1") == "1"
+RETENTION_INTERVAL_S = _getenv_float("SIDECAR_RETENTION_INTERVAL_S", 600.0)
+RETENTION_BATCH = _getenv_int("SIDECAR_RETENTION_BATCH", 2000)            # rows per DELETE
+RETENTION_VACUUM_PAGES = _getenv_int("SIDECAR_RETENTION_VACUUM_PAGES", 2000)  # pages per incremental_vacuum step
+# Legacy dashboard store written by apps/sidecar/db.py
+CORTEX_DB_PATH = os.getenv("SIDECAR_CORTEX_DB_PATH", "data/cortex.db")
 
 # --- Sampling & anomaly knobs (used by simulator/ingest path) ---
 SAMPLE_INTERVAL_S = _getenv_int("SIDECAR_SAMPLE_INTERVAL_S", 5)  # dev simulator cadence
 ANOMALY_Z_THRESHOLD = _getenv_float("SIDECAR_ANOMALY_Z_THRESHOLD", 3.0)
+# Streaming detector: residual window (samples) and EWMA smoothing
+ANOMALY_WINDOW = _getenv_int("SIDECAR_ANOMALY_WINDOW", 600)
+ANOMALY_ALPHA = _getenv_float("SIDECAR_ANOMALY_ALPHA", 0.3)
+# Alert episodes: open at |z| >= ANOMALY_Z_THRESHOLD, kept alive by |z| >= ALERT_EXIT_Z,
+# closed at the first sample more than ALERT_QUIET_S after the last one that did
+# (or by the sweep every ALERT_SWEEP_S seconds once the sensor has been quiet that long)
+ALERT_EXIT_Z = _getenv_float("SIDECAR_ALERT_EXIT_Z", 2.0)
+ALERT_QUIET_S = _getenv_float("SIDECAR_ALERT_QUIET_S", 60.0)
+ALERT_SWEEP_S = _getenv_float("SIDECAR_ALERT_SWEEP_S", 10.0)
+
+# Max readings accepted by one POST /ingest/batch
+INGEST_BATCH_MAX = _getenv_int("SIDECAR_INGEST_BATCH_MAX", 5000)
+# Binary frames (/ingest/frames): readings per request, sensor dictionaries cached per process, ids per dictionary
+INGEST_FRAMES_MAX = _getenv_int("SIDECAR_INGEST_FRAMES_MAX", 10_000)
+INGEST_DICT_MAX = _getenv_int("SIDECAR_INGEST_DICT_MAX", 1024)
+INGEST_DICT_SIZE_MAX = _getenv_int("SIDECAR_INGEST_DICT_SIZE_MAX", 65_536)
+# Max sensors one /predictive/fleet request may score
+FLEET_MAX_SENSORS = _getenv_int("SIDECAR_FLEET_MAX_SENSORS", 1000)
+# Rows per chunk (one SQLite page query, one response write) of GET /export/samples
+EXPORT_CHUNK_ROWS = _getenv_int("SIDECAR_EXPORT_CHUNK_ROWS", 65_536)
 
 # --- API token for /ingest ---
 API_TOKEN = os.getenv("SIDECAR_API_TOKEN", "dev-secret-change-me")
@@ -44,17 +137,94 @@ EMAIL_PASSWORD = os.getenv("SIDECAR_EMAIL_PASSWORD", "")
 EMAIL_FROM = os.getenv("SIDECAR_EMAIL_FROM", "")
 EMAIL_TO = [s for s in os.getenv("SIDECAR_EMAIL_TO", "").split(",") if s.strip()]
 
-# Webhook — stdlib urllib POST
+# Webhook — stdlib http.client POST (keep-alive)
 WEBHOOK_ENABLED = os.getenv("SIDECAR_WEBHOOK_ENABLED", "0") == "1"
 WEBHOOK_URL = os.getenv("SIDECAR_WEBHOOK_URL", "")
+WEBHOOK_TIMEOUT_S = _getenv_float("SIDECAR_WEBHOOK_TIMEOUT_S", 5.0)
+
+# Background dispatcher (ingest only enqueues)
+NOTIFY_QUEUE_MAX = _getenv_int("SIDECAR_NOTIFY_QUEUE_MAX", 1000)
+NOTIFY_WORKERS = _getenv_int("SIDECAR_NOTIFY_WORKERS", 1)              # each keeps its own SMTP/HTTP sessions
+NOTIFY_MAX_ATTEMPTS = _getenv_int("SIDECAR_NOTIFY_MAX_ATTEMPTS", 4)
+NOTIFY_BACKOFF_S = _getenv_float("SIDECAR_NOTIFY_BACKOFF_S", 1.0)      # doubles per attempt
+NOTIFY_SMTP_IDLE_S = _getenv_float("SIDECAR_NOTIFY_SMTP_IDLE_S", 120.0)  # reconnect if idle longer
+NOTIFY_DEADLETTER_PATH = os.getenv("SIDECAR_NOTIFY_DEADLETTER_PATH", str(DATA_DIR / "notify_deadletter.jsonl"))
+
+# --- Metrics (/metrics, Prometheus text format) ---
+METRICS_ENABLED = os.getenv("SIDECAR_METRICS_ENABLED", "1") == "1"
+METRICS_LOOP_LAG_INTERVAL_S = _getenv_float("SIDECAR_METRICS_LOOP_LAG_INTERVAL_S", 0.5)  # event-loop lag probe period
+
+# --- On-demand profiling (admin, X-API-Key) ---
+PROFILE_INTERVAL_MS = _getenv_float("SIDECAR_PROFILE_INTERVAL_MS", 1.0)  # stack sampling period
+PROFILE_MAX_S = _getenv_float("SIDECAR_PROFILE_MAX_S", 30.0)             # stop sampling a request after this
+PROFILE_KEEP = _getenv_int("SIDECAR_PROFILE_KEEP", 20)                   # recent profiles kept for /admin/profiles
 
 # Optional: explicitly export names
 __all__ = [
     "DATA_DIR",
     "DB_PATH",
+    "WRITE_QUEUE_MAX",
+    "WRITE_BATCH_MAX",
+    "WRITE_BATCH_MS",
+    "READ_CACHE_KB",
+    "READ_MMAP_BYTES",
+    "BUFFER_VALUE_DTYPE",
+    "BUFFER_BACKEND",
+    "BUFFER_SHM_PATH",
+    "BUFFER_SHM_MAX_SENSORS",
+    "SAMPLE_WARM_START",
+    "SAMPLE_WARM_HOURS",
+    "SAMPLE_MISS_TTL_S",
+    "SAMPLE_MISS_MAX",
+    "SAMPLE_BACKEND",
+    "SEGMENT_DIR",
+    "SEGMENT_MAX_BYTES",
+    "SEGMENT_SPAN_S",
+    "SEGMENT_INDEX_STRIDE",
+    "SEGMENT_OPEN_MAX",
+    "SEGMENT_FSYNC",
+    "SAMPLE_COLD_HOURS",
+    "SAMPLE_BLOCK_S",
+    "SAMPLE_BLOCK_MAX",
+    "RESPONSE_CACHE_MAX_ENTRIES",
+    "RESPONSE_CACHE_TTL_S",
+    "STREAM_QUEUE_MAX",
+    "STREAM_HEARTBEAT_S",
+    "MQTT_ENABLED",
+    "MQTT_HOST",
+    "MQTT_PORT",
+    "MQTT_TOPIC",
+    "MQTT_QOS",
+    "MQTT_BATCH_MAX",
+    "MQTT_BATCH_MS",
+    "MQTT_QUEUE_MAX",
+    "MQTT_BLOCK_S",
+    "MQTT_CLIENT_ID",
     "RETENTION_HOURS",
+    "RETENTION_SAMPLES_HOURS",
+    "RETENTION_ALERTS_HOURS",
+    "RETENTION_READINGS_HOURS",
+    "RETENTION_ROLLUP_1M_HOURS",
+    "RETENTION_ROLLUP_1H_HOURS",
+    "RETENTION_SENSOR_HOURS",
+    "RETENTION_ENABLED",
+    "RETENTION_INTERVAL_S",
+    "RETENTION_BATCH",
+    "RETENTION_VACUUM_PAGES",
+    "CORTEX_DB_PATH",
     "SAMPLE_INTERVAL_S",
     "ANOMALY_Z_THRESHOLD",
+    "ANOMALY_WINDOW",
+    "ANOMALY_ALPHA",
+    "ALERT_EXIT_Z",
+    "ALERT_QUIET_S",
+    "ALERT_SWEEP_S",
+    "INGEST_BATCH_MAX",
+    "INGEST_FRAMES_MAX",
+    "INGEST_DICT_MAX",
+    "INGEST_DICT_SIZE_MAX",
+    "FLEET_MAX_SENSORS",
+    "EXPORT_CHUNK_ROWS",
     "API_TOKEN",
     "NOTIFY_DEDUP_SECONDS",
     "QUIET_HOURS",
@@ -68,4 +238,16 @@ __all__ = [
     "EMAIL_TO",
     "WEBHOOK_ENABLED",
     "WEBHOOK_URL",
+    "WEBHOOK_TIMEOUT_S",
+    "NOTIFY_QUEUE_MAX",
+    "NOTIFY_WORKERS",
+    "NOTIFY_MAX_ATTEMPTS",
+    "NOTIFY_BACKOFF_S",
+    "NOTIFY_SMTP_IDLE_S",
+    "NOTIFY_DEADLETTER_PATH",
+    "METRICS_ENABLED",
+    "METRICS_LOOP_LAG_INTERVAL_S",
+    "PROFILE_INTERVAL_MS",
+    "PROFILE_MAX_S",
+    "PROFILE_KEEP",
 ]
@@ -0,0 +1,139 @@
+# apps/sidecar/core/streaming.py
+"""
+Incremental (O(1) per sample) counterpart of `core.anomaly.run_predictions`.
+
+A StreamingDetector keeps the EWMA baseline plus running mean/variance of the
+last `window` residuals (Welford update with eviction), so scoring a new sample
+never re-reads history. The z it returns matches the last element of
+`run_predictions(...)[4]` over the same tail.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from apps.sidecar.core.settings import ANOMALY_ALPHA, ANOMALY_WINDOW
+
+MIN_WINDOW = 5  # same floor as core.anomaly.z_scores
+
+
+class StreamingDetector:
+    """Per-sensor EWMA baseline + rolling residual z-score."""
+
+    def __init__(self, window: int = ANOMALY_WINDOW, alpha: float = ANOMALY_ALPHA):
+        self.window = max(MIN_WINDOW, int(window))
+        self.alpha = float(alpha)
+        self.baseline: Optional[float] = None
+        self.z: float = 0.0
+        self.last_t: Optional[float] = None
+        self._res: Deque[float] = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._since_resync = 0
+        self._lock = threading.Lock()
+
+    @property
+    def n(self) -> int:
+        return len(self._res)
+
+    def _push(self, r: float) -> None:
+        self._res.append(r)
+        n = len(self._res)
+        d = r - self._mean
+        self._mean += d / n
+        self._m2 += d * (r - self._mean)
+
+    def _evict(self) -> None:
+        r = self._res.popleft()
+        n = len(self._res)
+        if n == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+            return
+        d = r - self._mean
+        self._mean -= d / n
+        self._m2 -= d * (r - self._mean)
+        if self._m2 < 0.0:
+            self._m2 = 0.0
+
+    def _resync(self) -> None:
+        # Recompute exactly once per window to stop floating-point drift (amortized O(1)).
+        n = len(self._res)
+        self._mean = sum(self._res) / n if n else 0.0
+        self._m2 = sum((r - self._mean) ** 2 for r in self._res)
+        self._since_resync = 0
+
+    def update(self, v: float, t: Optional[float] = None) -> float:
+        """Feed one sample; return its z-score."""
+        v = float(v)
+        with self._lock:
+            if self.baseline is None:
+                self.baseline = v
+            else:
+                self.baseline = self.alpha * v + (1 - self.alpha) * self.baseline
+            r = v - self.baseline
+            self._push(r)
+            if len(self._res) > self.window:
+                self._evict()
+            self._since_resync += 1
+            if self._since_resync >= self.window:
+                self._resync()
+
+            n = len(self._res)
+            var = self._m2 / max(1, n - 1)
+            sd = math.sqrt(var) if var > 1e-9 else 1e-6
+            self.z = (r - self._mean) / sd
+            if t is not None:
+                self.last_t = float(t)
+            return self.z
+
+    def seed(self, samples: Iterable[Tuple[float, float]]) -> None:
+        """Replay historical (t, v) pairs, oldest first."""
+        for t, v in samples:
+            self.update(v, t)
+
+    def snapshot(self) -> Tuple[Optional[float], float]:
+        """Current (baseline, z)."""
+        with self._lock:
+            return self.baseline, self.z
+
+
+# ---------- per-sensor registry ---------------------------------------------
+
+_DETECTORS: Dict[str, StreamingDetector] = {}
+_LOCK = threading.Lock()
+
+
+def get_detector(
+    sensor_id: str,
+    seed: Optional[Callable[[], Iterable[Tuple[float, float]]]] = None,
+) -> StreamingDetector:
+    """
+    Return the detector for a sensor, creating it on first use.
+    `seed` is called once at creation to replay recent history (oldest→newest),
+    e.g. after a restart.
+    """
+    det = _DETECTORS.get(sensor_id)
+    if det is not None:
+        return det
+    with _LOCK:
+        det = _DETECTORS.get(sensor_id)
+        if det is None:
+            det = StreamingDetector()
+            if seed is not None:
+                det.seed(seed())
+            _DETECTORS[sensor_id] = det
+    return det
+
+
+def peek(sensor_id: str) -> Optional[StreamingDetector]:
+    """The sensor's detector if it exists (never creates or seeds one)."""
+    return _DETECTORS.get(sensor_id)
+
+
+def reset(sensor_id: str) -> None:
+    """Drop a sensor's detector state (useful for tests)."""
+    with _LOCK:
+        _DETECTORS.pop(sensor_id, None)
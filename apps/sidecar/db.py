@@ -4,7 +4,9 @@ import aiosqlite
 from pathlib import Path
 from typing import List, Dict, Any
 
-DB_PATH = Path("data/cortex.db")
+from apps.sidecar.core.settings import CORTEX_DB_PATH
+
+DB_PATH = Path(CORTEX_DB_PATH)
 
 async def init_db() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -1,6 +1,7 @@
 # apps/sidecar/main.py
 from __future__ import annotations
 
+import threading
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
@@ -12,9 +13,29 @@ from apps.sidecar.api.health import router as health_router
 from apps.sidecar.api.predictive import router as predictive_router
 from apps.sidecar.api.alerts import router as alerts_router
 from apps.sidecar.api.ingest import router as ingest_router
+from apps.sidecar.api.stream import router as stream_router
+from apps.sidecar.api.export import router as export_router
+from apps.sidecar.api.metrics import router as metrics_router, MetricsMiddleware
+from apps.sidecar.api.admin import router as admin_router, ProfileMiddleware
 
 # Simulator (import concrete function directly)
 from apps.sidecar.workers.simulator import start as start_simulator
+from apps.sidecar.workers import alert_sweeper, mqtt_bridge, retention
+from apps.sidecar.core.settings import (
+    MQTT_ENABLED,
+    RETENTION_ENABLED,
+    METRICS_ENABLED,
+    METRICS_LOOP_LAG_INTERVAL_S,
+    SAMPLE_WARM_START,
+    SAMPLE_BACKEND,
+)
+from apps.sidecar.core import metrics
+from apps.sidecar.core.leader import claim
+from apps.sidecar.repositories.storage.writer import close_writer
+from apps.sidecar.repositories.storage.sqlite import close_read_conns
+from apps.sidecar.repositories.storage.rollup_repo import RollupRepo
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.services.notify import stop_dispatcher
 
 # -------- Config --------
 BASE_DIR = Path(__file__).resolve().parent
@@ -41,6 +62,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency histograms for /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# On-demand profiling of single requests (X-Profile: 1 + X-API-Key)
+app.add_middleware(ProfileMiddleware)
+
 # Static assets (HTML/CSS/JS)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -56,9 +83,50 @@ app.include_router(health_router)       # /health
 app.include_router(predictive_router)   # /predictive/series, /predictive/ingest
 app.include_router(alerts_router)       # /alerts
 app.include_router(ingest_router)       # /ingest
+app.include_router(stream_router)       # /stream (SSE)
+app.include_router(export_router)       # /export/samples (X-API-Key)
+if METRICS_ENABLED:
+    app.include_router(metrics_router)  # /metrics
+app.include_router(admin_router)        # /admin/profiles, /admin/memory (X-API-Key)
 
-# Backgrounds (simulator)
+# Backgrounds (simulator, MQTT bridge, retention, alert sweep)
 @app.on_event("startup")
 def _start_backgrounds() -> None:
+    # every worker: load recent samples from SQLite so dashboards are not blank after a restart
+    if SAMPLE_WARM_START:
+        threading.Thread(target=sample_store.warm_start, name="warm-start", daemon=True).start()
+    # every worker: close alert episodes of sensors that went quiet (trackers are per process)
+    alert_sweeper.start()
+    # with several uvicorn workers only one runs these (the others just serve)
+    if not claim("backgrounds"):
+        return
     if ENABLE_SIMULATOR:
         start_simulator(sensor_id=SIM_SENSOR_ID, period=SIM_PERIOD_SEC)
+    if MQTT_ENABLED:
+        mqtt_bridge.start()
+    if RETENTION_ENABLED:
+        retention.start()
+    # switching to segment storage: copy the SQLite samples over once
+    if SAMPLE_BACKEND == "segments":
+        from apps.sidecar.repositories.storage.segment_repo import SegmentSampleRepo
+        threading.Thread(target=SegmentSampleRepo().import_sqlite, name="segment-import", daemon=True).start()
+    # build 1m/1h rollups for samples stored before rollups existed
+    threading.Thread(target=RollupRepo().backfill_if_empty, name="rollup-backfill", daemon=True).start()
+
+@app.on_event("startup")
+async def _start_metrics() -> None:
+    # every worker: lag is per event loop
+    if METRICS_ENABLED:
+        metrics.start_loop_monitor(METRICS_LOOP_LAG_INTERVAL_S)
+
+@app.on_event("shutdown")
+def _stop_backgrounds() -> None:
+    metrics.stop_loop_monitor()
+    mqtt_bridge.stop()
+    retention.stop()
+    alert_sweeper.stop()
+    # commit whatever the SQLite writer still has queued
+    close_writer()
+    close_read_conns()
+    # deliver (or dead-letter) queued notifications
+    stop_dispatcher()
@@ -7,12 +7,16 @@ AlertKind = Literal["anomaly"]
 
 class AlertEvent(BaseModel):
     sensor_id: str
-    t: float          # unix seconds
-    v: float          # value at time t
-    z: float          # residual z-score at time t
+    t: float          # unix seconds (episode start)
+    v: float          # value at the episode's peak |z|
+    z: float          # peak residual z-score
     kind: AlertKind = "anomaly"
     msg: str | None = None
+    n: int = 1                   # samples in the episode
+    last_t: float | None = None  # last sample that kept it open
+    active: bool = False         # still open
 
 class AlertsResp(BaseModel):
     sensor_id: str
-    items: List[AlertEvent]
+    items: List[AlertEvent]      # oldest→newest
+    cursor: int | None = None    # change number: pass back as `after` to get alerts inserted or updated since
@@ -1,6 +1,6 @@
 # apps/sidecar/models/predictive.py
 from __future__ import annotations
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 class SeriesResp(BaseModel):
@@ -15,3 +15,35 @@ class SeriesResp(BaseModel):
     anomalies_idx: List[int]  # indices into ts/vals flagged as anomalies
     future_ts: List[float]    # projected timestamps (UNIX seconds)
     future_preds: List[float] # projected values aligned to future_ts
+
+class HistoryResp(BaseModel):
+    """
+    Long-range history for trend charts, served from the coarsest storage that
+    fits the point budget: raw samples, or 1m / 1h rollup buckets.
+    """
+    sensor_id: str
+    resolution: str           # "raw", "1m" or "1h"
+    ts: List[float]           # bucket start (sample time for raw)
+    mean: List[float]
+    vmin: List[float]
+    vmax: List[float]
+    count: List[int]          # samples per bucket (1 for raw)
+    last: List[float]         # last value in each bucket
+
+class FleetItem(BaseModel):
+    """One sensor's entry in a fleet response (same fields as SeriesResp, compacted)."""
+    sensor_id: str
+    ts: List[float]
+    vals: List[float]
+    preds: List[float]
+    anomalies_idx: List[int]
+    z_last: float             # z of the newest sample
+    future_pred: Optional[float]  # hold-last-value projection, valid for `future_steps` steps
+
+class FleetResp(BaseModel):
+    """Predictive overlay for many sensors, scored in one vectorized pass."""
+    window_s: int
+    alpha: float
+    future_steps: int
+    items: List[FleetItem]
+    missing: List[str]        # requested sensors with no buffered data
@@ -6,16 +6,18 @@ from __future__ import annotations
 from typing import List, Tuple, Dict
 import numpy as np
 
+from apps.sidecar.core.anomaly import ewma_filter
+
 
 def ewma(y: np.ndarray, alpha: float = 0.3) -> np.ndarray:
-    """Exponentially Weighted Moving Average."""
+    """Exponentially Weighted Moving Average (of the previous sample)."""
     if y.size == 0:
         return y
-    out = np.empty_like(y, dtype=float)
-    out[0] = y[0]
-    for i in range(1, y.size):
-        out[i] = alpha * y[i - 1] + (1 - alpha) * out[i - 1]
-    return out
+    # out[i] = alpha*y[i-1] + (1-alpha)*out[i-1]: the shared filter on y lagged by one
+    lagged = np.empty(y.size, dtype=float)
+    lagged[0] = y[0]  # never read by the recurrence, but must be a finite number
+    lagged[1:] = y[:-1]
+    return ewma_filter(lagged, alpha, float(y[0]))
 
 
 def one_step_ahead_preds(y: np.ndarray, alpha: float = 0.3) -> np.ndarray:
@@ -1,33 +1,102 @@
 # apps/sidecar/repositories/alerts_repo.py
 from __future__ import annotations
+import threading
+import time
 from collections import deque
-from typing import Deque, Dict, List
+from typing import Any, Deque, Dict, List, Optional
+from apps.sidecar.core.settings import BUFFER_BACKEND
 from apps.sidecar.models.alerts import AlertEvent
+from apps.sidecar.repositories.storage.alert_repo import AlertRepo
 
-# Per-sensor rolling store of alert events (in-memory).
-# Easy to swap for SQLite/Influx later.
+# Per-sensor in-memory tail of the persisted alert log (SQLite `alerts` table).
+# Hydrated from SQLite the first time a sensor is touched, then kept current as
+# alert episodes open and progress, so reads never hit the database in the
+# common case.
 MAX_ALERTS_PER_SENSOR = 500
 _STORE: Dict[str, Deque[AlertEvent]] = {}
+_SEQ: Dict[str, int] = {}  # bumps on every change; used as a cache version
+_LOCK = threading.Lock()
+
+# With several worker processes (shared buffer backend) other workers insert
+# and update alerts too: the tail is re-hydrated whenever the sensor's newest
+# committed change number (alerts.seq) differs from the one seen at the last
+# hydrate. That probe (one index seek) runs at most every _SYNC_INTERVAL_S per
+# sensor, so other workers' alerts show up here within that delay.
+_MULTIPROCESS = BUFFER_BACKEND == "shared"
+_SYNC_INTERVAL_S = 0.25
+_SYNCED: Dict[str, Any] = {}
+_CHECKED: Dict[str, float] = {}  # sensor -> monotonic time of its last probe
+
+def _stale(sensor_id: str) -> bool:
+    if not _MULTIPROCESS:
+        return False
+    now = time.monotonic()
+    if now - _CHECKED.get(sensor_id, -_SYNC_INTERVAL_S) < _SYNC_INTERVAL_S:
+        return False
+    _CHECKED[sensor_id] = now
+    return AlertRepo().max_seq(sensor_id) != _SYNCED.get(sensor_id)
 
 def _dq(sensor_id: str) -> Deque[AlertEvent]:
-    if sensor_id not in _STORE:
-        _STORE[sensor_id] = deque(maxlen=MAX_ALERTS_PER_SENSOR)
-    return _STORE[sensor_id]
+    dq = _STORE.get(sensor_id)
+    refresh = _stale(sensor_id)
+    if dq is not None and not refresh:
+        return dq
+    with _LOCK:
+        if sensor_id not in _STORE or refresh:
+            if _MULTIPROCESS:
+                # read seq first: a write racing the query only causes another refresh
+                _SYNCED[sensor_id] = AlertRepo().max_seq(sensor_id)
+                _CHECKED[sensor_id] = time.monotonic()
+                _SEQ[sensor_id] = _SEQ.get(sensor_id, 0) + 1
+            rows = AlertRepo().get_alerts(sensor_id, limit=MAX_ALERTS_PER_SENSOR)
+            dq = deque(maxlen=MAX_ALERTS_PER_SENSOR)
+            for r in reversed(rows):  # DB returns newest first
+                dq.append(AlertEvent(**{k: r[k] for k in ("sensor_id", "t", "v", "z", "msg", "n", "last_t", "active")}))
+            _STORE[sensor_id] = dq
+        return _STORE[sensor_id]
 
-def replace_all(sensor_id: str, items: List[AlertEvent]) -> None:
-    """Replace the alert list for a sensor (used by rebuild)."""
+def append(sensor_id: str, item: AlertEvent) -> None:
     dq = _dq(sensor_id)
-    dq.clear()
-    dq.extend(items[-MAX_ALERTS_PER_SENSOR:])
+    with _LOCK:
+        dq.append(item)
+        _SEQ[sensor_id] = _SEQ.get(sensor_id, 0) + 1
 
-def append(sensor_id: str, item: AlertEvent) -> None:
-    _dq(sensor_id).append(item)
+def upsert(sensor_id: str, item: AlertEvent) -> None:
+    """Replace the cached alert with the same start t (an episode that progressed), else append."""
+    dq = _dq(sensor_id)
+    with _LOCK:
+        for i in range(len(dq) - 1, max(-1, len(dq) - 9), -1):  # open episodes sit at the end
+            if dq[i].t == item.t:
+                dq[i] = item
+                break
+        else:
+            dq.append(item)
+        _SEQ[sensor_id] = _SEQ.get(sensor_id, 0) + 1
+
+def version(sensor_id: str) -> int:
+    if _MULTIPROCESS:
+        _dq(sensor_id)  # picks up other workers' alerts (bumps _SEQ)
+    return _SEQ.get(sensor_id, 0)
 
 def recent(sensor_id: str, limit: int = 50) -> List[AlertEvent]:
     dq = _dq(sensor_id)
+    with _LOCK:
+        items = list(dq)
     if limit <= 0:
-        return list(dq)
-    return list(dq)[-limit:]
+        return items
+    return items[-limit:]
+
+def touch(sensor_id: str) -> None:
+    """Bump the cache version (e.g. once queued alert writes have committed)."""
+    with _LOCK:
+        _SEQ[sensor_id] = _SEQ.get(sensor_id, 0) + 1
+
+def stats() -> dict:
+    """Size of the tail cache (admin memory report)."""
+    with _LOCK:
+        return {"sensors": len(_STORE), "events": sum(len(dq) for dq in _STORE.values())}
 
 def clear(sensor_id: str) -> None:
-    _STORE.pop(sensor_id, None)
+    with _LOCK:
+        _STORE.pop(sensor_id, None)
+        _SEQ[sensor_id] = _SEQ.get(sensor_id, 0) + 1
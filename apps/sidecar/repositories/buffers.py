@@ -1,41 +1,266 @@
 # apps/sidecar/repositories/buffers.py
 from __future__ import annotations
-from collections import deque
-from typing import Deque, Dict, List, TypedDict
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+from apps.sidecar.core import metrics
+from apps.sidecar.core.settings import (
+    BUFFER_VALUE_DTYPE,
+    BUFFER_BACKEND,
+    BUFFER_SHM_PATH,
+    BUFFER_SHM_MAX_SENSORS,
+)
+
+log = logging.getLogger(__name__)
 
 class Sample(TypedDict):
     t: float  # unix seconds
     v: float  # value
 
-# In-memory ring buffers per sensor. Easy to swap for SQLite later.
+# In-memory ring buffers per sensor: the recent-window cache in front of the
+# SQLite `samples` table. Go through repositories/sample_store, which writes
+# both and hydrates these from SQLite.
 MAX_POINTS: int = 10_000
-_DATA: Dict[str, Deque[Sample]] = {}
 
-def _buf(sensor_id: str) -> Deque[Sample]:
-    if sensor_id not in _DATA:
-        _DATA[sensor_id] = deque(maxlen=MAX_POINTS)
-    return _DATA[sensor_id]
+
+class RingBuffer:
+    """
+    Fixed-capacity (t, v) ring on two preallocated contiguous arrays.
+
+    Every slot is written twice (at i and i + capacity), so the live region,
+    oldest→newest, is always one contiguous slice: windows are a binary search
+    plus a slice, with no wrap-around handling. Timestamps are always float64
+    (epoch seconds do not fit float32); values use `dtype`.
+    A lock makes appends (simulator thread) and snapshots (request threads) safe.
+    """
+
+    def __init__(self, capacity: int = MAX_POINTS, dtype: str = BUFFER_VALUE_DTYPE):
+        self.capacity = int(capacity)
+        self._t = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._v = np.zeros(2 * self.capacity, dtype=dtype)
+        self._head = 0          # next slot in [0, capacity)
+        self._count = 0
+        self._sorted = True     # False once an out-of-order t arrives
+        self.seq = 0            # total appends; bumps on every write
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._t.nbytes + self._v.nbytes
+
+    def append(self, t: float, v: float) -> None:
+        cap = self.capacity
+        with self._lock:
+            if self._count and t < self._t[self._head + cap - 1]:
+                self._sorted = False
+            h = self._head
+            self._t[h] = self._t[h + cap] = t
+            self._v[h] = self._v[h + cap] = v
+            self._head = (h + 1) % cap
+            self._count = min(self._count + 1, cap)
+            self.seq += 1
+
+    def extend(self, ts: np.ndarray, vs: np.ndarray) -> None:
+        """Vectorized append of aligned arrays (oldest→newest)."""
+        ts = np.asarray(ts, dtype=np.float64)
+        vs = np.asarray(vs, dtype=self._v.dtype)
+        n = ts.size
+        if n == 0:
+            return
+        cap = self.capacity
+        with self._lock:
+            if (self._count and ts[0] < self._t[self._head + cap - 1]) or (n > 1 and np.any(np.diff(ts) < 0)):
+                self._sorted = False
+            keep = min(n, cap)
+            idx = (self._head + (n - keep) + np.arange(keep)) % cap
+            self._t[idx] = self._t[idx + cap] = ts[n - keep:]
+            self._v[idx] = self._v[idx + cap] = vs[n - keep:]
+            self._head = (self._head + n) % cap
+            self._count = min(self._count + n, cap)
+            self.seq += n
+
+    def merge(self, ts: np.ndarray, vs: np.ndarray) -> None:
+        """
+        Fold older/overlapping samples (e.g. history loaded from SQLite) into
+        the ring: union with the live samples, sorted by t, one sample per t
+        (the buffered one wins), newest `capacity` kept.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        vs = np.asarray(vs, dtype=self._v.dtype)
+        if ts.size == 0:
+            return
+        cap = self.capacity
+        with self._lock:
+            lo, hi = self._live()
+            all_t = np.concatenate([ts, self._t[lo:hi]])
+            all_v = np.concatenate([vs, self._v[lo:hi]])
+            order = np.argsort(all_t, kind="stable")  # ties: buffered sample last
+            all_t, all_v = all_t[order], all_v[order]
+            last = np.append(all_t[1:] != all_t[:-1], True)
+            all_t, all_v = all_t[last][-cap:], all_v[last][-cap:]
+            n = all_t.size
+            self._t[:n] = self._t[cap:cap + n] = all_t
+            self._v[:n] = self._v[cap:cap + n] = all_v
+            self._head = n % cap
+            self._count = n
+            self._sorted = True
+            self.seq += 1
+
+    def _live(self) -> Tuple[int, int]:
+        end = self._head + self.capacity
+        return end - self._count, end
+
+    def view(self, cutoff_ts: Optional[float] = None, min_points: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Zero-copy (ts, vals) views of samples with t >= cutoff_ts (all if None).
+        If fewer than `min_points` qualify, the newest `min_points` are returned.
+        Views alias the ring: later appends may overwrite them, so take
+        `snapshot()` when the data must outlive the call.
+        """
+        lo, hi = self._live()
+        ts, vs = self._t[lo:hi], self._v[lo:hi]
+        if cutoff_ts is None:
+            return ts, vs
+        if self._sorted:
+            i = int(np.searchsorted(ts, cutoff_ts, side="left"))
+            if hi - lo - i < min_points:
+                i = max(0, hi - lo - min_points)
+            return ts[i:], vs[i:]
+        # out-of-order data: fall back to a mask (copies)
+        mask = ts >= cutoff_ts
+        if int(mask.sum()) < min_points:
+            k = min(min_points, ts.size)
+            return ts[ts.size - k:], vs[vs.size - k:]
+        return ts[mask], vs[mask]
+
+    def snapshot(self, cutoff_ts: Optional[float] = None, min_points: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Like `view()`, but consistent and owned: copied under the lock."""
+        with self._lock:
+            ts, vs = self.view(cutoff_ts, min_points)
+            return ts.copy(), vs.astype(np.float64, copy=True)
+
+
+_DATA: Dict[str, RingBuffer] = {}
+_DATA_LOCK = threading.Lock()
+
+# SIDECAR_BUFFER_BACKEND=shared: rings live in an mmap'd file shared by every
+# worker process (see shared_buffers). _DATA then only caches handles.
+_SHARED = None
+
+def _shared():
+    global _SHARED
+    if _SHARED is None and BUFFER_BACKEND == "shared":
+        with _DATA_LOCK:
+            if _SHARED is None:
+                from apps.sidecar.repositories.shared_buffers import SharedBufferStore
+                _SHARED = SharedBufferStore(BUFFER_SHM_PATH, MAX_POINTS, BUFFER_VALUE_DTYPE, BUFFER_SHM_MAX_SENSORS)
+    return _SHARED
+
+def _new_buffer(sensor_id: str) -> RingBuffer:
+    store = _shared()
+    if store is not None:
+        try:
+            return store.get(sensor_id, create=True)
+        except (MemoryError, ValueError) as e:
+            log.warning("buffer for %s stays process-local: %s", sensor_id, e)
+    return RingBuffer(MAX_POINTS)
+
+def _buf(sensor_id: str) -> RingBuffer:
+    buf = _DATA.get(sensor_id)
+    if buf is None:
+        buf = _new_buffer(sensor_id)
+        with _DATA_LOCK:
+            buf = _DATA.setdefault(sensor_id, buf)
+    return buf
+
+def get(sensor_id: str) -> Optional[RingBuffer]:
+    """Return the sensor's ring buffer, or None if it has no data."""
+    buf = _DATA.get(sensor_id)
+    if buf is None and _shared() is not None:
+        # possibly created by another worker
+        buf = _SHARED.get(sensor_id)
+        if buf is not None:
+            with _DATA_LOCK:
+                buf = _DATA.setdefault(sensor_id, buf)
+    return buf
+
+def version(sensor_id: str) -> Tuple[int, int]:
+    """Changes whenever the sensor's buffer is appended to (or replaced)."""
+    buf = get(sensor_id)
+    if buf is None:
+        return (0, 0)
+    # shared rings: identical across workers, so ETags are too
+    key = getattr(buf, "slot", None)
+    return (id(buf) if key is None else key, buf.seq)
 
 def append(sensor_id: str, t: float, v: float) -> None:
     """Append a sample to the sensor's ring buffer."""
-    _buf(sensor_id).append({"t": float(t), "v": float(v)})
+    _buf(sensor_id).append(float(t), float(v))
+
+def extend(sensor_id: str, ts: np.ndarray, vs: np.ndarray) -> None:
+    """Append aligned arrays of samples to the sensor's ring buffer."""
+    _buf(sensor_id).extend(ts, vs)
+
+def merge(sensor_id: str, ts: np.ndarray, vs: np.ndarray) -> None:
+    """Fold older samples into the sensor's ring buffer (see RingBuffer.merge)."""
+    _buf(sensor_id).merge(ts, vs)
+
+def snapshot(sensor_id: str, cutoff_ts: Optional[float] = None, min_points: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (ts, vals) float64 arrays with t >= cutoff_ts (oldest→newest).
+    Falls back to the newest `min_points` samples when the window is sparser.
+    """
+    buf = get(sensor_id)
+    if buf is None:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+    return buf.snapshot(cutoff_ts, min_points)
 
 def all_samples(sensor_id: str) -> List[Sample]:
     """Return a copy of all samples for a sensor (oldest→newest)."""
-    return list(_DATA.get(sensor_id, []))
+    ts, vs = snapshot(sensor_id)
+    return [{"t": t, "v": v} for t, v in zip(ts.tolist(), vs.tolist())]
 
 def window(sensor_id: str, cutoff_ts: float) -> List[Sample]:
     """Return samples with t >= cutoff_ts."""
-    buf = _DATA.get(sensor_id, [])
-    if not buf:
-        return []
-    # Deque is ordered oldest→newest; filter in order
-    return [s for s in buf if s["t"] >= float(cutoff_ts)]
+    ts, vs = snapshot(sensor_id, float(cutoff_ts))
+    return [{"t": t, "v": v} for t, v in zip(ts.tolist(), vs.tolist())]
 
 def clear(sensor_id: str) -> None:
     """Clear a sensor's buffer (useful for tests)."""
+    buf = get(sensor_id)
+    if hasattr(buf, "reset"):
+        buf.reset()  # shared slot: emptied for every worker, never freed
+        return
     _DATA.pop(sensor_id, None)
 
+@metrics.collector
+def _collect_sizes() -> None:
+    metrics.BUFFER_SAMPLES.clear()
+    metrics.BUFFER_BYTES.clear()
+    for sensor_id in sensors():
+        buf = get(sensor_id)
+        if buf is not None:
+            metrics.BUFFER_SAMPLES.labels(sensor_id).set(len(buf))
+            metrics.BUFFER_BYTES.labels(sensor_id).set(buf.nbytes)
+
+def stats() -> dict:
+    """Ring count, samples held and bytes reserved (admin memory report)."""
+    bufs = [b for b in (get(sid) for sid in sensors()) if b is not None]
+    return {
+        "backend": "shared" if _shared() is not None else "memory",
+        "sensors": len(bufs),
+        "samples": sum(len(b) for b in bufs),
+        "bytes": sum(b.nbytes for b in bufs),
+    }
+
 def sensors() -> List[str]:
     """List sensor IDs currently present."""
+    if _shared() is not None:
+        return list(dict.fromkeys(_SHARED.sensors() + list(_DATA.keys())))
     return list(_DATA.keys())
@@ -0,0 +1,168 @@
+# apps/sidecar/repositories/sample_store.py
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from apps.sidecar.core.settings import SAMPLE_MISS_MAX, SAMPLE_MISS_TTL_S, SAMPLE_WARM_HOURS
+from apps.sidecar.repositories import buffers
+from apps.sidecar.repositories.storage.sample_repo import SampleRepo
+
+log = logging.getLogger(__name__)
+
+# The one sample store. SampleRepo (SQLite `samples`, or segment files with
+# SIDECAR_SAMPLE_BACKEND=segments) is the source of truth; the per-sensor
+# ring buffers (repositories/buffers) hold each sensor's recent window in
+# memory. Writes go to both (write-through); reads are served from the
+# buffers, which are hydrated from storage with one range read per sensor:
+# all sensors at startup (warm_start) or a single sensor on first access.
+
+Reading = Tuple[str, float, float]  # (sensor_id, t, v)
+Group = Tuple[str, np.ndarray, np.ndarray]  # (sensor_id, ts oldest→newest, vs)
+
+# sensors loaded from storage (only ones that have samples)
+_HYDRATED: Set[str] = set()
+_HYDRATE_LOCKS: Dict[str, threading.Lock] = {}  # only while a hydrate is running
+# ids storage had nothing for -> monotonic time of the probe: unknown ids
+# (typos, scanners, dashboards polling retired sensors) would otherwise cost a
+# storage read on every snapshot/version call. Bounded (oldest dropped), and
+# forgotten after SAMPLE_MISS_TTL_S or as soon as this process writes the id.
+_MISSES: "OrderedDict[str, float]" = OrderedDict()
+_LOCK = threading.Lock()
+
+
+# ---------- hydration ----------
+
+def hydrate(sensor_id: str, now: Optional[float] = None) -> int:
+    """
+    Load the sensor's newest samples (up to the buffer capacity, no older than
+    SAMPLE_WARM_HOURS) from SQLite into its buffer, once. Samples written
+    through meanwhile are kept (merge). Returns the number of rows loaded.
+    """
+    if sensor_id in _HYDRATED:
+        return 0
+    missed = _MISSES.get(sensor_id)
+    if missed is not None and time.monotonic() - missed < SAMPLE_MISS_TTL_S:
+        return 0
+    with _LOCK:
+        lock = _HYDRATE_LOCKS.setdefault(sensor_id, threading.Lock())
+    try:
+        with lock:
+            if sensor_id in _HYDRATED:
+                return 0
+            now = time.time() if now is None else now
+            start_ts = now - SAMPLE_WARM_HOURS * 3600.0 if SAMPLE_WARM_HOURS > 0 else None
+            ts, vs = SampleRepo().get_arrays(sensor_id, start_ts=start_ts, limit=buffers.MAX_POINTS)
+            if ts.size:
+                buffers.merge(sensor_id, ts, vs)
+            if ts.size or buffers.get(sensor_id) is not None:
+                _HYDRATED.add(sensor_id)
+                _forget_miss(sensor_id)
+            else:
+                _remember_miss(sensor_id)
+            return int(ts.size)
+    finally:
+        with _LOCK:
+            if _HYDRATE_LOCKS.get(sensor_id) is lock:
+                del _HYDRATE_LOCKS[sensor_id]
+
+
+def _remember_miss(sensor_id: str) -> None:
+    with _LOCK:
+        _MISSES[sensor_id] = time.monotonic()
+        _MISSES.move_to_end(sensor_id)
+        while len(_MISSES) > max(0, SAMPLE_MISS_MAX):
+            _MISSES.popitem(last=False)
+
+
+def _forget_miss(sensor_id: str) -> None:
+    if sensor_id in _MISSES:
+        with _LOCK:
+            _MISSES.pop(sensor_id, None)
+
+
+def warm_start() -> Dict[str, int]:
+    """Hydrate every sensor known to SQLite (startup, in a background thread)."""
+    started = time.monotonic()
+    loaded: Dict[str, int] = {}
+    now = time.time()
+    for sensor_id in SampleRepo().sensor_ids():
+        try:
+            loaded[sensor_id] = hydrate(sensor_id, now)
+        except Exception:
+            log.exception("sample store: failed to hydrate %s", sensor_id)
+    log.info("sample store: hydrated %d sensors (%d samples) in %.2fs",
+             len(loaded), sum(loaded.values()), time.monotonic() - started)
+    return loaded
+
+
+# ---------- writes (SQLite + buffer) ----------
+
+def submit(readings: Sequence[Reading], *, block: bool = True) -> Future:
+    """
+    Queue readings for SQLite and append them to the buffers. Returns the
+    commit Future. Raises queue.Full (nothing buffered) when block=False and
+    the write queue is saturated.
+    """
+    fut = SampleRepo().submit_samples(readings, block=block)
+    by_sensor: Dict[str, List[Tuple[float, float]]] = {}
+    for sensor_id, t, v in readings:
+        by_sensor.setdefault(sensor_id, []).append((t, v))
+    for sensor_id, pts in by_sensor.items():
+        _forget_miss(sensor_id)
+        pts.sort()
+        arr = np.asarray(pts, dtype=np.float64)
+        buffers.extend(sensor_id, arr[:, 0], arr[:, 1])
+    return fut
+
+
+def submit_grouped(groups: Sequence[Group], *, block: bool = True) -> Future:
+    """
+    Array form of `submit` for readings already grouped per sensor and sorted
+    by t: the buffers take the arrays as they are, only SQLite needs rows.
+    """
+    rows = [row for sensor_id, ts, vs in groups for row in zip(repeat(sensor_id), ts.tolist(), vs.tolist())]
+    fut = SampleRepo().submit_samples(rows, block=block)
+    for sensor_id, ts, vs in groups:
+        _forget_miss(sensor_id)
+        buffers.extend(sensor_id, ts, vs)
+    return fut
+
+
+def append(sensor_id: str, t: float, v: float, *, block: bool = True) -> Future:
+    """Write-through of a single sample."""
+    return submit([(sensor_id, float(t), float(v))], block=block)
+
+
+# ---------- reads (memory) ----------
+
+def snapshot(sensor_id: str, cutoff_ts: Optional[float] = None, min_points: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(ts, vals) float64 arrays from the buffer; see buffers.snapshot."""
+    hydrate(sensor_id)
+    return buffers.snapshot(sensor_id, cutoff_ts, min_points)
+
+
+def tail(sensor_id: str, n: int, before_t: Optional[float] = None) -> List[Tuple[float, float]]:
+    """Newest `n` (t, v) samples, optionally only those older than `before_t`."""
+    ts, vs = snapshot(sensor_id)
+    if before_t is not None:
+        keep = ts < before_t
+        ts, vs = ts[keep], vs[keep]
+    return list(zip(ts[-n:].tolist(), vs[-n:].tolist()))
+
+
+def version(sensor_id: str) -> Tuple[int, int]:
+    """Cache version of the sensor's samples (moves on every write)."""
+    hydrate(sensor_id)
+    return buffers.version(sensor_id)
+
+
+def sensors() -> List[str]:
+    """Sensors with buffered samples (all of SQLite's once warm_start ran)."""
+    return buffers.sensors()
@@ -0,0 +1,275 @@
+# apps/sidecar/repositories/shared_buffers.py
+from __future__ import annotations
+import fcntl
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from apps.sidecar.repositories.buffers import RingBuffer
+
+# Cross-process backend for repositories/buffers (SIDECAR_BUFFER_BACKEND=shared).
+#
+# One mmap'd file holds a header, a sensor directory and a fixed number of
+# slots, each a RingBuffer laid out in place (control words + mirrored t/v
+# arrays), so every uvicorn worker maps the same rings:
+#
+#   [header page(s)]  magic | capacity | max_sensors | itemsize | dtype | n_sensors | names[max_sensors]
+#   [slot 0]          control page (seq, head, count, unsorted, appended) | t[2*cap] | v[2*cap]
+#   [slot 1] ...
+#
+# Writers: one at a time per slot, serialized across processes by an fcntl
+# byte-range lock on the slot (plus a thread lock, since fcntl locks are per
+# process). HTTP ingest for a sensor may land in any worker, so a slot has no
+# single writer process and the lock stays; it costs ~0.7 us per uncontended
+# append, the control words are plain memoryview ints to keep the rest of the
+# hot path near the in-memory ring. Readers take no lock: a seqlock (seq odd
+# while a write is in progress) tells them to retry if a write overlapped
+# their copy. Directory
+# inserts take a range lock on the header and publish the name before bumping
+# n_sensors. Slots are never freed; the file survives restarts (warm buffers).
+
+_MAGIC = b"SCBUF001"
+_PAGE = 4096
+_NAME_BYTES = 128               # per directory entry: u16 length + utf-8 name
+_HDR_FIELDS = 5                 # capacity, max_sensors, itemsize, dtype char, n_sensors
+_N_SENSORS = 4
+_DIR_OFFSET = 64
+
+# control words of a slot (uint64)
+_SEQ, _HEAD, _COUNT, _UNSORTED, _APPENDED = range(5)
+
+_READ_RETRIES = 64
+
+
+def _align(n: int) -> int:
+    return (n + _PAGE - 1) // _PAGE * _PAGE
+
+
+class _SlotLock:
+    """
+    Exclusive access to one slot: thread lock + fcntl range lock. With
+    `write=True` the seqlock counter is made odd for the duration, so
+    lock-free readers know to retry.
+    """
+
+    def __init__(self, fd: int, offset: int, length: int, ctl: memoryview, write: bool):
+        self._fd, self._offset, self._length = fd, offset, length
+        self._ctl = ctl
+        self._write = write
+        self._thread_lock = threading.Lock()
+
+    def writing(self) -> "_SlotLock":
+        twin = _SlotLock(self._fd, self._offset, self._length, self._ctl, True)
+        twin._thread_lock = self._thread_lock
+        return twin
+
+    def __enter__(self) -> "_SlotLock":
+        self._thread_lock.acquire()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self._length, self._offset)
+        if self._write:
+            ctl = self._ctl
+            seq = ctl[_SEQ]
+            # odd: a writer died mid-write; its lock is gone, resume from even
+            ctl[_SEQ] = seq + 2 if seq & 1 else seq + 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._write:
+            self._ctl[_SEQ] += 1
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, self._length, self._offset)
+        self._thread_lock.release()
+
+
+class SharedRingBuffer(RingBuffer):
+    """
+    RingBuffer whose arrays and state live in a slot of the shared file.
+    Appends/extends run RingBuffer's code under the slot's write lock;
+    snapshots are lock-free (seqlock retry, lock as a last resort).
+    """
+
+    def __init__(self, mm: mmap.mmap, fd: int, slot: int, offset: int, slot_size: int, capacity: int, dtype: np.dtype):
+        self.slot = slot  # 1-based directory index, same in every process
+        self.capacity = int(capacity)
+        self._ctl = memoryview(mm)[offset:offset + 64].cast("Q")  # control words as Python ints
+        self._t = np.ndarray((2 * self.capacity,), dtype=np.float64, buffer=mm, offset=offset + _PAGE)
+        self._v = np.ndarray((2 * self.capacity,), dtype=dtype, buffer=mm,
+                             offset=offset + _PAGE + 16 * self.capacity)
+        self._exclusive = _SlotLock(fd, offset, slot_size, self._ctl, write=False)
+        self._lock = self._exclusive.writing()  # what RingBuffer.append/extend take
+
+    # RingBuffer state, backed by the slot's control words
+    @property
+    def _head(self) -> int:
+        return self._ctl[_HEAD]
+
+    @_head.setter
+    def _head(self, value: int) -> None:
+        self._ctl[_HEAD] = value
+
+    @property
+    def _count(self) -> int:
+        return self._ctl[_COUNT]
+
+    @_count.setter
+    def _count(self, value: int) -> None:
+        self._ctl[_COUNT] = value
+
+    @property
+    def _sorted(self) -> bool:
+        return not self._ctl[_UNSORTED]
+
+    @_sorted.setter
+    def _sorted(self, value: bool) -> None:
+        self._ctl[_UNSORTED] = 0 if value else 1
+
+    @property
+    def seq(self) -> int:
+        return self._ctl[_APPENDED]
+
+    @seq.setter
+    def seq(self, value: int) -> None:
+        self._ctl[_APPENDED] = value
+
+    def append(self, t: float, v: float) -> None:
+        """RingBuffer.append on the control words directly (the per-sample hot path)."""
+        cap, ctl = self.capacity, self._ctl
+        with self._lock:
+            h, count = ctl[_HEAD], ctl[_COUNT]
+            if count and t < self._t[h + cap - 1]:
+                ctl[_UNSORTED] = 1
+            self._t[h] = self._t[h + cap] = t
+            self._v[h] = self._v[h + cap] = v
+            ctl[_HEAD] = (h + 1) % cap
+            ctl[_COUNT] = min(count + 1, cap)
+            ctl[_APPENDED] += 1
+
+    def snapshot(self, cutoff_ts: Optional[float] = None, min_points: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Consistent owned copy without taking the writer lock."""
+        ctl = self._ctl
+        for _ in range(_READ_RETRIES):
+            before = ctl[_SEQ]
+            if before & 1:
+                time.sleep(0)  # write in progress
+                continue
+            ts, vs = self.view(cutoff_ts, min_points)
+            ts, vs = ts.copy(), vs.astype(np.float64, copy=True)
+            if ctl[_SEQ] == before:
+                return ts, vs
+        # sustained contention (or a stuck writer): read under the lock
+        with self._exclusive:
+            ts, vs = self.view(cutoff_ts, min_points)
+            return ts.copy(), vs.astype(np.float64, copy=True)
+
+    def reset(self) -> None:
+        """Drop all samples (the slot keeps its sensor)."""
+        with self._lock:
+            self._head = 0
+            self._count = 0
+            self._sorted = True
+            self.seq += 1  # moves version() so cached responses are dropped
+
+
+class SharedBufferStore:
+    """The mmap'd file: header, sensor directory and per-sensor SharedRingBuffers."""
+
+    def __init__(self, path: str, capacity: int, dtype: str, max_sensors: int):
+        self.path = path
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self.max_sensors = int(max_sensors)
+        self.header_size = _align(_DIR_OFFSET + self.max_sensors * _NAME_BYTES)
+        self.slot_size = _align(_PAGE + 2 * self.capacity * (8 + self.dtype.itemsize))
+        self.size = self.header_size + self.max_sensors * self.slot_size
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._init_file()
+        self.mm = mmap.mmap(self.fd, self.size)
+        self._hdr = np.ndarray((_HDR_FIELDS,), dtype=np.uint64, buffer=self.mm, offset=len(_MAGIC))
+        self._index: Dict[str, int] = {}
+        self._bufs: Dict[str, SharedRingBuffer] = {}
+        self._lock = threading.Lock()
+
+    def _expected_header(self) -> bytes:
+        fields = np.array([self.capacity, self.max_sensors, self.dtype.itemsize, ord(self.dtype.char)], dtype=np.uint64)
+        return _MAGIC + fields.tobytes()
+
+    def _init_file(self) -> None:
+        """Create (or, if its layout no longer matches the settings, recreate) the file."""
+        expected = self._expected_header()
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            current = os.pread(self.fd, len(expected), 0)
+            if current == expected and os.fstat(self.fd).st_size == self.size:
+                return
+            # sparse file: slots only take memory/disk once written
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, self.size)
+            os.pwrite(self.fd, expected, 0)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    # ---------- directory ----------
+
+    def _name_at(self, i: int) -> str:
+        off = _DIR_OFFSET + i * _NAME_BYTES
+        n = int.from_bytes(self.mm[off:off + 2], "little")
+        return self.mm[off + 2:off + 2 + n].decode("utf-8")
+
+    def _refresh(self) -> None:
+        # entries are append-only: only scan the ones published since last time
+        for i in range(len(self._index), int(self._hdr[_N_SENSORS])):
+            self._index[self._name_at(i)] = i
+
+    def _insert(self, sensor_id: str) -> int:
+        name = sensor_id.encode("utf-8")
+        if len(name) > _NAME_BYTES - 2:
+            raise ValueError(f"sensor id too long for the shared buffer directory: {sensor_id!r}")
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, _DIR_OFFSET, 0)
+        try:
+            self._refresh()
+            if sensor_id in self._index:
+                return self._index[sensor_id]
+            i = int(self._hdr[_N_SENSORS])
+            if i >= self.max_sensors:
+                raise MemoryError(f"shared buffer directory full ({self.max_sensors} sensors)")
+            off = _DIR_OFFSET + i * _NAME_BYTES
+            self.mm[off:off + 2] = len(name).to_bytes(2, "little")
+            self.mm[off + 2:off + 2 + len(name)] = name
+            slot = self.header_size + i * self.slot_size
+            self.mm[slot:slot + 64] = bytes(64)
+            self._hdr[_N_SENSORS] = i + 1  # publish last
+            self._index[sensor_id] = i
+            return i
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, _DIR_OFFSET, 0)
+
+    def get(self, sensor_id: str, create: bool = False) -> Optional[SharedRingBuffer]:
+        """The sensor's shared ring, registering it if `create` (may raise MemoryError when full)."""
+        buf = self._bufs.get(sensor_id)
+        if buf is not None:
+            return buf
+        with self._lock:
+            self._refresh()
+            i = self._index.get(sensor_id)
+            if i is None:
+                if not create:
+                    return None
+                i = self._insert(sensor_id)
+            buf = self._bufs.get(sensor_id)
+            if buf is None:
+                buf = self._bufs[sensor_id] = SharedRingBuffer(
+                    self.mm, self.fd, i + 1, self.header_size + i * self.slot_size, self.slot_size,
+                    self.capacity, self.dtype,
+                )
+            return buf
+
+    def sensors(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._index)
@@ -1,25 +1,126 @@
 from __future__ import annotations
 
-from typing import List, Optional
-from apps.sidecar.repositories.storage.sqlite import get_conn
+from concurrent.futures import Future
+from typing import Iterable, List, Optional, Sequence, Tuple
+from apps.sidecar.core.episodes import Episode
+from apps.sidecar.core.metrics import SQLITE_QUERY_SECONDS, timed
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import get_writer
+
+_COLUMNS = "id, sensor_id, t, v, z, msg, n, COALESCE(last_t, t), active, seq"
+
+# every insert and in-place update takes the next change number (writes are
+# serialised by BEGIN IMMEDIATE, so seq grows in commit order)
+_NEXT_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM alerts)"
+
+_INSERT_ALERT = f"""
+INSERT INTO alerts (sensor_id, t, v, z, msg, seq) VALUES (?, ?, ?, ?, ?, {_NEXT_SEQ})
+"""
+
+_INSERT_EPISODE = f"""
+INSERT INTO alerts (sensor_id, t, v, z, msg, n, last_t, active, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, {_NEXT_SEQ})
+"""
+
+# keyed by row id ((sensor_id, t) is not unique: legacy per-sample rows); the
+# key columns guard against a rowid reused after the insert was rolled back
+_UPDATE_EPISODE = f"""
+UPDATE alerts SET v = ?, z = ?, msg = ?, n = ?, last_t = ?, active = ?, seq = {_NEXT_SEQ}
+WHERE id = ? AND sensor_id = ? AND t = ?
+"""
+
+
+def _episode_op(ep: Episode, new: bool):
+    def run(cur) -> None:
+        if new:
+            cur.execute(_INSERT_EPISODE, (ep.sensor_id, ep.t, ep.v, ep.z, ep.msg, ep.n, ep.last_t, int(ep.active)))
+            ep.id = cur.lastrowid
+        else:
+            cur.execute(_UPDATE_EPISODE, (ep.v, ep.z, ep.msg, ep.n, ep.last_t, int(ep.active), ep.id, ep.sensor_id, ep.t))
+    return run
+
+
+def _row_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "sensor_id": row[1],
+        "t": row[2],
+        "v": row[3],
+        "z": row[4],
+        "msg": row[5],
+        "n": row[6],
+        "last_t": row[7],
+        "active": bool(row[8]),
+        "seq": row[9],
+    }
+
 
 class AlertRepo:
-    """SQLite-based repository for anomaly alerts."""
+    """
+    SQLite-based repository for anomaly alerts. A row is one alert episode
+    (core/episodes.py), updated in place while it is open.
+    """
     
     def add_alert(self, sensor_id: str, t: float, v: float, z: float, msg: str) -> int:
         """
         Add a new alert to the database.
-        Returns the ID of the inserted alert.
+        Returns the ID of the inserted alert once committed.
         """
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO alerts (sensor_id, t, v, z, msg) VALUES (?, ?, ?, ?, ?)",
-            (sensor_id, t, v, z, msg)
+        return get_writer().submit(_INSERT_ALERT, (sensor_id, t, v, z, msg)).result()
+    
+    def add_alerts(self, rows: Iterable[Tuple[str, float, float, float, str]]) -> None:
+        """Add many (sensor_id, t, v, z, msg) alerts; returns once committed."""
+        self.submit_alerts(rows).result()
+    
+    def submit_alerts(self, rows: Iterable[Tuple[str, float, float, float, str]], block: bool = True) -> Future:
+        """Queue alerts for the writer thread; the Future resolves after commit."""
+        return get_writer().submit(
+            _INSERT_ALERT,
+            list(rows),
+            many=True,
+            block=block,
         )
-        conn.commit()
-        return cur.lastrowid
     
+    def submit_episodes(self, episodes: Sequence[Tuple[Episode, bool]], block: bool = True) -> Future:
+        """
+        Queue (episode, new) snapshots for the writer thread in one job: an
+        insert for new episodes (recording the row id on the episode), an
+        in-place update of that row for the others. The id is read when the
+        job runs, so an update queued right behind its insert finds the row.
+        The Future resolves after commit.
+        """
+        return get_writer().submit_ops([(_episode_op(ep, new), None, False) for ep, new in episodes], block=block)
+    
+    def close_idle(self, before: float) -> List[str]:
+        """
+        Close every open episode last extended before `before` (e.g. left open
+        by a sensor that went silent, or by a previous run); returns the sensor
+        ids whose episodes were closed, once committed.
+        """
+        closed: List[str] = []
+        
+        def run(cur) -> None:
+            rows = cur.execute(
+                "SELECT id, sensor_id FROM alerts WHERE active = 1 AND COALESCE(last_t, t) < ?", (before,)
+            ).fetchall()
+            for alert_id, sensor_id in rows:
+                cur.execute(f"UPDATE alerts SET active = 0, seq = {_NEXT_SEQ} WHERE id = ?", (alert_id,))
+                closed.append(sensor_id)
+        
+        get_writer().submit_ops([(run, None, False)]).result()
+        return sorted(set(closed))
+    
+    @timed(SQLITE_QUERY_SECONDS, "alerts.open_episode")
+    def open_episode(self, sensor_id: str) -> Optional[Episode]:
+        """The sensor's newest episode if it is still open, else None."""
+        row = get_read_conn().execute(
+            "SELECT t, v, z, n, COALESCE(last_t, t), active, id FROM alerts WHERE sensor_id = ? ORDER BY t DESC, id DESC LIMIT 1",
+            (sensor_id,),
+        ).fetchone()
+        if row is None or not row[5]:
+            return None
+        return Episode(sensor_id, row[0], row[1], row[2], n=row[3], last_t=row[4], id=row[6])
+    
+    @timed(SQLITE_QUERY_SECONDS, "alerts.get_alerts")
     def get_alerts(
         self,
         sensor_id: str,
@@ -29,12 +130,13 @@ class AlertRepo:
     ) -> List[dict]:
         """
         Get alerts for a sensor.
-        Returns list of alert dictionaries with keys: id, sensor_id, t, v, z, msg
+        Returns list of alert dictionaries with keys: id, sensor_id, t, v, z, msg,
+        n, last_t, active
         """
-        conn = get_conn()
+        conn = get_read_conn()
         cur = conn.cursor()
         
-        query = "SELECT id, sensor_id, t, v, z, msg FROM alerts WHERE sensor_id = ?"
+        query = f"SELECT {_COLUMNS} FROM alerts WHERE sensor_id = ?"
         params = [sensor_id]
         
         if start_ts is not None:
@@ -54,17 +156,38 @@ class AlertRepo:
         cur.execute(query, params)
         rows = cur.fetchall()
         
-        return [
-            {
-                "id": row[0],
-                "sensor_id": row[1],
-                "t": row[2],
-                "v": row[3],
-                "z": row[4],
-                "msg": row[5]
-            }
-            for row in rows
-        ]
+        return [_row_dict(row) for row in rows]
+    
+    @timed(SQLITE_QUERY_SECONDS, "alerts.get_alerts_after")
+    def get_alerts_after(
+        self,
+        sensor_id: str,
+        after_seq: int,
+        min_abs_z: float = 0.0,
+        limit: int = 50
+    ) -> List[dict]:
+        """
+        Cursor read: alerts inserted or updated after change number after_seq
+        with |z| >= min_abs_z, in seq (commit) order. An episode that
+        progressed or closed is returned again with its new state; alerts with
+        late sample times are not skipped.
+        """
+        conn = get_read_conn()
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT {_COLUMNS} FROM alerts "
+            "WHERE sensor_id = ? AND seq > ? AND abs(z) >= ? ORDER BY seq LIMIT ?",
+            (sensor_id, after_seq, min_abs_z, limit)
+        )
+        return [_row_dict(row) for row in cur.fetchall()]
+    
+    @timed(SQLITE_QUERY_SECONDS, "alerts.max_seq")
+    def max_seq(self, sensor_id: str) -> int:
+        """Change number of the sensor's newest committed alert insert/update (0 if none)."""
+        row = get_read_conn().execute(
+            "SELECT MAX(seq) FROM alerts WHERE sensor_id = ?", (sensor_id,)
+        ).fetchone()
+        return row[0] or 0
     
     def get_recent_alerts(self, sensor_id: str, limit: int = 10) -> List[dict]:
         """Get the most recent alerts for a sensor."""
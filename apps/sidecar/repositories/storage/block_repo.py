@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import math
+from itertools import repeat
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from apps.sidecar.core import gorilla
+from apps.sidecar.repositories.storage.rollup_repo import RESOLUTIONS
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import Op, get_writer
+
+# Cold samples, compressed. Raw `samples` rows older than SAMPLE_COLD_HOURS are
+# moved, one sensor-hour at a time, into `sample_blocks` rows (core/gorilla.py
+# blobs with first/last t); the retention pass does this. Blocks never overlap
+# each other or raw rows: a write into a compressed range thaws the blocks it
+# touches back into rows inside the same writer job, before the rollup refresh,
+# so rollups stay exact and the hour is compressed again on a later pass.
+# Both moves run inside the writer thread's transaction (callable ops), atomic
+# with every other write.
+
+BlockMeta = Tuple[float, float, int]  # (t0, t1, n)
+
+_INSERT_RAW = "INSERT OR IGNORE INTO samples (sensor_id, t, v) VALUES (?, ?, ?)"
+
+
+def thaw_op(spans: Dict[str, Tuple[float, float]]) -> Op:
+    """
+    Writer step that turns the blocks overlapping the 1m buckets of each
+    sensor's (lo, hi) back into raw rows: the rollup ops rebuild whole 1m
+    buckets from `samples`, so every sample of those buckets must be raw, even
+    one in a neighbouring block (a bucket split by SAMPLE_BLOCK_MAX or by a
+    SAMPLE_BLOCK_S that is not a multiple of 60). Goes after the samples
+    insert (INSERT OR IGNORE: the new samples win) and before the rollup ops.
+    Costs one index probe per sensor when nothing is compressed there.
+    """
+    step = RESOLUTIONS["1m"][1]
+
+    def run(cur) -> None:
+        for sensor_id, (lo, hi) in spans.items():
+            blocks = cur.execute(
+                "SELECT t0, data FROM sample_blocks WHERE sensor_id = ? AND t1 >= ? AND t0 < ?",
+                (sensor_id, math.floor(lo / step) * step, (math.floor(hi / step) + 1) * step),
+            ).fetchall()
+            for t0, data in blocks:
+                ts, vs = gorilla.decode(data)
+                cur.executemany(_INSERT_RAW, zip(repeat(sensor_id), ts.tolist(), vs.tolist()))
+                cur.execute("DELETE FROM sample_blocks WHERE sensor_id = ? AND t0 = ?", (sensor_id, t0))
+    return (run, None, False)
+
+
+def compress_op(sensor_id: str, lo: float, hi: float, max_samples: int, done: List[int]) -> Op:
+    """Writer step moving the sensor's raw rows in [lo, hi) into blocks; appends the count to `done`."""
+    def run(cur) -> None:
+        c = cur.connection.cursor()
+        c.row_factory = None
+        rows = c.execute(
+            "SELECT t, v FROM samples WHERE sensor_id = ? AND t >= ? AND t < ? ORDER BY t",
+            (sensor_id, lo, hi),
+        ).fetchall()
+        if not rows:
+            done.append(0)
+            return
+        arr = np.array(rows, dtype=np.float64)
+        for i in range(0, arr.shape[0], max(1, max_samples)):
+            ts, vs = arr[i:i + max_samples, 0], arr[i:i + max_samples, 1]
+            c.execute(
+                "INSERT OR REPLACE INTO sample_blocks (sensor_id, t0, t1, n, data) VALUES (?, ?, ?, ?, ?)",
+                (sensor_id, float(ts[0]), float(ts[-1]), int(ts.size), gorilla.encode(ts, vs)),
+            )
+        c.execute("DELETE FROM samples WHERE sensor_id = ? AND t >= ? AND t < ?", (sensor_id, lo, hi))
+        done.append(len(rows))
+    return (run, None, False)
+
+
+def merge_pieces(pieces: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate (ts, vs) pieces sorted by t; of equal ts the later piece wins."""
+    if not pieces:
+        return np.empty(0), np.empty(0)
+    ts = np.concatenate([p[0] for p in pieces])
+    vs = np.concatenate([p[1] for p in pieces])
+    order = np.argsort(ts, kind="stable")
+    ts, vs = ts[order], vs[order]
+    keep = np.r_[ts[1:] != ts[:-1], True] if ts.size else np.empty(0, dtype=bool)
+    return ts[keep], vs[keep]
+
+
+class BlockRepo:
+    """Read side of `sample_blocks`, plus the cold-sample compaction driver."""
+
+    def overlapping(self, sensor_id: str, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> List[BlockMeta]:
+        """(t0, t1, n) of the blocks overlapping [start_ts, end_ts], oldest first."""
+        lo = -math.inf if start_ts is None else start_ts
+        hi = math.inf if end_ts is None else end_ts
+        cur = get_read_conn().cursor()
+        cur.row_factory = None
+        return cur.execute(
+            "SELECT t0, t1, n FROM sample_blocks WHERE sensor_id = ? AND t1 >= ? AND t0 <= ? ORDER BY t0",
+            (sensor_id, lo, hi),
+        ).fetchall()
+
+    def load(self, sensor_id: str, t0: float, start_ts: Optional[float] = None,
+             end_ts: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """One block's samples, cut to [start_ts, end_ts]; empty if it is gone (thawed meanwhile)."""
+        row = get_read_conn().execute(
+            "SELECT data FROM sample_blocks WHERE sensor_id = ? AND t0 = ?", (sensor_id, t0)
+        ).fetchone()
+        if row is None:
+            return np.empty(0), np.empty(0)
+        ts, vs = gorilla.decode(row[0])
+        i = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, "left"))
+        j = ts.size if end_ts is None else int(np.searchsorted(ts, end_ts, "right"))
+        return ts[i:j], vs[i:j]
+
+    def latest(self, sensor_id: str, after: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """Newest compressed (t, v), or None if there is none newer than `after`."""
+        row = get_read_conn().execute(
+            "SELECT t0 FROM sample_blocks WHERE sensor_id = ? AND t1 > ? ORDER BY t1 DESC LIMIT 1",
+            (sensor_id, -math.inf if after is None else after),
+        ).fetchone()
+        if row is None:
+            return None
+        ts, vs = self.load(sensor_id, row[0])
+        return (float(ts[-1]), float(vs[-1])) if ts.size else None
+
+    def sensor_ids(self) -> List[str]:
+        """Distinct sensor ids with blocks (skip-scan of the primary key)."""
+        cur = get_read_conn().execute(
+            """
+            WITH RECURSIVE s(id) AS (
+                SELECT MIN(sensor_id) FROM sample_blocks
+                UNION ALL
+                SELECT (SELECT MIN(sensor_id) FROM sample_blocks WHERE sensor_id > s.id) FROM s WHERE s.id IS NOT NULL
+            )
+            SELECT id FROM s WHERE id IS NOT NULL
+            """
+        )
+        return [row[0] for row in cur.fetchall()]
+
+    def compress_before(
+        self,
+        sensor_id: str,
+        cutoff: float,
+        block_s: float,
+        max_samples: int,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Compress the sensor's raw rows in whole `block_s` windows ending at or
+        before `cutoff`, one writer job per window (empty windows skipped by
+        index seeks). Returns (windows, samples) compressed.
+        """
+        block_s = max(1.0, float(block_s))
+        end = math.floor(cutoff / block_s) * block_s
+        reader = get_read_conn()
+        writer = get_writer()
+        windows = samples = 0
+        after = -math.inf
+        while stop is None or not stop():
+            t = reader.execute(
+                "SELECT MIN(t) FROM samples WHERE sensor_id = ? AND t >= ? AND t < ?", (sensor_id, after, end)
+            ).fetchone()[0]
+            if t is None:
+                break
+            lo = math.floor(t / block_s) * block_s
+            done: List[int] = []
+            writer.submit_ops([compress_op(sensor_id, lo, lo + block_s, max_samples, done)]).result()
+            windows += 1
+            samples += sum(done)
+            after = lo + block_s
+        return windows, samples
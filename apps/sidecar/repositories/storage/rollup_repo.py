@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import Op, get_writer
+
+# Rollups of `samples` at 1-minute and 1-hour resolution (min/max/sum/count/last
+# per bucket; t is the bucket start). They are maintained in the same writer
+# job as the raw insert by re-aggregating only the touched buckets: 1m buckets
+# from raw rows, 1h buckets from 1m rows. That keeps them exact under
+# INSERT OR REPLACE and costs a short index range scan per sensor per job.
+
+# resolution name -> (table, bucket seconds), finest first
+RESOLUTIONS: Dict[str, Tuple[str, int]] = {
+    "1m": ("samples_1m", 60),
+    "1h": ("samples_1h", 3600),
+}
+
+_FROM_RAW = """
+INSERT OR REPLACE INTO samples_1m (sensor_id, t, n, vmin, vmax, vsum, last_t, last_v)
+SELECT g.sensor_id, g.b, g.n, g.vmin, g.vmax, g.vsum, g.last_t, s.v
+FROM (
+    SELECT sensor_id, CAST(t / 60 AS INTEGER) * 60 AS b,
+           COUNT(*) AS n, MIN(v) AS vmin, MAX(v) AS vmax, SUM(v) AS vsum, MAX(t) AS last_t
+    FROM samples WHERE sensor_id = ? AND t >= ? AND t < ?
+    GROUP BY b
+) g
+JOIN samples s ON s.sensor_id = g.sensor_id AND s.t = g.last_t
+"""
+
+_FROM_1M = """
+INSERT OR REPLACE INTO samples_1h (sensor_id, t, n, vmin, vmax, vsum, last_t, last_v)
+SELECT g.sensor_id, g.b, g.n, g.vmin, g.vmax, g.vsum, m.last_t, m.last_v
+FROM (
+    SELECT sensor_id, CAST(t / 3600 AS INTEGER) * 3600 AS b,
+           SUM(n) AS n, MIN(vmin) AS vmin, MAX(vmax) AS vmax, SUM(vsum) AS vsum, MAX(t) AS last_bucket
+    FROM samples_1m WHERE sensor_id = ? AND t >= ? AND t < ?
+    GROUP BY b
+) g
+JOIN samples_1m m ON m.sensor_id = g.sensor_id AND m.t = g.last_bucket
+"""
+
+_UPSERT_1M = """
+INSERT OR REPLACE INTO samples_1m (sensor_id, t, n, vmin, vmax, vsum, last_t, last_v)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+RollupRow = Tuple[float, int, float, float, float, float]  # (t, n, vmin, vmax, mean, last_v)
+
+
+def _floor(t: float, step: int) -> float:
+    return float(math.floor(t / step) * step)
+
+
+def sample_spans(rows: Iterable[Tuple[str, float, float]]) -> Dict[str, Tuple[float, float]]:
+    """sensor_id -> (min t, max t) of (sensor_id, t, v) rows."""
+    spans: Dict[str, List[float]] = {}
+    for sensor_id, t, _v in rows:
+        span = spans.get(sensor_id)
+        if span is None:
+            spans[sensor_id] = [t, t]
+        elif t < span[0]:
+            span[0] = t
+        elif t > span[1]:
+            span[1] = t
+    return {sensor_id: (lo, hi) for sensor_id, (lo, hi) in spans.items()}
+
+
+def span_ops(spans: Dict[str, Tuple[float, float]]) -> List[Op]:
+    """Statements that refresh the rollup buckets overlapping each sensor's (lo, hi)."""
+    ops: List[Op] = []
+    for sensor_id, (lo, hi) in spans.items():
+        ops.append((_FROM_RAW, (sensor_id, _floor(lo, 60), _floor(hi, 60) + 60), False))
+        ops.append((_FROM_1M, (sensor_id, _floor(lo, 3600), _floor(hi, 3600) + 3600), False))
+    return ops
+
+
+def rollup_ops(rows: Iterable[Tuple[str, float, float]]) -> List[Op]:
+    """
+    Statements that refresh the rollup buckets touched by (sensor_id, t, v)
+    rows; append them to the job that inserts those rows.
+    """
+    return span_ops(sample_spans(rows))
+
+
+def bucket_ops(sensor_id: str, ts: np.ndarray, vs: np.ndarray) -> List[Op]:
+    """
+    Rollup statements for raw samples kept outside the `samples` table
+    (segment backend): `ts`/`vs` must hold every sample of the 1m buckets
+    they touch, sorted by t without duplicates. The 1m rows are aggregated
+    here; the touched 1h buckets are refreshed from samples_1m as usual.
+    """
+    if ts.size == 0:
+        return []
+    buckets = np.floor(ts / 60.0) * 60.0
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], ts.size] - 1
+    rows = zip(
+        [sensor_id] * starts.size,
+        buckets[starts].tolist(),
+        (ends - starts + 1).tolist(),
+        np.minimum.reduceat(vs, starts).tolist(),
+        np.maximum.reduceat(vs, starts).tolist(),
+        np.add.reduceat(vs, starts).tolist(),
+        ts[ends].tolist(),
+        vs[ends].tolist(),
+    )
+    lo, hi = float(ts[0]), float(ts[-1])
+    return [
+        (_UPSERT_1M, list(rows), True),
+        (_FROM_1M, (sensor_id, _floor(lo, 3600), _floor(hi, 3600) + 3600), False),
+    ]
+
+
+class RollupRepo:
+    """Read side of the 1m/1h rollup tables, plus a catch-up rebuild from raw samples."""
+
+    def get_rollup(
+        self,
+        sensor_id: str,
+        resolution: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+    ) -> List[RollupRow]:
+        """Buckets overlapping [start_ts, end_ts] as (t, n, vmin, vmax, mean, last_v), oldest first."""
+        table, step = RESOLUTIONS[resolution]
+        query = f"SELECT t, n, vmin, vmax, vsum / n, last_v FROM {table} WHERE sensor_id = ?"
+        params: list = [sensor_id]
+        if start_ts is not None:
+            query += " AND t >= ?"
+            params.append(_floor(start_ts, step))
+        if end_ts is not None:
+            query += " AND t <= ?"
+            params.append(end_ts)
+        query += " ORDER BY t"
+        return [tuple(r) for r in get_read_conn().execute(query, params)]
+
+    def count_buckets(self, sensor_id: str, resolution: str, start_ts: float, end_ts: float) -> int:
+        table, step = RESOLUTIONS[resolution]
+        return get_read_conn().execute(
+            f"SELECT COUNT(*) FROM {table} WHERE sensor_id = ? AND t >= ? AND t <= ?",
+            (sensor_id, _floor(start_ts, step), end_ts),
+        ).fetchone()[0]
+
+    def count_samples(self, sensor_id: str, start_ts: float, end_ts: float) -> int:
+        """Raw sample count in the range, read from the hourly rollup (whole hours, so an upper bound)."""
+        return get_read_conn().execute(
+            "SELECT COALESCE(SUM(n), 0) FROM samples_1h WHERE sensor_id = ? AND t >= ? AND t <= ?",
+            (sensor_id, _floor(start_ts, 3600), end_ts),
+        ).fetchone()[0]
+
+    def backfill(self, sensor_id: Optional[str] = None, chunk_s: int = 86400) -> int:
+        """
+        Rebuild rollups from raw samples (e.g. rows stored before rollups existed),
+        one writer job per sensor per `chunk_s`. Returns the number of jobs run.
+        """
+        chunk_s = max(3600, int(chunk_s) // 3600 * 3600)  # whole hours keep 1h buckets intact
+        conn = get_read_conn()
+        if sensor_id is None:
+            sensors = [r[0] for r in conn.execute("SELECT DISTINCT sensor_id FROM samples")]
+        else:
+            sensors = [sensor_id]
+        writer = get_writer()
+        jobs = 0
+        for sid in sensors:
+            lo, hi = conn.execute("SELECT MIN(t), MAX(t) FROM samples WHERE sensor_id = ?", (sid,)).fetchone()
+            if lo is None:
+                continue
+            start = _floor(lo, chunk_s)
+            while start <= hi:
+                end = start + chunk_s
+                writer.submit_ops([
+                    (_FROM_RAW, (sid, start, end), False),
+                    (_FROM_1M, (sid, start, end), False),
+                ]).result()
+                jobs += 1
+                start = end
+        return jobs
+
+    def backfill_if_empty(self) -> int:
+        """Catch-up for databases that predate rollups: rebuild only if none exist yet."""
+        conn = get_read_conn()
+        if conn.execute("SELECT 1 FROM samples_1m LIMIT 1").fetchone() is not None:
+            return 0
+        if conn.execute("SELECT 1 FROM samples LIMIT 1").fetchone() is None:
+            return 0
+        return self.backfill()
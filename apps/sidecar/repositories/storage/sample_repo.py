@@ -1,33 +1,65 @@
 from __future__ import annotations
 
-from typing import List, Tuple, Optional
-from apps.sidecar.repositories.storage.sqlite import get_conn
+import math
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 
-class SampleRepo:
-    """SQLite-based repository for sensor samples."""
+import numpy as np
+
+from apps.sidecar.core.metrics import SQLITE_QUERY_SECONDS, timed
+from apps.sidecar.core.settings import (
+    RETENTION_ENABLED,
+    RETENTION_ROLLUP_1H_HOURS,
+    RETENTION_ROLLUP_1M_HOURS,
+    RETENTION_SAMPLES_HOURS,
+    RETENTION_SENSOR_HOURS,
+    SAMPLE_BACKEND,
+)
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import get_writer
+from apps.sidecar.repositories.storage.block_repo import BlockRepo, merge_pieces, thaw_op
+from apps.sidecar.repositories.storage.rollup_repo import RESOLUTIONS, RollupRepo, RollupRow, sample_spans, span_ops
+
+class SqliteSampleRepo:
+    """
+    SQLite-based repository for sensor samples: recent ones as rows of
+    `samples`, cold ones compressed in `sample_blocks` (see block_repo);
+    reads merge both transparently.
+    """
     
     def add_sample(self, sensor_id: str, t: float, v: float) -> None:
-        """Add a single sample to the database."""
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT OR REPLACE INTO samples (sensor_id, t, v) VALUES (?, ?, ?)",
-            (sensor_id, t, v)
-        )
-        conn.commit()
+        """Add a single sample; returns once the writer has committed it."""
+        self.submit_samples([(sensor_id, t, v)]).result()
     
-    def get_series(
-        self, 
-        sensor_id: str, 
-        start_ts: Optional[float] = None, 
-        end_ts: Optional[float] = None,
-        limit: Optional[int] = None
-    ) -> List[Tuple[float, float]]:
+    def add_samples(self, rows: Iterable[Tuple[str, float, float]]) -> None:
+        """Add many (sensor_id, t, v) samples; returns once committed."""
+        self.submit_samples(rows).result()
+    
+    def submit_samples(self, rows: Iterable[Tuple[str, float, float]], block: bool = True) -> Future:
         """
-        Get time series data for a sensor.
-        Returns list of (timestamp, value) tuples ordered by timestamp.
+        Queue (sensor_id, t, v) samples for the writer thread (one executemany,
+        a thaw of any compressed block in the written ranges, and a refresh of
+        the touched 1m/1h rollup buckets, in the same job).
+        Returns a Future that resolves after the group commit.
         """
-        conn = get_conn()
+        rows = list(rows)
+        spans = sample_spans(rows)
+        ops = [("INSERT OR REPLACE INTO samples (sensor_id, t, v) VALUES (?, ?, ?)", rows, True)]
+        if spans:
+            ops.append(thaw_op(spans))
+        ops.extend(span_ops(spans))
+        return get_writer().submit_ops(ops, block=block)
+    
+    def _raw_rows(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float],
+        end_ts: Optional[float],
+        limit: Optional[int],
+    ) -> List[Tuple[float, float]]:
+        conn = get_read_conn()
         cur = conn.cursor()
         
         query = "SELECT t, v FROM samples WHERE sensor_id = ?"
@@ -41,22 +73,229 @@ class SampleRepo:
             query += " AND t <= ?"
             params.append(end_ts)
         
-        query += " ORDER BY t"
-        
         if limit is not None:
-            query += " LIMIT ?"
+            # newest N rows, then flip back to oldest→newest
+            query = f"SELECT t, v FROM ({query} ORDER BY t DESC LIMIT ?) ORDER BY t"
             params.append(limit)
+        else:
+            query += " ORDER BY t"
         
         cur.execute(query, params)
         return [(row[0], row[1]) for row in cur.fetchall()]
+
+    def _with_blocks(
+        self,
+        sensor_id: str,
+        rows: List[Tuple[float, float]],
+        blocks: List[Tuple[float, float, int]],
+        start_ts: Optional[float],
+        end_ts: Optional[float],
+        limit: Optional[int],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw rows plus the samples of the overlapping blocks (newest first, only as many as `limit` needs)."""
+        raw = np.asarray(rows, dtype=np.float64).reshape(-1, 2)
+        oldest_raw = raw[0, 0] if limit is not None and raw.shape[0] >= limit else -np.inf
+        repo = BlockRepo()
+        pieces = []
+        got = 0
+        for t0, t1, _n in reversed(blocks):
+            if limit is not None and (got >= limit or t1 < oldest_raw):
+                break
+            piece = repo.load(sensor_id, t0, start_ts, end_ts)
+            pieces.append(piece)
+            got += piece[0].size
+        pieces.reverse()
+        ts, vs = merge_pieces(pieces + [(raw[:, 0], raw[:, 1])])  # a raw row wins over a block sample
+        if limit is not None:
+            ts, vs = ts[ts.size - min(limit, ts.size):], vs[vs.size - min(limit, vs.size):]
+        return ts, vs
+
+    @timed(SQLITE_QUERY_SECONDS, "samples.get_series")
+    def get_series(
+        self, 
+        sensor_id: str, 
+        start_ts: Optional[float] = None, 
+        end_ts: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[float, float]]:
+        """
+        Get time series data for a sensor.
+        Returns list of (timestamp, value) tuples ordered by timestamp.
+        With `limit`, the newest `limit` rows in the range are returned.
+        """
+        rows = self._raw_rows(sensor_id, start_ts, end_ts, limit)
+        blocks = BlockRepo().overlapping(sensor_id, start_ts, end_ts)
+        if not blocks:
+            return rows
+        ts, vs = self._with_blocks(sensor_id, rows, blocks, start_ts, end_ts, limit)
+        return list(zip(ts.tolist(), vs.tolist()))
+
+    @timed(SQLITE_QUERY_SECONDS, "samples.get_arrays")
+    def get_arrays(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """`get_series` as (ts, vs) float64 arrays."""
+        rows = self._raw_rows(sensor_id, start_ts, end_ts, limit)
+        blocks = BlockRepo().overlapping(sensor_id, start_ts, end_ts)
+        if blocks:
+            return self._with_blocks(sensor_id, rows, blocks, start_ts, end_ts, limit)
+        if not rows:
+            return np.empty(0), np.empty(0)
+        arr = np.asarray(rows, dtype=np.float64)
+        return arr[:, 0], arr[:, 1]
+    
+    def iter_series(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        chunk_rows: int = 65_536,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Stream a sensor's range oldest→newest as (ts, vs) float64 chunks of at
+        most `chunk_rows`, for exports too large for `get_series`. Each chunk is
+        its own index seek from the last t seen (keyset paging on the primary
+        key), so no read transaction stays open between chunks: the generator
+        may be resumed on any thread and never holds back WAL checkpoints.
+        Compressed blocks are listed up front and streamed in between the raw
+        pages that precede and follow them.
+        """
+        chunk_rows = max(1, int(chunk_rows))
+        # first page includes start_ts itself
+        after = float("-inf") if start_ts is None else float(np.nextafter(float(start_ts), -np.inf))
+        repo = BlockRepo()
+        for t0, t1, _n in repo.overlapping(sensor_id, start_ts, end_ts):
+            yield from self._iter_raw(sensor_id, after, t0, False, chunk_rows)
+            ts, vs = repo.load(sensor_id, t0, start_ts, end_ts)
+            for i in range(0, ts.size, chunk_rows):
+                yield ts[i:i + chunk_rows], vs[i:i + chunk_rows]
+            after = t1
+        yield from self._iter_raw(sensor_id, after, end_ts, True, chunk_rows)
+
+    def _iter_raw(
+        self,
+        sensor_id: str,
+        after: float,
+        upto: Optional[float],
+        inclusive: bool,
+        chunk_rows: int,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Raw rows with after < t < upto (t <= upto if `inclusive`), keyset-paged."""
+        query = "SELECT t, v FROM samples WHERE sensor_id = ? AND t > ?"
+        if upto is not None:
+            query += " AND t <= ?" if inclusive else " AND t < ?"
+        query += " ORDER BY t LIMIT ?"
+        while True:
+            params = [sensor_id, after] + ([upto] if upto is not None else []) + [chunk_rows]
+            with SQLITE_QUERY_SECONDS.labels("samples.iter_series").time():
+                cur = get_read_conn().cursor()
+                cur.row_factory = None  # plain tuples, no sqlite3.Row per sample
+                rows = cur.execute(query, params).fetchall()
+            if not rows:
+                return
+            arr = np.array(rows, dtype=np.float64)
+            del rows
+            yield arr[:, 0], arr[:, 1]
+            if arr.shape[0] < chunk_rows:
+                return
+            after = float(arr[-1, 0])
+
+    @timed(SQLITE_QUERY_SECONDS, "samples.get_range")
+    def get_range(
+        self,
+        sensor_id: str,
+        start_ts: float,
+        end_ts: float,
+        max_points: int,
+    ) -> Tuple[str, List[RollupRow]]:
+        """
+        Resolution-aware range read: raw rows if they fit in `max_points`,
+        else the finest rollup (1m, then 1h) that does. Returns
+        (resolution, rows) with rows as (t, n, vmin, vmax, mean, last_v);
+        raw samples come back as (t, 1, v, v, v, v).
+        A resolution is only picked if retention still keeps it at start_ts
+        (raw samples expire long before the 1h rollup, which the counts come
+        from). The 1h rollup is used as the last resort even if it exceeds the budget.
+        """
+        rollups = RollupRepo()
+        now = time.time()
+        if (start_ts >= _kept_since("samples", sensor_id, now)
+                and rollups.count_samples(sensor_id, start_ts, end_ts) <= max_points):
+            rows = self.get_series(sensor_id, start_ts, end_ts)
+            return "raw", [(t, 1, v, v, v, v) for t, v in rows]
+        names = list(RESOLUTIONS)
+        for name in names[:-1]:
+            if start_ts < _kept_since(RESOLUTIONS[name][0], sensor_id, now):
+                continue
+            if rollups.count_buckets(sensor_id, name, start_ts, end_ts) <= max_points:
+                return name, rollups.get_rollup(sensor_id, name, start_ts, end_ts)
+        return names[-1], rollups.get_rollup(sensor_id, names[-1], start_ts, end_ts)
+
+    @timed(SQLITE_QUERY_SECONDS, "samples.sensor_ids")
+    def sensor_ids(self) -> List[str]:
+        """Distinct sensor ids, raw or compressed (skip-scans of the (sensor_id, t) indexes: one seek per sensor)."""
+        cur = get_read_conn().execute(
+            """
+            WITH RECURSIVE s(id) AS (
+                SELECT MIN(sensor_id) FROM samples
+                UNION ALL
+                SELECT (SELECT MIN(sensor_id) FROM samples WHERE sensor_id > s.id) FROM s WHERE s.id IS NOT NULL
+            )
+            SELECT id FROM s WHERE id IS NOT NULL
+            """
+        )
+        ids = {row[0] for row in cur.fetchall()}
+        ids.update(BlockRepo().sensor_ids())
+        return sorted(ids)
     
+    @timed(SQLITE_QUERY_SECONDS, "samples.get_latest")
     def get_latest(self, sensor_id: str) -> Optional[Tuple[float, float]]:
         """Get the most recent sample for a sensor."""
-        conn = get_conn()
+        conn = get_read_conn()
         cur = conn.cursor()
         cur.execute(
             "SELECT t, v FROM samples WHERE sensor_id = ? ORDER BY t DESC LIMIT 1",
             (sensor_id,)
         )
         row = cur.fetchone()
-        return (row[0], row[1]) if row else None
+        # an idle sensor past SAMPLE_COLD_HOURS has its newest samples in a block
+        return BlockRepo().latest(sensor_id, after=row[0] if row else None) or ((row[0], row[1]) if row else None)
+
+
+_TABLE_HOURS = {
+    "samples": RETENTION_SAMPLES_HOURS,
+    "samples_1m": RETENTION_ROLLUP_1M_HOURS,
+    "samples_1h": RETENTION_ROLLUP_1H_HOURS,
+}
+
+
+@lru_cache(maxsize=1)
+def _sensor_hours() -> Dict[str, float]:
+    from apps.sidecar.workers.retention import parse_sensor_hours  # the retention worker imports this module
+    return parse_sensor_hours(RETENTION_SENSOR_HOURS)
+
+
+def _kept_since(table: str, sensor_id: str, now: float) -> float:
+    """Oldest t the retention pass keeps in `table` for the sensor (-inf if it never expires)."""
+    hours = _TABLE_HOURS[table]
+    if table == "samples":
+        hours = _sensor_hours().get(sensor_id, hours)
+    if not RETENTION_ENABLED or hours <= 0:
+        return -math.inf
+    return now - hours * 3600.0
+
+
+def __getattr__(name: str):
+    # SampleRepo is the configured backend, resolved on first use so that
+    # segment_repo (which subclasses SqliteSampleRepo) can import this module
+    if name == "SampleRepo":
+        cls = SqliteSampleRepo
+        if SAMPLE_BACKEND == "segments":
+            from apps.sidecar.repositories.storage.segment_repo import SegmentSampleRepo as cls
+        globals()["SampleRepo"] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
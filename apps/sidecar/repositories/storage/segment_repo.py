@@ -0,0 +1,552 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from apps.sidecar.core.metrics import SQLITE_QUERY_SECONDS, timed
+from apps.sidecar.core.settings import (
+    SEGMENT_DIR,
+    SEGMENT_MAX_BYTES,
+    SEGMENT_SPAN_S,
+    SEGMENT_INDEX_STRIDE,
+    SEGMENT_OPEN_MAX,
+    SEGMENT_FSYNC,
+)
+from apps.sidecar.repositories.storage.rollup_repo import bucket_ops
+from apps.sidecar.repositories.storage.sample_repo import SqliteSampleRepo
+from apps.sidecar.repositories.storage.writer import get_writer
+
+log = logging.getLogger(__name__)
+
+# Append-only segment files for raw samples (SIDECAR_SAMPLE_BACKEND=segments).
+#
+#   <SEGMENT_DIR>/<quoted sensor id>/0000000001.seg   packed little-endian records (t f8, v f8)
+#                                    0000000001.idx   sparse index: t of every SEGMENT_INDEX_STRIDE-th record (.npy)
+#                                    .lock            appenders' lockf (one writer per sensor across processes)
+#
+# t is strictly increasing within a segment. Appends go to the newest segment;
+# a new one starts at SEGMENT_MAX_BYTES, after SEGMENT_SPAN_S of sample time,
+# or when a sample is not newer than the segment's last one (late data or a
+# rewrite). Segments may therefore overlap in time; where they do, the higher
+# sequence number wins (INSERT OR REPLACE semantics) and `compact` merges them.
+# Exact replays of stored samples (retried batches) are dropped on append.
+#
+# Crash safety: records are appended with O_APPEND. A torn tail (size not a
+# multiple of 16) is ignored by readers and truncated by the next appender;
+# index files and compacted segments are written aside and renamed into place.
+#
+# Reads map segments read-only (an LRU of SEGMENT_OPEN_MAX mappings, each
+# holding an fd) and return NumPy views into them, so a range inside one
+# segment is zero-copy. Rollups stay in SQLite: each append computes the
+# touched 1m buckets from the segments and upserts them in one writer job
+# (with several uvicorn workers writing one sensor, two such jobs may commit
+# out of order; the bucket is exact again after its next write).
+
+REC = np.dtype([("t", "<f8"), ("v", "<f8")])
+_REC_SIZE = REC.itemsize
+_EMPTY = np.empty(0, dtype=REC)
+
+Arrays = Tuple[np.ndarray, np.ndarray]  # (ts, vs)
+
+
+def _dirname(sensor_id: str) -> str:
+    name = quote(sensor_id, safe="")
+    if len(name) > 200:
+        return "~" + hashlib.sha1(sensor_id.encode("utf-8")).hexdigest()
+    return "%2E" + name[1:] if name.startswith(".") else name
+
+
+def _merge(pieces: Sequence[Arrays]) -> Arrays:
+    """Sort by t, keeping the last of equal ts (later pieces win)."""
+    ts = np.concatenate([p[0] for p in pieces])
+    vs = np.concatenate([p[1] for p in pieces])
+    order = np.argsort(ts, kind="stable")
+    ts, vs = ts[order], vs[order]
+    keep = np.r_[ts[1:] != ts[:-1], True]
+    return ts[keep], vs[keep]
+
+
+def _write_all(fd: int, data: memoryview) -> None:
+    while data:
+        data = data[os.write(fd, data):]
+
+
+# ---------- one segment file ----------
+
+_OPEN: "OrderedDict[_Segment, None]" = OrderedDict()
+_OPEN_LOCK = threading.Lock()
+
+
+class _Segment:
+    """A segment file's shape (count, first/last t, sparse index) and its mapping."""
+
+    __slots__ = ("path", "seq", "ino", "count", "first_t", "last_t", "index", "_recs")
+
+    def __init__(self, path: str, seq: int):
+        self.path = path
+        self.seq = seq
+        self.ino = -1
+        self.count = 0
+        self.first_t = math.nan
+        self.last_t = math.nan
+        self.index = np.empty(0)
+        self._recs: Optional[np.ndarray] = None
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-4] + ".idx"
+
+    def _map(self) -> Tuple[int, np.ndarray]:
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            size = st.st_size // _REC_SIZE * _REC_SIZE
+            recs = np.frombuffer(mmap.mmap(fd, size, access=mmap.ACCESS_READ), dtype=REC) if size else _EMPTY
+        finally:
+            os.close(fd)
+        return st.st_ino, recs
+
+    def sync(self, st: os.stat_result) -> None:
+        """Pick up a change on disk (appended to, replaced, or first seen)."""
+        if st.st_ino == self.ino and st.st_size // _REC_SIZE == self.count:
+            return
+        ino, recs = self._map()
+        old_index = self.index if ino == self.ino and recs.size >= self.count else None
+        self.ino, self.count = ino, recs.size
+        self._recs = recs
+        ts = recs["t"]
+        self.first_t = float(ts[0]) if ts.size else math.nan
+        self.last_t = float(ts[-1]) if ts.size else math.nan
+        self.index = self._build_index(ts, old_index)
+        _touch(self)
+
+    def _build_index(self, ts: np.ndarray, old: Optional[np.ndarray]) -> np.ndarray:
+        stride = max(1, SEGMENT_INDEX_STRIDE)
+        n = -(-ts.size // stride)
+        if old is not None:  # appended: the existing entries still hold
+            return np.concatenate([old, ts[old.size * stride::stride]]) if old.size < n else old
+        try:
+            with open(self.index_path, "rb") as f:
+                idx = np.load(f)
+            if idx.size == n and (n == 0 or idx[-1] == ts[(n - 1) * stride]):
+                return idx
+        except (OSError, ValueError):
+            pass
+        return ts[::stride].copy()
+
+    def save_index(self) -> None:
+        """Persist the sparse index (once the segment is sealed)."""
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, self.index)
+        os.replace(tmp, self.index_path)
+
+    def records(self) -> np.ndarray:
+        recs = self._recs
+        if recs is None or recs.size < self.count:
+            _ino, recs = self._map()
+            recs = recs[: self.count]
+            self._recs = recs
+        _touch(self)
+        return recs
+
+    def find(self, t: float, side: str) -> int:
+        """searchsorted over the segment's t, narrowed by the sparse index first."""
+        stride = max(1, SEGMENT_INDEX_STRIDE)
+        i = int(np.searchsorted(self.index, t, side))
+        lo, hi = max(i - 1, 0) * stride, min(i * stride, self.count)
+        return lo + int(np.searchsorted(self.records()["t"][lo:hi], t, side))
+
+    def slice(self, start: float, end: float) -> Arrays:
+        """Views of the records with start <= t <= end."""
+        recs = self.records()
+        i = 0 if start <= self.first_t else self.find(start, "left")
+        j = self.count if end >= self.last_t else self.find(end, "right")
+        recs = recs[i:j]
+        return recs["t"], recs["v"]
+
+
+def _touch(seg: _Segment) -> None:
+    # keep at most SEGMENT_OPEN_MAX mappings; views handed out keep theirs alive
+    with _OPEN_LOCK:
+        _OPEN[seg] = None
+        _OPEN.move_to_end(seg)
+        while len(_OPEN) > max(1, SEGMENT_OPEN_MAX):
+            old, _ = _OPEN.popitem(last=False)
+            old._recs = None
+
+
+# ---------- one sensor's segments ----------
+
+class _Series:
+    def __init__(self, root: str, sensor_id: str):
+        self.sensor_id = sensor_id
+        self.dir = os.path.join(root, _dirname(sensor_id))
+        self.segments: List[_Segment] = []  # by seq
+        self._names: Tuple[str, ...] = ()
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusive append access: this process's threads, then other processes."""
+        with self.lock:
+            os.makedirs(self.dir, exist_ok=True)
+            fd = os.open(os.path.join(self.dir, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # releases the lockf
+
+    def refresh(self, repair: bool = False) -> None:
+        """Re-read the directory and the newest segment's size (other processes append too)."""
+        with self.lock:
+            try:
+                names = tuple(sorted(n for n in os.listdir(self.dir) if n.endswith(".seg")))
+            except FileNotFoundError:
+                names = ()
+            if names != self._names:
+                known = {s.seq: s for s in self.segments}
+                self.segments = [known.get(int(n[:-4])) or _Segment(os.path.join(self.dir, n), int(n[:-4])) for n in names]
+                self._names = names
+                check = self.segments
+            else:
+                check = self.segments[-1:]
+            for seg in list(check):
+                try:
+                    st = os.stat(seg.path)
+                    if repair and st.st_size % _REC_SIZE:  # torn tail from a crashed append
+                        os.truncate(seg.path, st.st_size // _REC_SIZE * _REC_SIZE)
+                        st = os.stat(seg.path)
+                    seg.sync(st)
+                except FileNotFoundError:  # compacted or pruned meanwhile
+                    self.segments.remove(seg)
+                    self._names = ()
+
+    # ---------- reads ----------
+
+    def groups(self, start: float, end: float) -> List[List[_Segment]]:
+        """Segments overlapping [start, end], clustered by overlapping time spans, oldest first."""
+        segs = sorted(
+            (s for s in self.segments if s.count and s.last_t >= start and s.first_t <= end),
+            key=lambda s: s.first_t,
+        )
+        out: List[List[_Segment]] = []
+        hi = -math.inf
+        for seg in segs:
+            if out and seg.first_t <= hi:
+                out[-1].append(seg)
+                hi = max(hi, seg.last_t)
+            else:
+                out.append([seg])
+                hi = seg.last_t
+        return out
+
+    @staticmethod
+    def read_group(group: List[_Segment], start: float, end: float) -> Arrays:
+        if len(group) == 1:
+            return group[0].slice(start, end)
+        return _merge([s.slice(start, end) for s in sorted(group, key=lambda s: s.seq)])
+
+    def read(self, start: float = -math.inf, end: float = math.inf, limit: Optional[int] = None) -> Arrays:
+        pieces: List[Arrays] = []
+        total = 0
+        for group in reversed(self.groups(start, end)):
+            piece = self.read_group(group, start, end)
+            pieces.append(piece)
+            total += piece[0].size
+            if limit is not None and total >= limit:
+                break
+        pieces.reverse()
+        if not pieces:
+            return np.empty(0), np.empty(0)
+        ts, vs = pieces[0] if len(pieces) == 1 else (np.concatenate([p[0] for p in pieces]), np.concatenate([p[1] for p in pieces]))
+        if limit is not None:
+            ts, vs = ts[-limit:] if limit else ts[:0], vs[-limit:] if limit else vs[:0]
+        return ts, vs
+
+    # ---------- writes (under `locked`, after refresh(repair=True)) ----------
+
+    def _new_segment(self) -> _Segment:
+        if self.segments and self.segments[-1].count:
+            self.segments[-1].save_index()  # sealed from here on
+        seq = self.segments[-1].seq + 1 if self.segments else 1
+        seg = _Segment(os.path.join(self.dir, f"{seq:010d}.seg"), seq)
+        if not os.path.exists(os.path.join(self.dir, ".sensor")):
+            with open(os.path.join(self.dir, ".sensor"), "w", encoding="utf-8") as f:
+                f.write(self.sensor_id)
+        os.close(os.open(seg.path, os.O_WRONLY | os.O_CREAT, 0o644))
+        self.segments.append(seg)
+        self._names += (os.path.basename(seg.path),)
+        return seg
+
+    def append(self, ts: np.ndarray, vs: np.ndarray) -> None:
+        """Append samples sorted by t without duplicates, rolling segments as needed."""
+        i, n = 0, ts.size
+        while i < n:
+            seg = self.segments[-1] if self.segments else None
+            if (
+                seg is None
+                or seg.count * _REC_SIZE >= SEGMENT_MAX_BYTES
+                or (seg.count and (ts[i] <= seg.last_t or ts[i] >= seg.first_t + SEGMENT_SPAN_S))
+            ):
+                seg = self._new_segment()
+            first = seg.first_t if seg.count else float(ts[i])
+            room = max(1, (SEGMENT_MAX_BYTES - seg.count * _REC_SIZE) // _REC_SIZE)
+            j = min(n, i + room, i + max(1, int(np.searchsorted(ts[i:], first + SEGMENT_SPAN_S, "left"))))
+            recs = np.empty(j - i, dtype=REC)
+            recs["t"], recs["v"] = ts[i:j], vs[i:j]
+            fd = os.open(seg.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                _write_all(fd, memoryview(recs.tobytes()))
+                if SEGMENT_FSYNC:
+                    os.fdatasync(fd)
+                seg.sync(os.fstat(fd))
+            finally:
+                os.close(fd)
+            i = j
+
+
+_SERIES: Dict[Tuple[str, str], _Series] = {}
+_SERIES_LOCK = threading.Lock()
+
+
+# ---------- repository ----------
+
+class SegmentSampleRepo(SqliteSampleRepo):
+    """
+    Raw samples in append-only segment files; rollups (and so get_range's
+    count/bucket reads) stay in SQLite.
+    """
+
+    def __init__(self, root: str = SEGMENT_DIR):
+        self.root = str(root)
+
+    def _series(self, sensor_id: str) -> _Series:
+        key = (self.root, sensor_id)
+        series = _SERIES.get(key)
+        if series is None:
+            with _SERIES_LOCK:
+                series = _SERIES.setdefault(key, _Series(self.root, sensor_id))
+        return series
+
+    def submit_samples(self, rows: Iterable[Tuple[str, float, float]], block: bool = True) -> Future:
+        """
+        Append (sensor_id, t, v) samples to the segments, then queue one writer
+        job upserting the touched rollup buckets (so a failed append, e.g.
+        ENOSPC, never commits rollups). The samples are on disk (page cache;
+        fdatasync with SIDECAR_SEGMENT_FSYNC=1) when this returns; the Future
+        resolves after the rollup commit. Blocking file I/O in the caller:
+        async code must call this from the threadpool. With block=False a full
+        write queue raises queue.Full before anything is appended.
+        """
+        writer = get_writer()
+        if not block and writer.full():
+            raise queue.Full
+        by_sensor: Dict[str, List[Tuple[float, float]]] = {}
+        for sensor_id, t, v in rows:
+            by_sensor.setdefault(sensor_id, []).append((t, v))
+        with ExitStack() as stack:
+            # every touched sensor locked (in a fixed order) from reading the
+            # buckets to appending, so rollups see all concurrent writes
+            batches: List[Tuple[_Series, np.ndarray, np.ndarray]] = []
+            ops = []
+            for sensor_id in sorted(by_sensor):
+                series = self._series(sensor_id)
+                stack.enter_context(series.locked())
+                series.refresh(repair=True)
+                arr = np.asarray(by_sensor[sensor_id], dtype=np.float64)
+                ts, vs = _merge([(arr[:, 0], arr[:, 1])])
+                lo = math.floor(ts[0] / 60.0) * 60.0
+                hi = math.floor(ts[-1] / 60.0) * 60.0 + 60.0
+                ets, evs = series.read(lo, np.nextafter(hi, -np.inf))
+                if ets.size:  # drop exact replays of stored samples
+                    pos = np.minimum(np.searchsorted(ets, ts), ets.size - 1)
+                    fresh = (ets[pos] != ts) | (evs[pos] != vs)
+                    ts, vs = ts[fresh], vs[fresh]
+                if not ts.size:
+                    continue
+                ops.extend(bucket_ops(sensor_id, *_merge([(ets, evs), (ts, vs)])))
+                batches.append((series, ts, vs))
+            for series, ts, vs in batches:
+                series.append(ts, vs)
+            # the samples are stored: the rollup job must not be shed now
+            fut = writer.submit_ops(ops)
+        return fut
+
+    @timed(SQLITE_QUERY_SECONDS, "segments.get_arrays")
+    def get_arrays(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> Arrays:
+        """
+        (ts, vs) in [start_ts, end_ts] oldest→newest (newest `limit` with limit).
+        Read-only views into the mapped segment when the range lies in one.
+        """
+        series = self._series(sensor_id)
+        series.refresh()
+        start = -math.inf if start_ts is None else float(start_ts)
+        end = math.inf if end_ts is None else float(end_ts)
+        return series.read(start, end, limit)
+
+    def get_series(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[float, float]]:
+        ts, vs = self.get_arrays(sensor_id, start_ts, end_ts, limit)
+        return list(zip(ts.tolist(), vs.tolist()))
+
+    def iter_series(
+        self,
+        sensor_id: str,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        chunk_rows: int = 65_536,
+    ) -> Iterator[Arrays]:
+        """(ts, vs) chunks of at most `chunk_rows`, oldest first, one segment group at a time."""
+        chunk_rows = max(1, int(chunk_rows))
+        series = self._series(sensor_id)
+        series.refresh()
+        start = -math.inf if start_ts is None else float(start_ts)
+        end = math.inf if end_ts is None else float(end_ts)
+        for group in series.groups(start, end):
+            ts, vs = series.read_group(group, start, end)
+            for i in range(0, ts.size, chunk_rows):
+                yield ts[i:i + chunk_rows], vs[i:i + chunk_rows]
+
+    def sensor_ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in sorted(names):
+            if name.startswith("."):  # .imported marker (quoted ids never start with ".")
+                continue
+            if name.startswith("~"):
+                try:
+                    with open(os.path.join(self.root, name, ".sensor"), encoding="utf-8") as f:
+                        out.append(f.read())
+                except OSError:
+                    continue
+            else:
+                out.append(unquote(name))
+        return out
+
+    def get_latest(self, sensor_id: str) -> Optional[Tuple[float, float]]:
+        ts, vs = self.get_arrays(sensor_id, limit=1)
+        return (float(ts[-1]), float(vs[-1])) if ts.size else None
+
+    # ---------- maintenance (retention pass) ----------
+
+    def prune(self, sensor_id: str, cutoff: float) -> Tuple[int, int]:
+        """Delete segments wholly older than `cutoff`; returns (samples, bytes) removed."""
+        series = self._series(sensor_id)
+        samples = nbytes = 0
+        with series.locked():
+            series.refresh(repair=True)
+            for seg in list(series.segments):
+                if seg.count and seg.last_t < cutoff:
+                    for path in (seg.path, seg.index_path):
+                        try:
+                            os.unlink(path)
+                        except FileNotFoundError:
+                            pass
+                    samples += seg.count
+                    nbytes += seg.count * _REC_SIZE
+            series.refresh()
+        return samples, nbytes
+
+    def compact(self, sensor_id: str) -> int:
+        """
+        Merge each set of overlapping segments into one (written aside, then
+        renamed over the newest of the set). Returns the segments removed.
+        """
+        series = self._series(sensor_id)
+        removed = 0
+        with series.locked():
+            series.refresh(repair=True)
+            newest = series.segments[-1] if series.segments else None
+            for group in series.groups(-math.inf, math.inf):
+                if len(group) < 2:
+                    continue
+                ts, vs = series.read_group(group, -math.inf, math.inf)
+                keep = max(group, key=lambda s: s.seq)
+                recs = np.empty(ts.size, dtype=REC)
+                recs["t"], recs["v"] = ts, vs
+                tmp = keep.path + ".tmp"
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    _write_all(fd, memoryview(recs.tobytes()))
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                try:
+                    os.unlink(keep.index_path)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp, keep.path)  # the merged data is in place before the sources go
+                for seg in group:
+                    if seg is not keep:
+                        for path in (seg.path, seg.index_path):
+                            try:
+                                os.unlink(path)
+                            except FileNotFoundError:
+                                pass
+                        removed += 1
+                keep.sync(os.stat(keep.path))
+                if keep is not newest:
+                    keep.save_index()
+            series.refresh()
+        return removed
+
+    def import_sqlite(self, chunk_rows: int = 65_536) -> int:
+        """
+        One-off copy of the SQLite `samples` table into segment storage
+        (switching backends; a marker file records that it ran). Imported
+        rows land in newer segments than samples ingested meanwhile, so a t
+        the segments already hold is skipped: live data wins, and a restart
+        after an interrupted import does not duplicate. Rollups already exist.
+        """
+        marker = os.path.join(self.root, ".imported")
+        if os.path.exists(marker):
+            return 0
+        source = SqliteSampleRepo()
+        copied = 0
+        for sensor_id in source.sensor_ids():
+            series = self._series(sensor_id)
+            for ts, vs in source.iter_series(sensor_id, chunk_rows=chunk_rows):
+                with series.locked():
+                    series.refresh(repair=True)
+                    ets, _evs = series.read(float(ts[0]), float(ts[-1]))
+                    if ets.size:
+                        pos = np.minimum(np.searchsorted(ets, ts), ets.size - 1)
+                        fresh = ets[pos] != ts
+                        ts, vs = ts[fresh], vs[fresh]
+                    if ts.size:
+                        series.append(ts, vs)
+                copied += ts.size
+        os.makedirs(self.root, exist_ok=True)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(f"{copied}\n")
+        log.info("segments: imported %d samples from SQLite", copied)
+        return copied
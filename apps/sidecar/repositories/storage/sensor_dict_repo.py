@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import json
+from typing import List, Optional, Sequence
+
+from apps.sidecar.core.metrics import SQLITE_QUERY_SECONDS, timed
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import get_writer
+
+
+class SensorDictRepo:
+    """
+    Registered sensor dictionaries for binary ingest (`sensor_dicts`), keyed by
+    the content hash, so every worker process can resolve any dictionary id.
+    """
+
+    def put(self, dict_id: str, sensor_ids: Sequence[str]) -> None:
+        """Store a dictionary (idempotent); returns once committed."""
+        get_writer().submit(
+            "INSERT OR IGNORE INTO sensor_dicts (dict_id, sensor_ids) VALUES (?, ?)",
+            (dict_id, json.dumps(list(sensor_ids))),
+        ).result()
+
+    @timed(SQLITE_QUERY_SECONDS, "sensor_dicts.get")
+    def get(self, dict_id: str) -> Optional[List[str]]:
+        row = get_read_conn().execute(
+            "SELECT sensor_ids FROM sensor_dicts WHERE dict_id = ?", (dict_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Iterable, Iterator, Optional
+from typing import Iterable, Iterator, List, Optional
 
-from apps.sidecar.core.settings import DB_PATH, DATA_DIR
+from apps.sidecar.core.settings import DB_PATH, DATA_DIR, READ_CACHE_KB, READ_MMAP_BYTES
 
-__all__ = ["get_conn", "init_db"]
+__all__ = ["get_conn", "get_read_conn", "close_read_conns", "connect", "init_db"]
 
 _CONN: Optional[sqlite3.Connection] = None
 
+# Reader connections, one per thread (FastAPI runs sync routes on a threadpool)
+_LOCAL = threading.local()
+_READERS: List[sqlite3.Connection] = []
+_READERS_LOCK = threading.Lock()
+
 
 def get_conn() -> sqlite3.Connection:
     """
@@ -20,14 +26,59 @@ def get_conn() -> sqlite3.Connection:
     if _CONN is not None:
         return _CONN
 
+    _CONN = connect()
+    return _CONN
+
+
+def connect(**kwargs) -> sqlite3.Connection:
+    """
+    Open a new connection to DB_PATH with the app's pragmas.
+    Used by get_conn() and by the dedicated writer thread.
+    """
     Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, detect_types=0, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, detect_types=0, check_same_thread=False, **kwargs)
     conn.row_factory = sqlite3.Row
     # pragmatic defaults for app workload
+    # auto_vacuum only sticks on a fresh file (before WAL writes the header);
+    # it lets retention hand freed pages back to the OS
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
-    _CONN = conn
-    return _CONN
+    conn.execute("PRAGMA busy_timeout=5000;")
+    return conn
+
+
+def get_read_conn() -> sqlite3.Connection:
+    """
+    Return this thread's read-only connection, opening it on first use.
+    WAL lets these readers run in parallel with each other and with the
+    writer thread; `query_only` guards against accidental writes.
+    """
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is not None:
+        return conn
+
+    Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+    # thread-owned via _LOCAL; check_same_thread=False only so shutdown can close it
+    conn = sqlite3.connect(DB_PATH, detect_types=0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON;")
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.execute(f"PRAGMA cache_size=-{int(READ_CACHE_KB)};")  # negative = KiB
+    conn.execute(f"PRAGMA mmap_size={int(READ_MMAP_BYTES)};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    _LOCAL.conn = conn
+    with _READERS_LOCK:
+        _READERS.append(conn)
+    return conn
+
+
+def close_read_conns() -> None:
+    """Close every reader connection (app shutdown)."""
+    with _READERS_LOCK:
+        for conn in _READERS:
+            conn.close()
+        _READERS.clear()
 
 
 def init_db() -> None:
@@ -61,6 +112,76 @@ def init_db() -> None:
         );
         """
     )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alerts_sensor_t ON alerts(sensor_id, t);"
+    )
+    # alert episodes (core/episodes.py): t = start, v/z = peak; older rows are single-sample alerts
+    have = {row[1] for row in cur.execute("PRAGMA table_info(alerts)")}
+    for column, ddl in (
+        ("n", "n INTEGER NOT NULL DEFAULT 1"),
+        ("last_t", "last_t REAL"),
+        ("active", "active INTEGER NOT NULL DEFAULT 0"),
+        ("seq", "seq INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if column not in have:
+            try:
+                cur.execute(f"ALTER TABLE alerts ADD COLUMN {ddl};")
+            except sqlite3.OperationalError:
+                continue  # another process added it first
+            if column == "seq":
+                cur.execute("UPDATE alerts SET seq = id;")
+    # seq: bumped on every insert and in-place update, the /alerts?after= cursor
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alerts_seq ON alerts(seq);"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alerts_sensor_seq ON alerts(sensor_id, seq);"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_alerts_open ON alerts(sensor_id) WHERE active = 1;"  # idle sweep
+    )
+    # cold samples, compressed per sensor (core/gorilla.py); t0/t1 = first/last sample t
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sample_blocks(
+            sensor_id TEXT NOT NULL,
+            t0        REAL NOT NULL,
+            t1        REAL NOT NULL,
+            n         INTEGER NOT NULL,
+            data      BLOB NOT NULL,
+            PRIMARY KEY(sensor_id, t0)
+        );
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sample_blocks_sensor_t1 ON sample_blocks(sensor_id, t1);"
+    )
+    # binary ingest sensor dictionaries (services/binary_ingest.py), shared by all workers
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sensor_dicts(
+            dict_id    TEXT PRIMARY KEY,
+            sensor_ids TEXT NOT NULL
+        );
+        """
+    )
+    # 1-minute / 1-hour rollups of samples (t = bucket start); see rollup_repo.py
+    for table in ("samples_1m", "samples_1h"):
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table}(
+                sensor_id TEXT NOT NULL,
+                t         REAL NOT NULL,
+                n         INTEGER NOT NULL,
+                vmin      REAL NOT NULL,
+                vmax      REAL NOT NULL,
+                vsum      REAL NOT NULL,
+                last_t    REAL NOT NULL,
+                last_v    REAL NOT NULL,
+                PRIMARY KEY(sensor_id, t)
+            );
+            """
+        )
     conn.commit()
 
 
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+from apps.sidecar.core.settings import WRITE_QUEUE_MAX, WRITE_BATCH_MAX, WRITE_BATCH_MS
+from apps.sidecar.core import metrics
+from apps.sidecar.repositories.storage.sqlite import connect
+
+__all__ = ["SqliteWriter", "Op", "get_writer", "close_writer", "wait_async"]
+
+# (sql, params, many) — `many=True` runs executemany over `params`;
+# `sql` may instead be a callable taking the cursor, for read-modify-write
+# steps that must see (and be atomic with) the other writes
+Op = Tuple[Union[str, Callable[[Any], Any]], Any, bool]
+
+_STOP = object()
+
+
+class SqliteWriter:
+    """
+    Single writer thread in front of SQLite.
+
+    Jobs (one or more statements) go through a bounded queue; the thread runs
+    as many queued jobs as it can (up to `batch_max`, waiting at most
+    `batch_ms` for stragglers) inside one transaction and commits once.
+    Each job gets a Future that resolves after that commit, to the lastrowid
+    of its final statement. A failing job is rolled back to its own savepoint
+    and only its Future errors; the rest of the group still commits.
+    """
+
+    def __init__(
+        self,
+        queue_max: int = WRITE_QUEUE_MAX,
+        batch_max: int = WRITE_BATCH_MAX,
+        batch_ms: float = WRITE_BATCH_MS,
+    ):
+        self.batch_max = max(1, int(batch_max))
+        self.batch_s = max(0.0, float(batch_ms)) / 1000.0
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- producer side ----------
+
+    def submit_ops(self, ops: Sequence[Op], *, block: bool = True, timeout: Optional[float] = None) -> Future:
+        """
+        Enqueue statements to run atomically in the next group commit.
+        With block=False a full queue raises queue.Full (caller decides: shed or 503).
+        """
+        if self._closed:
+            raise RuntimeError("writer is closed")
+        fut: Future = Future()
+        self._q.put((list(ops), fut), block=block, timeout=timeout)
+        return fut
+
+    def submit(self, sql: str, params: Any = (), *, many: bool = False, block: bool = True) -> Future:
+        """Enqueue a single statement (or executemany when `many`)."""
+        return self.submit_ops([(sql, params, many)], block=block)
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def full(self) -> bool:
+        """Whether a block=False submit would raise queue.Full right now."""
+        return self._q.full()
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until everything queued so far is committed."""
+        self.submit_ops([], timeout=timeout).result(timeout=timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Commit what is queued, then stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    # ---------- writer thread ----------
+
+    def _collect(self, first: Any) -> Tuple[List[Any], bool]:
+        jobs = [first]
+        deadline = time.monotonic() + self.batch_s
+        while len(jobs) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return jobs, True
+            jobs.append(job)
+        return jobs, False
+
+    def _run(self) -> None:
+        conn = connect(isolation_level=None)  # explicit BEGIN/COMMIT below
+        stop = False
+        while not stop:
+            first = self._q.get()
+            if first is _STOP:
+                break
+            jobs, stop = self._collect(first)
+            self._commit_group(conn, jobs)
+        conn.close()
+
+    def _commit_group(self, conn, jobs: List[Any]) -> None:
+        done: List[Tuple[Future, Any]] = []
+        failed: List[Tuple[Future, BaseException]] = []
+        started = time.perf_counter()
+        try:
+            # IMMEDIATE: take the write lock up front, so jobs that read before
+            # writing cannot hit SQLITE_BUSY_SNAPSHOT against another process
+            conn.execute("BEGIN IMMEDIATE")
+            for ops, fut in jobs:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    cur = conn.cursor()
+                    for sql, params, many in ops:
+                        if callable(sql):
+                            sql(cur)
+                        elif many:
+                            cur.executemany(sql, params)
+                        else:
+                            cur.execute(sql, params)
+                    conn.execute("RELEASE job")
+                    done.append((fut, cur.lastrowid))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    failed.append((fut, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            try:
+                conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            for fut, _ in done:
+                fut.set_exception(e)
+            for fut, err in failed:
+                fut.set_exception(err)
+            # jobs that never started
+            for _ops, fut in jobs:
+                if not fut.done():
+                    fut.set_exception(e)
+            metrics.SQLITE_COMMIT_JOBS.labels("rolled_back").inc(len(jobs))
+            return
+        metrics.SQLITE_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        metrics.SQLITE_COMMIT_JOBS.labels("committed").inc(len(done))
+        if failed:
+            metrics.SQLITE_COMMIT_JOBS.labels("failed").inc(len(failed))
+        for fut, result in done:
+            fut.set_result(result)
+        for fut, err in failed:
+            fut.set_exception(err)
+
+
+_WRITER: Optional[SqliteWriter] = None
+_LOCK = threading.Lock()
+
+
+def get_writer() -> SqliteWriter:
+    """Process-wide writer, started on first use."""
+    global _WRITER
+    if _WRITER is not None and not _WRITER._closed:
+        return _WRITER
+    with _LOCK:
+        if _WRITER is None or _WRITER._closed:
+            _WRITER = SqliteWriter()
+    return _WRITER
+
+
+def close_writer() -> None:
+    """Flush and stop the process-wide writer (app shutdown)."""
+    global _WRITER
+    with _LOCK:
+        if _WRITER is not None:
+            _WRITER.close()
+            _WRITER = None
+
+
+@metrics.collector
+def _collect_queue_depth() -> None:
+    metrics.SQLITE_WRITE_QUEUE.set(_WRITER.pending() if _WRITER is not None else 0)
+
+
+async def wait_async(futures: Iterable[Future]) -> None:
+    """Await commit Futures from async code without blocking the event loop."""
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
@@ -1,56 +1,133 @@
 # apps/sidecar/services/alerts_service.py
 from __future__ import annotations
-from typing import List
+import queue
 import time
+from concurrent.futures import Future
+from contextlib import ExitStack
+from typing import Iterable, List, Optional, Tuple
 
-from apps.sidecar.repositories import buffers
+from apps.sidecar.repositories import sample_store
 from apps.sidecar.repositories import alerts_repo
+from apps.sidecar.repositories.storage.alert_repo import AlertRepo
 from apps.sidecar.models.alerts import AlertEvent, AlertsResp
-from apps.sidecar.core.anomaly import run_predictions
+from apps.sidecar.core.settings import ALERT_QUIET_S, ANOMALY_WINDOW
+from apps.sidecar.core import episodes
+from apps.sidecar.core.episodes import EpisodeTracker, get_tracker
+from apps.sidecar.core.streaming import get_detector
+from apps.sidecar.services.notify import notify_alert
+from apps.sidecar.services.stream_hub import get_hub
 
 # ---------- public API ---------------------------------------------
 
-def rebuild_alerts(sensor_id: str, *, window_s: int = 600, alpha: float = 0.3, z_thresh: float = 3.0) -> None:
+def tracker(sensor_id: str) -> EpisodeTracker:
+    """The sensor's alert episode tracker (continues an episode left open before a restart)."""
+    return get_tracker(sensor_id, seed=lambda: AlertRepo().open_episode(sensor_id))
+
+def flush(sensor_ids: Iterable[str], *, notify: bool = True, block: bool = True) -> Optional[Future]:
     """
-    Recompute anomalies over the rolling window and store as alert events.
+    Record the alert episodes that changed since the last flush: the
+    persisted log first (one writer job: inserts for new episodes, in-place
+    updates for the rest), then the in-memory tail, live `alert` pushes for
+    opened/closed episodes and one best-effort notification per new episode.
+    Returns the commit Future, or None if nothing changed. With block=False a
+    full write queue leaves the changes pending for the next flush instead.
     """
-    all_samples = buffers.all_samples(sensor_id)
-    if not all_samples:
-        alerts_repo.replace_all(sensor_id, [])
-        return
-
-    cutoff = time.time() - window_s
-    win = [s for s in all_samples if s["t"] >= cutoff] or all_samples[-min(len(all_samples), 2):]
-
-    ts = [s["t"] for s in win]
-    vals = [s["v"] for s in win]
+    trackers = [tracker(sensor_id) for sensor_id in sorted(set(sensor_ids))]
+    # drain and queue under the trackers' flush locks (taken in sensor order):
+    # a concurrent flush cannot queue an episode's update before its insert
+    with ExitStack() as stack:
+        for tr in trackers:
+            stack.enter_context(tr.flush_lock)
+        drained = [(tr, tr.drain()) for tr in trackers]
+        changed = [item for _tr, items in drained for item in items]
+        if not changed:
+            return None
+        try:
+            fut = AlertRepo().submit_episodes(changed, block=block)
+        except queue.Full:
+            for tr, items in drained:
+                tr.restore(items)
+            return None
+    # responses built from SQLite meanwhile were cached under the current version
+    touched = {ep.sensor_id for ep, _new in changed}
+    fut.add_done_callback(lambda _f: [alerts_repo.touch(sensor_id) for sensor_id in touched])
+    hub = get_hub()
+    for ep, new in changed:
+        event = AlertEvent(sensor_id=ep.sensor_id, t=ep.t, v=ep.v, z=ep.z, msg=ep.msg,
+                           n=ep.n, last_t=ep.last_t, active=ep.active)
+        alerts_repo.upsert(ep.sensor_id, event)
+        if new or not ep.active:
+            hub.publish(ep.sensor_id, "alert", event.model_dump(exclude={"kind"}))
+    if notify:
+        for ep, new in changed:
+            if not new:
+                continue
+            # best-effort fanout (email/webhook); never fail the write path
+            try:
+                notify_alert(sensor_id=ep.sensor_id, t=ep.t, v=ep.v, z=ep.z, msg=ep.msg)
+            except Exception:
+                pass
+    return fut
 
-    # Use shared anomaly detection logic
-    preds, _fts, _fp, anomalies_idx, z = run_predictions(
-        ts, vals, window_s=window_s, alpha=alpha, future_steps=0
-    )
-
-    items: List[AlertEvent] = []
-    for i in anomalies_idx:
-        if i < len(ts) and i < len(vals) and i < len(z):
-            items.append(AlertEvent(
-                sensor_id=sensor_id,
-                t=float(ts[i]),
-                v=float(vals[i]),
-                z=float(z[i]),
-                msg=f"Anomaly z={z[i]:.2f} at t={ts[i]:.0f}"
-            ))
+def observe(sensor_id: str, t: float, v: float) -> float:
+    """
+    Score one new sample as it arrives (O(1)), push it to live subscribers and
+    feed the sensor's alert episode (opened at |z| >= ANOMALY_Z_THRESHOLD).
+    Returns the sample's z.
+    """
+    det = get_detector(sensor_id, seed=lambda: _buffer_tail(sensor_id, t))
+    z = det.update(v, t)
+    get_hub().publish(sensor_id, "sample", {"sensor_id": sensor_id, "t": t, "v": v, "pred": det.baseline, "z": z})
+    tr = tracker(sensor_id)
+    if tr.wants(z):
+        tr.update(t, v, z)
+        flush([sensor_id])
+    return z
 
-    alerts_repo.replace_all(sensor_id, items)
+def sweep(now: Optional[float] = None) -> List[str]:
+    """
+    Close alert episodes whose sensor went quiet (no sample extended them for
+    more than ALERT_QUIET_S): this process's trackers first (flushed like any
+    other change), then any still open in SQLite, e.g. left by a previous run
+    or another worker. Returns the sensor ids closed from SQLite.
+    """
+    now = time.time() if now is None else now
+    idle = [tr.sensor_id for tr in episodes.trackers() if tr.close_idle(now)]
+    if idle:
+        flush(idle, notify=False)
+    closed = AlertRepo().close_idle(now - ALERT_QUIET_S)
+    for sensor_id in closed:
+        alerts_repo.clear(sensor_id)  # re-hydrated with the closed state on next read
+    return closed
 
 def recent(sensor_id: str, limit: int = 50) -> AlertsResp:
     """Return recent alerts for UI consumption (without recomputation)."""
-    return AlertsResp(sensor_id=sensor_id, items=alerts_repo.recent(sensor_id, limit=limit))
+    cursor = AlertRepo().max_seq(sensor_id)
+    items = alerts_repo.recent(sensor_id, limit=limit)
+    return AlertsResp(sensor_id=sensor_id, items=items, cursor=cursor)
 
-def refresh_and_get(sensor_id: str, *, window_s: int = 600, alpha: float = 0.3, z_thresh: float = 3.0, limit: int = 50) -> AlertsResp:
+def query(sensor_id: str, *, z_thresh: float = 0.0, after: Optional[int] = None, limit: int = 50) -> AlertsResp:
     """
-    Rebuild alerts from current buffer, then return the last `limit` items.
-    Use this from the HTTP route for up-to-date UI.
+    Without `after`: the newest `limit` alerts with |z| >= z_thresh, from the
+    tail cache. With `after` (a change number): up to `limit` alerts inserted
+    or updated since, from SQLite in commit order, so progressed and closed
+    episodes come back with their new state (keyed by start `t`) and late
+    sample times are not skipped. Items are oldest→newest change. `cursor` is
+    the value to pass as the next `after`: delivery is at-least-once (a change
+    still being committed may be returned again on the next page).
     """
-    rebuild_alerts(sensor_id, window_s=window_s, alpha=alpha, z_thresh=z_thresh)
-    return recent(sensor_id, limit=limit)
+    if after is not None:
+        rows = AlertRepo().get_alerts_after(sensor_id, after, min_abs_z=z_thresh, limit=limit)
+        items = [AlertEvent(**{k: v for k, v in r.items() if k not in ("id", "seq")}) for r in rows]
+        cursor = rows[-1]["seq"] if rows else after
+    else:
+        # read before the cache: anything committed later gets a larger seq
+        cursor = AlertRepo().max_seq(sensor_id)
+        items = [a for a in alerts_repo.recent(sensor_id, limit=0) if abs(a.z) >= z_thresh][-limit:]
+    return AlertsResp(sensor_id=sensor_id, items=items, cursor=cursor)
+
+# ---------- helpers -------------------------------------------------
+
+def _buffer_tail(sensor_id: str, before_t: float) -> List[Tuple[float, float]]:
+    """Recent buffered samples (excluding the one being scored) to warm a new detector."""
+    return sample_store.tail(sensor_id, ANOMALY_WINDOW, before_t=before_t)
@@ -0,0 +1,85 @@
+# apps/sidecar/services/export_service.py
+from __future__ import annotations
+import io
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from apps.sidecar.core.settings import EXPORT_CHUNK_ROWS
+from apps.sidecar.repositories.storage.sample_repo import SampleRepo
+
+# Bulk export of raw samples (GET /export/samples). SampleRepo.iter_series
+# pages through the range; each page is encoded and handed to the response
+# on its own, so memory is bounded by one chunk whatever the range size.
+#
+#   csv    "t,v" header, one line per sample (floats in round-trip repr)
+#   npy    one .npy array per chunk, back to back: structured dtype
+#          [("t", "<f8"), ("v", "<f8")]; read with np.load in a loop
+#   arrow  Arrow IPC stream, one record batch per chunk (needs pyarrow)
+
+Chunk = Tuple[np.ndarray, np.ndarray]  # (ts, vs)
+
+NPY_DTYPE = np.dtype([("t", "<f8"), ("v", "<f8")])
+
+
+def _csv(chunks: Iterable[Chunk]) -> Iterator[bytes]:
+    yield b"t,v\n"
+    for ts, vs in chunks:
+        yield ("\n".join(map("{!r},{!r}".format, ts.tolist(), vs.tolist())) + "\n").encode("ascii")
+
+
+def _npy(chunks: Iterable[Chunk]) -> Iterator[bytes]:
+    for ts, vs in chunks:
+        rec = np.empty(ts.size, dtype=NPY_DTYPE)
+        rec["t"], rec["v"] = ts, vs
+        buf = io.BytesIO()
+        np.lib.format.write_array(buf, rec, allow_pickle=False)
+        yield buf.getvalue()
+
+
+def _drain(buf: io.BytesIO) -> bytes:
+    data = buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    return data
+
+
+def _arrow(chunks: Iterable[Chunk]) -> Iterator[bytes]:
+    import pyarrow as pa  # optional dependency (see arrow_available)
+
+    schema = pa.schema([("t", pa.float64()), ("v", pa.float64())])
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, schema) as writer:
+        yield _drain(buf)  # schema message
+        for ts, vs in chunks:
+            writer.write_batch(pa.record_batch([pa.array(ts), pa.array(vs)], schema=schema))
+            yield _drain(buf)
+    yield _drain(buf)  # end-of-stream marker
+
+
+# format → (media type, file extension, encoder)
+FORMATS: Dict[str, Tuple[str, str, Callable[[Iterable[Chunk]], Iterator[bytes]]]] = {
+    "csv": ("text/csv", "csv", _csv),
+    "npy": ("application/octet-stream", "npy", _npy),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", _arrow),
+}
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_samples(
+    sensor_id: str,
+    fmt: str,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """Encoded byte chunks of the sensor's samples in [start_ts, end_ts], oldest first."""
+    encode = FORMATS[fmt][2]
+    return encode(SampleRepo().iter_series(sensor_id, start_ts, end_ts, chunk_rows))
@@ -0,0 +1,123 @@
+# apps/sidecar/services/ingest_service.py
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.repositories.sample_store import Group
+from apps.sidecar.core.settings import ANOMALY_Z_THRESHOLD, ANOMALY_WINDOW
+from apps.sidecar.core.metrics import INGEST_SAMPLES
+from apps.sidecar.core import episodes, streaming
+from apps.sidecar.core.streaming import get_detector
+from apps.sidecar.services import alerts_service
+from apps.sidecar.services.stream_hub import get_hub
+
+Reading = Tuple[str, float, float]  # (sensor_id, t, v)
+
+# ---------- public API ---------------------------------------------
+
+def cold(sensor_ids: Iterable[str]) -> List[str]:
+    """
+    Sensors without a detector or alert episode tracker yet: their first
+    reading reads SQLite (buffer hydrate, open episode), so async callers
+    `warm` them in the threadpool first.
+    """
+    return [sid for sid in sensor_ids if streaming.peek(sid) is None or episodes.peek(sid) is None]
+
+
+def warm(sensor_ids: Iterable[str]) -> None:
+    """Create (and seed) the detectors and episode trackers of `sensor_ids`; blocking."""
+    for sensor_id in sensor_ids:
+        get_detector(sensor_id, seed=lambda sid=sensor_id: sample_store.tail(sid, ANOMALY_WINDOW))
+        alerts_service.tracker(sensor_id)
+
+
+def submit_many(readings: Sequence[Reading], *, block: bool = True) -> Tuple[List[dict], List[Future]]:
+    """
+    Score a batch of readings and queue them for the writer thread.
+      1) one executemany for all samples (written through to the buffers)
+      2) one pass per sensor through its streaming detector (time order)
+      3) one writer job for any alert episodes opened/updated/closed
+         (+ tail cache / notifications per new episode)
+    Returns (one result dict per reading in input order, commit Futures).
+    Raises queue.Full when block=False and the write queue is saturated.
+    """
+    by_sensor: Dict[str, List[int]] = {}
+    for i, (sensor_id, _t, _v) in enumerate(readings):
+        by_sensor.setdefault(sensor_id, []).append(i)
+
+    # seed new detectors before writing so the batch is not replayed twice
+    detectors = {
+        sensor_id: get_detector(
+            sensor_id,
+            seed=lambda sid=sensor_id: sample_store.tail(sid, ANOMALY_WINDOW),
+        )
+        for sensor_id in by_sensor
+    }
+
+    futures = [sample_store.submit(readings, block=block)]
+
+    hub = get_hub()
+    results: List[dict] = [{} for _ in readings]
+    for sensor_id, idxs in by_sensor.items():
+        INGEST_SAMPLES.labels(sensor_id).inc(len(idxs))
+        det = detectors[sensor_id]
+        tracker = alerts_service.tracker(sensor_id)
+        idxs.sort(key=lambda i: readings[i][1])
+        for i in idxs:
+            _sid, t, v = readings[i]
+            z = det.update(v, t)
+            if tracker.wants(z):
+                tracker.update(t, v, z)
+            results[i] = {"sensor_id": sensor_id, "t": t, "v": v, "z": z, "alerted": abs(z) >= ANOMALY_Z_THRESHOLD}
+            hub.publish(sensor_id, "sample", {"sensor_id": sensor_id, "t": t, "v": v, "pred": det.baseline, "z": z})
+
+    fut = alerts_service.flush(by_sensor, block=block)
+    if fut is not None:
+        futures.append(fut)
+
+    return results, futures
+
+
+def submit_grouped(groups: Sequence[Group], *, block: bool = True) -> Tuple[int, List[Future]]:
+    """
+    Array fast path of `submit_many` (binary frames): readings arrive grouped
+    per sensor and time-ordered, go to the store as arrays, and only the
+    streaming detectors touch them one by one. No per-reading results.
+    Returns (samples at or above the alert threshold, commit Futures).
+    """
+    detectors = {
+        sensor_id: get_detector(sensor_id, seed=lambda sid=sensor_id: sample_store.tail(sid, ANOMALY_WINDOW))
+        for sensor_id, _ts, _vs in groups
+    }
+
+    futures = [sample_store.submit_grouped(groups, block=block)]
+
+    hub = get_hub()
+    alerted = 0
+    for sensor_id, ts, vs in groups:
+        INGEST_SAMPLES.labels(sensor_id).inc(ts.size)
+        det = detectors[sensor_id]
+        tracker = alerts_service.tracker(sensor_id)
+        live = hub.has_subscribers(sensor_id)
+        for t, v in zip(ts.tolist(), vs.tolist()):
+            z = det.update(v, t)
+            if tracker.wants(z):
+                tracker.update(t, v, z)
+                alerted += abs(z) >= ANOMALY_Z_THRESHOLD
+            if live:
+                hub.publish(sensor_id, "sample", {"sensor_id": sensor_id, "t": t, "v": v, "pred": det.baseline, "z": z})
+
+    fut = alerts_service.flush((sensor_id for sensor_id, _ts, _vs in groups), block=block)
+    if fut is not None:
+        futures.append(fut)
+
+    return alerted, futures
+
+
+def ingest_many(readings: Sequence[Reading]) -> List[dict]:
+    """Blocking variant of `submit_many` for worker threads: returns after commit."""
+    results, futures = submit_many(readings)
+    for fut in futures:
+        fut.result()
+    return results
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import http.client
 import json
+import queue
 import smtplib
 import ssl
+import threading
 import time
 from email.message import EmailMessage
-from typing import Optional, Dict
-from urllib import request, error
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 from apps.sidecar.core.settings import (
     EMAIL_ENABLED,
@@ -19,9 +22,17 @@ from apps.sidecar.core.settings import (
     EMAIL_TO,
     WEBHOOK_ENABLED,
     WEBHOOK_URL,
+    WEBHOOK_TIMEOUT_S,
     NOTIFY_DEDUP_SECONDS,
+    NOTIFY_QUEUE_MAX,
+    NOTIFY_WORKERS,
+    NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_BACKOFF_S,
+    NOTIFY_SMTP_IDLE_S,
+    NOTIFY_DEADLETTER_PATH,
     QUIET_HOURS,  # "22-6" to suppress between 22:00–06:00 local
 )
+from apps.sidecar.core import metrics
 
 _last_sent_per_sensor: Dict[str, float] = {}
 
@@ -55,71 +66,313 @@ def _should_skip(sensor_id: str, now: float) -> bool:
     _last_sent_per_sensor[sensor_id] = now
     return False
 
-def _send_email(subject: str, body: str) -> None:
-    if not EMAIL_ENABLED:
-        return
-    if not (EMAIL_SMTP_HOST and EMAIL_FROM and EMAIL_TO):
-        return
+# ---------- channels (one instance per dispatcher worker) -------------------
+
+class PermanentError(Exception):
+    """A send the receiver rejected for good: retrying cannot help."""
+
+
+def _permanent(e: BaseException) -> bool:
+    """Whether a failed send should be dead-lettered without retrying (5xx SMTP replies, see PermanentError)."""
+    if isinstance(e, PermanentError):
+        return True
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return bool(e.recipients) and all(500 <= code < 600 for code, _msg in e.recipients.values())
+    return isinstance(e, smtplib.SMTPResponseException) and 500 <= e.smtp_code < 600
+
+
+class SmtpChannel:
+    """Keeps one SMTP session open across sends; reconnects when idle or dropped."""
+
+    def __init__(self, host: str = EMAIL_SMTP_HOST, port: int = EMAIL_SMTP_PORT, tls: bool = EMAIL_SMTP_TLS,
+                 username: str = EMAIL_USERNAME, password: str = EMAIL_PASSWORD, idle_s: float = NOTIFY_SMTP_IDLE_S):
+        self.host, self.port, self.tls = host, port, tls
+        self.username, self.password = username, password
+        self.idle_s = idle_s
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        context = ssl.create_default_context()
+        if self.tls:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+            server.starttls(context=context)
+        else:
+            server = smtplib.SMTP_SSL(self.host, self.port, context=context, timeout=30)
+        if self.username or self.password:
+            server.login(self.username or "", self.password or "")
+        return server
+
+    def send(self, msg: EmailMessage) -> None:
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_s:
+            self.close()  # servers drop idle sessions; don't find out mid-send
+        for attempt in (0, 1):
+            if self._server is None:
+                self._server = self._connect()
+                self._last_used = time.monotonic()
+            try:
+                self._server.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # dropped session: reconnect once; SMTP error replies propagate as they are
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class WebhookChannel:
+    """POSTs JSON over one keep-alive HTTP(S) connection; reconnects when dropped."""
+
+    def __init__(self, url: str = WEBHOOK_URL, timeout: float = WEBHOOK_TIMEOUT_S):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or ""
+        self.port = parts.port
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def send(self, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        for attempt in (0, 1):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.request("POST", self.path, body=data, headers=headers)
+                resp = self._conn.getresponse()
+                resp.read()  # drain so the connection can be reused
+                if resp.will_close:
+                    self.close()
+                if resp.status >= 400:
+                    if resp.status < 500 and resp.status not in (408, 429):
+                        raise PermanentError(f"webhook HTTP {resp.status}")
+                    raise RuntimeError(f"webhook HTTP {resp.status}")
+                return
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionError, BrokenPipeError):
+                # stale keep-alive connection: reconnect once, then let retry/backoff handle it
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# ---------- dispatcher -------------------------------------------------------
+
+# (channel, payload, attempts so far)
+Job = Tuple[str, Dict[str, Any], int]
+
+_STOP = object()
+
+
+class NotifyDispatcher:
+    """
+    Bounded queue + worker threads for outbound notifications.
+    Callers only enqueue. Workers reuse SMTP/HTTP sessions, retry with
+    exponential backoff, and append jobs that still fail, were rejected for
+    good (SMTP 5xx, webhook 4xx) or arrived when the queue was full to a JSONL
+    dead-letter log.
+    """
+
+    def __init__(self, workers: int = NOTIFY_WORKERS, queue_max: int = NOTIFY_QUEUE_MAX,
+                 max_attempts: int = NOTIFY_MAX_ATTEMPTS, backoff_s: float = NOTIFY_BACKOFF_S,
+                 deadletter_path: str = NOTIFY_DEADLETTER_PATH, channel_factory: Optional[Dict[str, Any]] = None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_s = float(backoff_s)
+        self.deadletter_path = deadletter_path
+        self.channel_factory = channel_factory or {"email": SmtpChannel, "webhook": WebhookChannel}
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._stopping = threading.Event()
+        self._dl_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"notify-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        for th in self._threads:
+            th.start()
+
+    def enqueue(self, channel: str, payload: Dict[str, Any]) -> bool:
+        """Never blocks: a full queue dead-letters the job instead."""
+        try:
+            self._q.put_nowait((channel, payload, 0))
+            return True
+        except queue.Full:
+            self._dead_letter((channel, payload, 0), "queue full")
+            return False
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def stop(self, timeout: float = 5.0, grace: float = 1.0) -> None:
+        """
+        Let workers drain what is queued (retries included) for up to
+        `timeout`, then stop retrying: jobs still queued are dead-lettered and
+        workers get `grace` to finish their current send and close sessions.
+        """
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self._q.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for th in self._threads:
+            th.join(timeout=max(0.0, deadline - time.monotonic()))
+        if not any(th.is_alive() for th in self._threads):
+            return
+        self._stopping.set()  # cuts backoff waits short; failures now dead-letter at once
+        while True:
+            try:
+                job = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if job is not _STOP:
+                self._dead_letter(job, "shutdown")
+        for _ in self._threads:
+            try:
+                self._q.put_nowait(_STOP)
+            except queue.Full:
+                break
+        for th in self._threads:
+            th.join(timeout=grace)
+
+    def _run(self) -> None:
+        channels: Dict[str, Any] = {}
+        try:
+            while True:
+                job = self._q.get()
+                if job is _STOP:
+                    break
+                self._deliver(channels, job)
+        finally:
+            for ch in channels.values():
+                ch.close()
+
+    def _deliver(self, channels: Dict[str, Any], job: Job) -> None:
+        channel, payload, attempts = job
+        while True:
+            started: Optional[float] = None
+            try:
+                ch = channels.get(channel)
+                if ch is None:
+                    ch = channels[channel] = self.channel_factory[channel]()
+                started = time.perf_counter()
+                ch.send(_build(channel, payload))
+                metrics.NOTIFY_SEND_SECONDS.labels(channel, "ok").observe(time.perf_counter() - started)
+                self.sent += 1
+                return
+            except Exception as e:
+                if started is not None:
+                    metrics.NOTIFY_SEND_SECONDS.labels(channel, "error").observe(time.perf_counter() - started)
+                metrics.NOTIFY_FAILURES.labels(channel).inc()
+                attempts += 1
+                if attempts >= self.max_attempts or self._stopping.is_set() or _permanent(e):
+                    self.failed += 1
+                    self._dead_letter((channel, payload, attempts), repr(e))
+                    return
+                # exponential backoff; stop() cuts the wait short
+                self._stopping.wait(self.backoff_s * (2 ** (attempts - 1)))
+
+    def _dead_letter(self, job: Job, error: str) -> None:
+        channel, payload, attempts = job
+        metrics.NOTIFY_DEADLETTERS.labels(channel).inc()
+        line = json.dumps({"ts": time.time(), "channel": channel, "attempts": attempts,
+                           "error": error, "payload": payload})
+        with self._dl_lock:
+            try:
+                with open(self.deadletter_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError:
+                pass
+
+
+def _build(channel: str, payload: Dict[str, Any]) -> Any:
+    """Turn a queued payload into what the channel sends."""
+    if channel != "email":
+        return payload
     msg = EmailMessage()
-    msg["Subject"] = subject
+    msg["Subject"] = payload["subject"]
     msg["From"] = EMAIL_FROM
     msg["To"] = ", ".join(EMAIL_TO)
-    msg.set_content(body)
-    context = ssl.create_default_context()
-    if EMAIL_SMTP_TLS:
-        with smtplib.SMTP(EMAIL_SMTP_HOST, EMAIL_SMTP_PORT) as server:
-            server.starttls(context=context)
-            if EMAIL_USERNAME or EMAIL_PASSWORD:
-                server.login(EMAIL_USERNAME or "", EMAIL_PASSWORD or "")
-            server.send_message(msg)
-    else:
-        with smtplib.SMTP_SSL(EMAIL_SMTP_HOST, EMAIL_SMTP_PORT, context=context) as server:
-            if EMAIL_USERNAME or EMAIL_PASSWORD:
-                server.login(EMAIL_USERNAME or "", EMAIL_PASSWORD or "")
-            server.send_message(msg)
-
-def _post_webhook(payload: dict) -> None:
-    if not WEBHOOK_ENABLED or not WEBHOOK_URL:
-        return
-    data = json.dumps(payload).encode("utf-8")
-    req = request.Request(
-        WEBHOOK_URL,
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    try:
-        with request.urlopen(req, timeout=5) as _resp:
-            pass
-    except error.URLError:
-        # Best-effort; avoid raising in request path
-        pass
+    msg.set_content(payload["body"])
+    return msg
+
+
+_DISPATCHER: Optional[NotifyDispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+
+def get_dispatcher() -> NotifyDispatcher:
+    """Process-wide dispatcher, started on first use."""
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        with _DISPATCHER_LOCK:
+            if _DISPATCHER is None:
+                _DISPATCHER = NotifyDispatcher()
+    return _DISPATCHER
+
+def stop_dispatcher() -> None:
+    """Drain and stop the dispatcher (app shutdown)."""
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is not None:
+            _DISPATCHER.stop()
+            _DISPATCHER = None
+
+@metrics.collector
+def _collect_queue_depth() -> None:
+    metrics.NOTIFY_QUEUE.set(_DISPATCHER.pending() if _DISPATCHER is not None else 0)
 
 def notify_alert(*, sensor_id: str, t: float, v: float, z: float, msg: str) -> None:
     """
-    Best-effort notification fanout. Dedupe, quiet hours, then send email + webhook.
-    Non-blocking philosophy: failures are swallowed (logged externally if desired).
+    Best-effort notification fanout. Dedupe, quiet hours, then enqueue email +
+    webhook for the background dispatcher. Never does network I/O itself.
     """
+    email_on = EMAIL_ENABLED and bool(EMAIL_SMTP_HOST and EMAIL_FROM and EMAIL_TO)
+    webhook_on = WEBHOOK_ENABLED and bool(WEBHOOK_URL)
+    if not (email_on or webhook_on):
+        return
     now = time.time()
     if _should_skip(sensor_id, now):
         return
     if _in_quiet_hours(time.localtime(now)):
         return
-    subject = f"[Sidecar] Alert on {sensor_id} z={z:.2f}"
-    body = f"""Sensor: {sensor_id}
+    dispatcher = get_dispatcher()
+    if email_on:
+        subject = f"[Sidecar] Alert on {sensor_id} z={z:.2f}"
+        body = f"""Sensor: {sensor_id}
 Time:  {int(t)} (epoch)
 Value: {v}
 Z:     {z:.2f}
 Msg:   {msg}
 """
-    _send_email(subject, body)
-    _post_webhook(
-        {
-            "type": "sidecar.alert",
-            "sensor_id": sensor_id,
-            "t": t,
-            "v": v,
-            "z": z,
-            "msg": msg,
-        }
-    )
+        dispatcher.enqueue("email", {"subject": subject, "body": body})
+    if webhook_on:
+        dispatcher.enqueue(
+            "webhook",
+            {
+                "type": "sidecar.alert",
+                "sensor_id": sensor_id,
+                "t": t,
+                "v": v,
+                "z": z,
+                "msg": msg,
+            },
+        )
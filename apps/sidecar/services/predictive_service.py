@@ -1,38 +1,63 @@
 # apps/sidecar/services/predictive_service.py
 from __future__ import annotations
 import time
-from typing import List
-from apps.sidecar.repositories import buffers
-from apps.sidecar.models.predictive import SeriesResp
-from apps.sidecar.core.anomaly import run_predictions
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.models.predictive import FleetItem, FleetResp, HistoryResp, SeriesResp
+from apps.sidecar.repositories.storage.sample_repo import SampleRepo
+from apps.sidecar.core.anomaly import run_predictions, score_matrix
+from apps.sidecar.core.metrics import INGEST_SAMPLES, PREDICT_SECONDS
+from apps.sidecar.core.downsample import downsample_indices, remap_indices
+from apps.sidecar.services import alerts_service
 
 # --- public interface -------------------------------------------------------
 
 def ingest_point(sensor_id: str, v: float, t: float | None) -> None:
-    """Append a new observation."""
-    buffers.append(sensor_id, t or time.time(), float(v))
+    """Store a new observation (memory + SQLite) and score it for alerts."""
+    t = t or time.time()
+    INGEST_SAMPLES.labels(sensor_id).inc()
+    sample_store.append(sensor_id, t, float(v))
+    alerts_service.observe(sensor_id, t, float(v))
 
 
-def get_series(sensor_id: str, window_s: int, alpha: float, future_steps: int) -> SeriesResp:
-    """Return predictive overlay data for one sensor."""
-    buf = buffers.all_samples(sensor_id)
-    if not buf:
+def get_series(
+    sensor_id: str,
+    window_s: int,
+    alpha: float,
+    future_steps: int,
+    max_points: int | None = None,
+    downsample: str = "lttb",
+) -> SeriesResp:
+    """
+    Return predictive overlay data for one sensor.
+    With `max_points`, the observed series is reduced server-side (LTTB or
+    min/max per bucket) after scoring; anomaly points are always kept and
+    `anomalies_idx` refers to the reduced series.
+    """
+    ts_arr, vals_arr = sample_store.snapshot(sensor_id, time.time() - window_s, min_points=2)
+    if ts_arr.size == 0:
         return SeriesResp(
             sensor_id=sensor_id,
             ts=[], vals=[], preds=[], anomalies_idx=[],
             future_ts=[], future_preds=[]
         )
 
-    cutoff = time.time() - window_s
-    win = [s for s in buf if s["t"] >= cutoff] or buf[-min(len(buf), 2):]
-
-    ts = [s["t"] for s in win]
-    vals = [s["v"] for s in win]
+    ts = ts_arr.tolist()
+    vals = vals_arr.tolist()
 
     # Shared math so API == worker behavior
-    preds, future_ts, future_preds, anomalies_idx, _z = run_predictions(
-        ts, vals, window_s=window_s, alpha=alpha, future_steps=future_steps
-    )
+    with PREDICT_SECONDS.labels("run_predictions").time():
+        preds, future_ts, future_preds, anomalies_idx, _z = run_predictions(
+            ts_arr, vals_arr, window_s=window_s, alpha=alpha, future_steps=future_steps
+        )
+
+    if max_points is not None and ts_arr.size > max_points:
+        kept = downsample_indices(ts_arr, vals_arr, max_points, mode=downsample, keep=anomalies_idx)
+        ts = ts_arr[kept].tolist()
+        vals = vals_arr[kept].tolist()
+        preds = np.asarray(preds, dtype=np.float64)[kept].tolist()
+        anomalies_idx = remap_indices(kept, anomalies_idx).tolist()
 
     return SeriesResp(
         sensor_id=sensor_id,
@@ -43,3 +68,85 @@ def get_series(sensor_id: str, window_s: int, alpha: float, future_steps: int) -
         future_ts=future_ts,
         future_preds=future_preds,
     )
+
+
+def get_fleet_series(
+    sensor_ids: Sequence[str],
+    window_s: int,
+    alpha: float,
+    future_steps: int,
+    max_points: int | None = None,
+    downsample: str = "lttb",
+) -> FleetResp:
+    """
+    `get_series` for many sensors at once. Windows are right-aligned into 2-D
+    arrays (grouped by length so short series don't pay for long ones) and
+    scored with one `score_matrix` pass per group; per-sensor results match
+    `get_series`.
+    """
+    cutoff = time.time() - window_s
+    snaps: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    missing: List[str] = []
+    for sid in sensor_ids:
+        ts_arr, vals_arr = sample_store.snapshot(sid, cutoff, min_points=2)
+        if ts_arr.size:
+            snaps[sid] = (ts_arr, vals_arr)
+        else:
+            missing.append(sid)
+
+    # group by power-of-two length bucket: padding stays under 2x per group
+    groups: Dict[int, List[str]] = {}
+    for sid, (ts_arr, _v) in snaps.items():
+        groups.setdefault(int(ts_arr.size).bit_length(), []).append(sid)
+
+    items: Dict[str, FleetItem] = {}
+    for sids in groups.values():
+        lengths = np.array([snaps[sid][0].size for sid in sids])
+        L = int(lengths.max())
+        mat = np.zeros((len(sids), L), dtype=np.float64)
+        for row, sid in enumerate(sids):
+            vals_arr = snaps[sid][1]
+            mat[row, L - vals_arr.size:] = vals_arr
+        with PREDICT_SECONDS.labels("score_matrix").time():
+            preds_mat, z_mat = score_matrix(mat, lengths, window_s, alpha)
+        for row, sid in enumerate(sids):
+            ts_arr, vals_arr = snaps[sid]
+            preds = preds_mat[row, L - ts_arr.size:]
+            z = z_mat[row, L - ts_arr.size:]
+            anomalies = np.flatnonzero(np.abs(z) >= 3.0)
+            if max_points is not None and ts_arr.size > max_points:
+                kept = downsample_indices(ts_arr, vals_arr, max_points, mode=downsample, keep=anomalies)
+                ts_arr, vals_arr, preds = ts_arr[kept], vals_arr[kept], preds[kept]
+                anomalies = remap_indices(kept, anomalies)
+            items[sid] = FleetItem(
+                sensor_id=sid,
+                ts=ts_arr.tolist(),
+                vals=vals_arr.tolist(),
+                preds=preds.tolist(),
+                anomalies_idx=anomalies.tolist(),
+                z_last=float(z[-1]),
+                future_pred=float(preds[-1]) if future_steps > 0 else None,
+            )
+
+    return FleetResp(
+        window_s=window_s,
+        alpha=alpha,
+        future_steps=future_steps,
+        items=[items[sid] for sid in sensor_ids if sid in items],
+        missing=missing,
+    )
+
+
+def get_history(sensor_id: str, start_ts: float, end_ts: float, max_points: int) -> HistoryResp:
+    """
+    Stored history for [start_ts, end_ts]: raw samples when they fit in
+    `max_points`, otherwise the finest rollup (1m, then 1h) that does.
+    """
+    resolution, rows = SampleRepo().get_range(sensor_id, start_ts, end_ts, max_points)
+    cols = list(zip(*rows)) if rows else [()] * 6
+    t, n, vmin, vmax, mean, last = (list(c) for c in cols)
+    return HistoryResp(
+        sensor_id=sensor_id,
+        resolution=resolution,
+        ts=t, mean=mean, vmin=vmin, vmax=vmax, count=n, last=last,
+    )
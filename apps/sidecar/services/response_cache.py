@@ -0,0 +1,102 @@
+# apps/sidecar/services/response_cache.py
+from __future__ import annotations
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from apps.sidecar.core.settings import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_S
+
+# Shared cache of serialized JSON responses. An entry is valid while the
+# sensor's version (append sequence) is unchanged and it is younger than the
+# TTL (windows are time-based, so points also age out without new appends).
+# N viewers of the same sensor/parameters cost one computation per new sample.
+
+class ResponseCache:
+    """Size-bounded LRU of (version, created, body, etag) keyed by request parameters."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_s: float = RESPONSE_CACHE_TTL_S):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self._items: "OrderedDict[Hashable, Tuple[Hashable, float, bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] != version or time.monotonic() - entry[1] > self.ttl_s:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key: Hashable, version: Hashable, body: bytes, etag: str) -> None:
+        with self._lock:
+            self._items[key] = (version, time.monotonic(), body, etag)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            body_bytes = sum(len(e[2]) for e in self._items.values())
+            return {"entries": len(self._items), "body_bytes": body_bytes, "hits": self.hits, "misses": self.misses}
+
+
+_CACHE = ResponseCache()
+
+
+def cached_json(key: Hashable, version: Hashable, compute: Callable[[], Any]) -> Tuple[bytes, str]:
+    """
+    Return (json_body, etag) for `key`, recomputing only if `version` moved or
+    the entry expired. The ETag is a hash of the body, so it only changes when
+    the content does.
+    """
+    hit = _CACHE.get(key, version)
+    if hit is not None:
+        return hit
+    result = compute()
+    if isinstance(result, BaseModel):
+        body = result.model_dump_json().encode("utf-8")
+    else:
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+    etag = f'"{zlib.crc32(body):08x}-{len(body):x}"'
+    _CACHE.put(key, version, body, etag)
+    return body, etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 7232 weak comparison against an If-None-Match header value."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def conditional_response(request: Request, body: bytes, etag: str) -> Response:
+    """200 with the cached body, or 304 when the client already has this ETag."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # always revalidate
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def get_cache() -> ResponseCache:
+    return _CACHE
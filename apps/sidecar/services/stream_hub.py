@@ -0,0 +1,90 @@
+# apps/sidecar/services/stream_hub.py
+from __future__ import annotations
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from apps.sidecar.core.settings import STREAM_QUEUE_MAX
+
+# Per-sensor fan-out for live pushes (GET /stream). Publishers may run on any
+# thread (simulator, writer callers, request threadpool); each subscriber owns
+# a bounded asyncio.Queue on its event loop. A subscriber whose queue fills up
+# is dropped rather than allowed to slow publishers or grow memory.
+
+Event = Tuple[str, Dict[str, Any]]  # (event name, payload)
+
+DROPPED: Event = ("dropped", {"reason": "slow consumer"})
+
+
+class Subscriber:
+    def __init__(self, sensor_ids: Iterable[str], loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.sensor_ids = frozenset(sensor_ids)
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+
+class StreamHub:
+    def __init__(self, queue_max: int = STREAM_QUEUE_MAX):
+        self.queue_max = max(1, int(queue_max))
+        self._subs: Dict[str, Set[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, sensor_ids: Iterable[str]) -> Subscriber:
+        """Register a subscriber; must be called from the consumer's event loop."""
+        sub = Subscriber(sensor_ids, asyncio.get_running_loop(), self.queue_max)
+        with self._lock:
+            for sid in sub.sensor_ids:
+                self._subs.setdefault(sid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            for sid in sub.sensor_ids:
+                subs = self._subs.get(sid)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[sid]
+
+    def has_subscribers(self, sensor_id: str) -> bool:
+        return sensor_id in self._subs
+
+    def publish(self, sensor_id: str, event: str, data: Dict[str, Any]) -> None:
+        """Thread-safe, non-blocking fan-out to every subscriber of `sensor_id`."""
+        if sensor_id not in self._subs:
+            return
+        with self._lock:
+            subs = list(self._subs.get(sensor_id, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(self._offer, sub, (event, data))
+            except RuntimeError:
+                # consumer loop already closed
+                self.unsubscribe(sub)
+
+    def _offer(self, sub: Subscriber, item: Event) -> None:
+        # runs on the subscriber's loop
+        if sub.dropped:
+            return
+        try:
+            sub.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            sub.dropped = True
+            self.unsubscribe(sub)
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait(DROPPED)
+
+    def subscriber_count(self, sensor_id: Optional[str] = None) -> int:
+        with self._lock:
+            if sensor_id is not None:
+                return len(self._subs.get(sensor_id, ()))
+            return len({s for subs in self._subs.values() for s in subs})
+
+
+_HUB = StreamHub()
+
+
+def get_hub() -> StreamHub:
+    return _HUB
@@ -0,0 +1,44 @@
+# apps/sidecar/workers/alert_sweeper.py
+from __future__ import annotations
+import logging
+import threading
+from typing import Optional
+
+from apps.sidecar.core.settings import ALERT_SWEEP_S
+from apps.sidecar.services import alerts_service
+
+log = logging.getLogger(__name__)
+
+# Alert episodes close on the first sample after ALERT_QUIET_S of calm; a
+# sensor that stops reporting sends no such sample. Every ALERT_SWEEP_S this
+# thread closes the episodes nothing has extended for ALERT_QUIET_S
+# (alerts_service.sweep). Runs in every worker: episode trackers are per process.
+
+_STOP = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+
+
+def _loop(interval_s: float) -> None:
+    while not _STOP.wait(interval_s):
+        try:
+            alerts_service.sweep()
+        except Exception:
+            log.exception("alert sweep failed")
+
+
+def start(interval_s: float = ALERT_SWEEP_S) -> None:
+    """Start the process-wide sweep thread (called from main.py startup)."""
+    global _THREAD
+    if _THREAD is not None or interval_s <= 0:
+        return
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_loop, args=(interval_s,), name="alert-sweeper", daemon=True)
+    _THREAD.start()
+
+
+def stop(timeout: float = 5.0) -> None:
+    global _THREAD
+    _STOP.set()
+    if _THREAD is not None:
+        _THREAD.join(timeout=timeout)
+        _THREAD = None
@@ -4,16 +4,16 @@ import math
 import random
 from typing import Optional
 
-from apps.sidecar.repositories.storage.sample_repo import SampleRepo
-from apps.sidecar.repositories.storage.alert_repo import AlertRepo
-from apps.sidecar.core.anomaly import run_predictions
-from apps.sidecar.core.settings import SAMPLE_INTERVAL_S, ANOMALY_Z_THRESHOLD
-from apps.sidecar.services.notify import notify_alert
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.core.settings import SAMPLE_INTERVAL_S, ANOMALY_WINDOW
+from apps.sidecar.core.streaming import get_detector
+from apps.sidecar.services import alerts_service
 
 # NOTE: This is a lightweight dev simulator that:
 # 1) generates a smooth signal with occasional dips/spikes
-# 2) appends samples to SQLite (SampleRepo)
-# 3) computes Z in-process and writes alerts when |z| >= threshold
+# 2) appends samples to the sample store (SQLite + in-memory buffer)
+# 3) computes Z in-process (streaming detector) and feeds the sensor's alert
+#    episode (one alert row per anomaly episode, notified once when it opens)
 
 def simulate_value(t: float) -> float:
     base = 50.0 + 3.0 * math.sin(t / 60.0)  # slow wave
@@ -26,34 +26,21 @@ def simulate_value(t: float) -> float:
     return base + noise + shock
 
 def run_simulator(sensor_id: str = "ai_test", interval_s: Optional[int] = None) -> None:
-    repo = SampleRepo()
-    alerts = AlertRepo()
     dt = interval_s or SAMPLE_INTERVAL_S
-    history_ts: list[float] = []
-    history_vals: list[float] = []
+    detector = get_detector(
+        sensor_id,
+        seed=lambda: sample_store.tail(sensor_id, ANOMALY_WINDOW),
+    )
+    tracker = alerts_service.tracker(sensor_id)
     while True:
         t = time.time()
         v = simulate_value(t)
-        repo.add_sample(sensor_id, t, v)
-        # maintain a small in-memory tail for z-score computation
-        history_ts.append(t)
-        history_vals.append(v)
-        if len(history_ts) > 600:  # keep ~50 minutes at 5s cadence
-            history_ts = history_ts[-600:]
-            history_vals = history_vals[-600:]
+        sample_store.append(sensor_id, t, v).result()
         # compute z & flag
-        preds, _fts, _fp, _idx, z = run_predictions(
-            history_ts, history_vals, window_s=600, alpha=0.3, future_steps=0
-        )
-        if z:
-            z_last = z[-1]
-            if abs(z_last) >= ANOMALY_Z_THRESHOLD:
-                msg = f"Anomaly z={z_last:.2f} at t={int(t)}"
-                alerts.add_alert(sensor_id, t, v, z_last, msg)
-                try:
-                    notify_alert(sensor_id=sensor_id, t=t, v=v, z=z_last, msg=msg)
-                except Exception:
-                    pass
+        z_last = detector.update(v, t)
+        if tracker.wants(z_last):
+            tracker.update(t, v, z_last)
+            alerts_service.flush([sensor_id])
         time.sleep(dt)
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+# apps/sidecar/workers/mqtt_bridge.py
+from __future__ import annotations
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from apps.sidecar.core.settings import (
+    MQTT_HOST,
+    MQTT_PORT,
+    MQTT_TOPIC,
+    MQTT_QOS,
+    MQTT_BATCH_MAX,
+    MQTT_BATCH_MS,
+    MQTT_QUEUE_MAX,
+    MQTT_BLOCK_S,
+    MQTT_CLIENT_ID,
+)
+from apps.sidecar.core import metrics
+from apps.sidecar.services.ingest_service import Reading, ingest_many
+
+log = logging.getLogger(__name__)
+
+# In-process MQTT → sample store bridge.
+# Devices publish JSON to sensors/<device> (see apps/collector_sim/publisher.py):
+#   {"device_id": "wetvac-1", "metric": "water_flow_lpm", "value": 12.3, "ts": 1706056700.1}
+# Messages are parsed on paho's network thread into a bounded queue; a flush
+# thread drains it in micro-batches through ingest_service.ingest_many (one
+# executemany + one scoring pass per batch). When storage falls behind the
+# queue fills and the paho thread blocks, which stops reading the socket so the
+# broker holds QoS1 messages; after MQTT_BLOCK_S a reading is dropped (counted).
+# Acks are manual and every message is acked exactly once, so none holds a
+# slot of the broker's inflight window: a stored reading once the batch it is
+# in has committed (a crash before that leaves it unacked, so a persistent
+# session, SIDECAR_MQTT_CLIENT_ID, gets it redelivered); an unusable payload, a
+# reading dropped on a full queue or one whose batch failed to store at once.
+# Those are lost (at-most-once), counted in sidecar_mqtt_messages_total.
+
+
+def parse_payload(topic: str, payload: bytes, now: Optional[float] = None) -> Optional[Reading]:
+    """
+    Map one device message to (sensor_id, t, v), or None if unusable
+    (v missing or not finite). sensor_id is "<device_id>.<metric>" (device
+    from the topic if absent); a missing, bad or negative ts means server time.
+    """
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    try:
+        value = float(data["value"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not math.isfinite(value):
+        return None
+    device = str(data.get("device_id") or topic.rsplit("/", 1)[-1])
+    metric = data.get("metric")
+    sensor_id = f"{device}.{metric}" if metric else device
+    try:
+        t = float(data["ts"]) if data.get("ts") is not None else (now or time.time())
+    except (ValueError, TypeError):
+        t = now or time.time()
+    if not (math.isfinite(t) and t >= 0):
+        t = now or time.time()
+    return sensor_id[:128], t, value
+
+
+class MqttBridge:
+    """
+    Subscribe to MQTT, micro-batch readings into the store + scoring path.
+    `client_factory` builds the MQTT client (defaults to paho); pass a fake to
+    test without a broker, or call `handle_message` directly.
+    """
+
+    def __init__(
+        self,
+        host: str = MQTT_HOST,
+        port: int = MQTT_PORT,
+        topic: str = MQTT_TOPIC,
+        qos: int = MQTT_QOS,
+        batch_max: int = MQTT_BATCH_MAX,
+        batch_ms: float = MQTT_BATCH_MS,
+        queue_max: int = MQTT_QUEUE_MAX,
+        block_s: float = MQTT_BLOCK_S,
+        sink: Callable[[Sequence[Reading]], Any] = ingest_many,
+        client_factory: Optional[Callable[[], Any]] = None,
+        client_id: str = MQTT_CLIENT_ID,
+    ):
+        self.host, self.port, self.topic, self.qos = host, int(port), topic, int(qos)
+        self.client_id = client_id
+        self.batch_max = max(1, int(batch_max))
+        self.batch_s = max(0.0, float(batch_ms)) / 1000.0
+        self.block_s = float(block_s)
+        self.sink = sink
+        self.client_factory = client_factory
+        self._q: "queue.Queue[Tuple[Reading, Optional[Callable[[], None]]]]" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._client: Any = None
+        # counters
+        self.received = 0
+        self.ingested = 0
+        self.invalid = 0
+        self.dropped = 0
+        self.failed = 0
+        self.failed_batches = 0
+
+    # ---------- MQTT side ----------
+
+    def handle_message(self, topic: str, payload: bytes, ack: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Parse and enqueue one message; blocks up to block_s when the queue is full.
+        Returns whether the reading was queued. `ack` is called exactly once:
+        after the reading's batch is stored, or right away if it is not queued.
+        """
+        self.received += 1
+        reading = parse_payload(topic, payload)
+        if reading is None:
+            self.invalid += 1
+            metrics.MQTT_MESSAGES.labels("invalid").inc()
+            _call(ack)
+            return False
+        try:
+            self._q.put((reading, ack), timeout=self.block_s)
+        except queue.Full:
+            self.dropped += 1
+            metrics.MQTT_MESSAGES.labels("dropped").inc()
+            _call(ack)
+            return False
+        return True
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # (re)subscribe on every connect so reconnects keep the subscription
+        log.info("mqtt bridge connected rc=%s to %s:%s", reason_code, self.host, self.port)
+        client.subscribe(self.topic, qos=self.qos)
+
+    def _on_message(self, client, userdata, msg):
+        ack = None
+        if msg.qos > 0:
+            mid, qos = msg.mid, msg.qos
+            ack = lambda: client.ack(mid, qos)
+        self.handle_message(msg.topic, msg.payload, ack)
+
+    def _default_client(self):
+        import paho.mqtt.client as mqtt  # optional dependency
+        return mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=self.client_id,
+            clean_session=not self.client_id,
+            manual_ack=True,
+        )
+
+    # ---------- flush side ----------
+
+    def _next_batch(self) -> List[Tuple[Reading, Optional[Callable[[], None]]]]:
+        try:
+            batch = [self._q.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_s
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_loop(self) -> None:
+        while not (self._stop.is_set() and self._q.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.sink([reading for reading, _ack in batch])
+                self.ingested += len(batch)
+                metrics.MQTT_MESSAGES.labels("ingested").inc(len(batch))
+            except Exception:
+                self.failed_batches += 1
+                self.failed += len(batch)
+                metrics.MQTT_MESSAGES.labels("failed").inc(len(batch))
+                log.exception("mqtt bridge: failed to ingest batch of %d", len(batch))
+            for _reading, ack in batch:
+                _call(ack)
+
+    # ---------- lifecycle ----------
+
+    def start(self) -> bool:
+        """Connect (async, auto-reconnect) and start the flush thread. False if paho is missing."""
+        try:
+            client = (self.client_factory or self._default_client)()
+        except ImportError:
+            log.warning("mqtt bridge disabled: paho-mqtt is not installed")
+            return False
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="mqtt-flush", daemon=True)
+        self._flusher.start()
+        client.connect_async(self.host, self.port, keepalive=60)
+        client.loop_start()
+        self._client = client
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush whatever is queued (acking it), then disconnect."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=timeout)
+            self._flusher = None
+        if self._client is not None:
+            # disconnect before stopping the network loop so the last acks go out
+            self._client.disconnect()
+            self._client.loop_stop()
+            self._client = None
+
+
+def _call(ack: Optional[Callable[[], None]]) -> None:
+    if ack is None:
+        return
+    try:
+        ack()
+    except Exception:
+        log.exception("mqtt bridge: ack failed")
+
+
+_BRIDGE: Optional[MqttBridge] = None
+
+
+def start() -> Optional[MqttBridge]:
+    """Start the process-wide bridge (called from main.py startup)."""
+    global _BRIDGE
+    if _BRIDGE is None:
+        bridge = MqttBridge()
+        if bridge.start():
+            _BRIDGE = bridge
+    return _BRIDGE
+
+
+def stop() -> None:
+    global _BRIDGE
+    if _BRIDGE is not None:
+        _BRIDGE.stop()
+        _BRIDGE = None
+
+
+def get_bridge() -> Optional[MqttBridge]:
+    return _BRIDGE
@@ -0,0 +1,335 @@
+# apps/sidecar/workers/retention.py
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from apps.sidecar.core.settings import (
+    CORTEX_DB_PATH,
+    RETENTION_SAMPLES_HOURS,
+    RETENTION_ALERTS_HOURS,
+    RETENTION_READINGS_HOURS,
+    RETENTION_ROLLUP_1M_HOURS,
+    RETENTION_ROLLUP_1H_HOURS,
+    RETENTION_SENSOR_HOURS,
+    RETENTION_INTERVAL_S,
+    RETENTION_BATCH,
+    RETENTION_VACUUM_PAGES,
+    SAMPLE_BACKEND,
+    SAMPLE_BLOCK_MAX,
+    SAMPLE_BLOCK_S,
+    SAMPLE_COLD_HOURS,
+)
+from apps.sidecar.repositories.storage.block_repo import BlockRepo
+from apps.sidecar.repositories.storage.segment_repo import SegmentSampleRepo
+from apps.sidecar.repositories.storage.sqlite import connect, get_read_conn
+from apps.sidecar.repositories.storage.writer import SqliteWriter, get_writer
+
+log = logging.getLogger(__name__)
+
+# Background pruning of expired rows.
+# sidecar.db (samples, alerts, rollups): expired rowids are found per sensor on
+# a reader connection via the (sensor_id, t) index, then deleted in
+# RETENTION_BATCH chunks through the writer thread, so each delete is one short
+# group commit interleaved with ingest. cortex.db (readings) is written by aiosqlite with its
+# own connections, so it is pruned directly in short autocommit batches.
+# Segment files (SIDECAR_SAMPLE_BACKEND=segments) expire a whole segment at a
+# time, and overlapping segments left by late samples are compacted.
+# With the sqlite backend, surviving raw samples older than SAMPLE_COLD_HOURS
+# are then compressed into sample_blocks (block_repo.py), one sensor-hour per
+# writer job; blocks expire by their last sample time.
+# Afterwards free pages are returned with PRAGMA incremental_vacuum (only for
+# files created with auto_vacuum=INCREMENTAL; others just reuse the freelist),
+# RETENTION_VACUUM_PAGES per step; for sidecar.db each step is a writer job.
+# Alert episodes expire by their last sample, and never while still open.
+
+_SENSORS_SQL = """
+WITH RECURSIVE s(id) AS (
+    SELECT MIN(sensor_id) FROM {table}
+    UNION ALL
+    SELECT (SELECT MIN(sensor_id) FROM {table} WHERE sensor_id > s.id) FROM s WHERE s.id IS NOT NULL
+)
+SELECT id FROM s WHERE id IS NOT NULL
+"""
+
+# expiry condition per table (default: t < :cutoff). sample_blocks expire once
+# their newest sample has; an alert episode once it is closed and its last
+# sample has (t < :cutoff first, so the (sensor_id, t) index still narrows it)
+_EXPIRED = {
+    "sample_blocks": "t1 < :cutoff",
+    "alerts": "t < :cutoff AND COALESCE(last_t, t) < :cutoff AND active = 0",
+}
+
+
+def parse_sensor_hours(spec: str) -> Dict[str, float]:
+    """Parse "pump-1=168,ai_test=6" into {sensor_id: hours}; bad entries are skipped."""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        sensor_id, sep, hours = part.strip().rpartition("=")
+        if not sep or not sensor_id:
+            continue
+        try:
+            out[sensor_id.strip()] = float(hours)
+        except ValueError:
+            continue
+    return out
+
+
+def _sensor_ids(conn: sqlite3.Connection, table: str) -> List[str]:
+    # skip-scan of the (sensor_id, ...) index: one seek per distinct sensor
+    return [r[0] for r in conn.execute(_SENSORS_SQL.format(table=table))]
+
+
+def _db_bytes(conn: sqlite3.Connection) -> Dict[str, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"bytes": pages * page_size, "free_bytes": free * page_size}
+
+
+def _incremental_vacuum(
+    conn: sqlite3.Connection,
+    pages: int,
+    writer: Optional[SqliteWriter] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Return free pages to the OS, `pages` at a time. With `writer` (sidecar.db)
+    every step is its own short writer job, interleaved with ingest; `conn`
+    only reads the freelist size. Without one the steps run on `conn`.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+        return
+    sql = f"PRAGMA incremental_vacuum({int(pages)})"
+    while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+        if stop is not None and stop.is_set():
+            break
+        # each step frees one page; fetchall() drives it to the end of the chunk
+        if writer is not None:
+            writer.submit_ops([(lambda cur: cur.execute(sql).fetchall(), None, False)]).result()
+        else:
+            conn.execute(sql).fetchall()
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+
+class RetentionEngine:
+    """
+    Deletes rows older than their retention window, batch by batch.
+    Windows are hours per table (0 = keep forever); `sensor_hours` overrides
+    the window of sample data (samples, readings) for individual sensors.
+    """
+
+    def __init__(
+        self,
+        samples_hours: float = RETENTION_SAMPLES_HOURS,
+        alerts_hours: float = RETENTION_ALERTS_HOURS,
+        readings_hours: float = RETENTION_READINGS_HOURS,
+        rollup_1m_hours: float = RETENTION_ROLLUP_1M_HOURS,
+        rollup_1h_hours: float = RETENTION_ROLLUP_1H_HOURS,
+        cold_hours: float = SAMPLE_COLD_HOURS,
+        sensor_hours: Optional[Dict[str, float]] = None,
+        batch: int = RETENTION_BATCH,
+        vacuum_pages: int = RETENTION_VACUUM_PAGES,
+        interval_s: float = RETENTION_INTERVAL_S,
+        cortex_path: str = CORTEX_DB_PATH,
+    ):
+        self.table_hours = {
+            "samples": samples_hours,
+            "alerts": alerts_hours,
+            "readings": readings_hours,
+            "samples_1m": rollup_1m_hours,
+            "samples_1h": rollup_1h_hours,
+            "sample_blocks": samples_hours,
+        }
+        self.cold_hours = cold_hours
+        self.sensor_hours = parse_sensor_hours(RETENTION_SENSOR_HOURS) if sensor_hours is None else dict(sensor_hours)
+        self.batch = max(1, int(batch))
+        self.vacuum_pages = max(1, int(vacuum_pages))
+        self.interval_s = max(1.0, float(interval_s))
+        self.cortex_path = cortex_path
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def hours_for(self, table: str, sensor_id: str) -> float:
+        if table in ("samples", "sample_blocks", "readings") and sensor_id in self.sensor_hours:
+            return self.sensor_hours[sensor_id]
+        return self.table_hours[table]
+
+    # ---------- sidecar.db ----------
+
+    def _prune_sidecar(self, table: str, now: float) -> int:
+        reader = get_read_conn()
+        writer = get_writer()
+        expired = _EXPIRED.get(table, "t < :cutoff")
+        deleted = 0
+        for sensor_id in _sensor_ids(reader, table):
+            hours = self.hours_for(table, sensor_id)
+            if hours <= 0:
+                continue
+            cutoff = now - hours * 3600.0
+            while not self._stop.is_set():
+                rowids = [r[0] for r in reader.execute(
+                    f"SELECT rowid FROM {table} WHERE sensor_id = :sensor_id AND {expired} LIMIT :limit",
+                    {"sensor_id": sensor_id, "cutoff": cutoff, "limit": self.batch},
+                )]
+                if not rowids:
+                    break
+                writer.submit(
+                    f"DELETE FROM {table} WHERE rowid = :rowid AND {expired}",
+                    [{"rowid": rid, "cutoff": cutoff} for rid in rowids],
+                    many=True,
+                ).result()
+                deleted += len(rowids)
+        return deleted
+
+    def _compress_cold(self, now: float) -> Dict[str, int]:
+        repo = BlockRepo()
+        cutoff = now - self.cold_hours * 3600.0
+        windows = samples = 0
+        for sensor_id in _sensor_ids(get_read_conn(), "samples"):
+            if self._stop.is_set():
+                break
+            w, n = repo.compress_before(sensor_id, cutoff, SAMPLE_BLOCK_S, SAMPLE_BLOCK_MAX, self._stop.is_set)
+            windows += w
+            samples += n
+        return {"windows": windows, "samples": samples}
+
+    # ---------- segment files ----------
+
+    def _prune_segments(self, now: float) -> Dict[str, int]:
+        repo = SegmentSampleRepo()
+        deleted = reclaimed = compacted = 0
+        for sensor_id in repo.sensor_ids():
+            if self._stop.is_set():
+                break
+            hours = self.hours_for("samples", sensor_id)
+            if hours > 0:
+                rows, nbytes = repo.prune(sensor_id, now - hours * 3600.0)
+                deleted += rows
+                reclaimed += nbytes
+            compacted += repo.compact(sensor_id)
+        return {"deleted": deleted, "reclaimed_bytes": reclaimed, "compacted_segments": compacted}
+
+    # ---------- cortex.db ----------
+
+    def _prune_cortex(self, conn: sqlite3.Connection, now: float) -> int:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='readings'").fetchone() is None:
+            return 0
+        deleted = 0
+        for sensor_id in _sensor_ids(conn, "readings"):
+            hours = self.hours_for("readings", sensor_id)
+            if hours <= 0:
+                continue
+            # readings.ts is datetime('now') text: "YYYY-MM-DD HH:MM:SS" UTC
+            cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - hours * 3600.0))
+            while not self._stop.is_set():
+                cur = conn.execute(
+                    "DELETE FROM readings WHERE rowid IN "
+                    "(SELECT rowid FROM readings WHERE sensor_id=? AND ts<? LIMIT ?)",
+                    (sensor_id, cutoff, self.batch),
+                )
+                if cur.rowcount <= 0:
+                    break
+                deleted += cur.rowcount
+        return deleted
+
+    # ---------- one pass ----------
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Prune every table once, vacuum, and return a report of what was reclaimed."""
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        report: Dict[str, Any] = {"ts": now, "tables": {}, "databases": {}}
+
+        conn = connect(isolation_level=None)
+        try:
+            before = _db_bytes(conn)
+            for table in ("samples", "sample_blocks", "alerts", "samples_1m", "samples_1h"):
+                report["tables"][table] = {"deleted": self._prune_sidecar(table, now)}
+            if SAMPLE_BACKEND == "sqlite" and self.cold_hours > 0:
+                report["compressed"] = self._compress_cold(now)
+            _incremental_vacuum(conn, self.vacuum_pages, get_writer(), self._stop)
+            report["databases"]["sidecar"] = self._db_report(before, _db_bytes(conn))
+        finally:
+            conn.close()
+
+        if SAMPLE_BACKEND == "segments":
+            report["tables"]["segments"] = self._prune_segments(now)
+
+        if os.path.exists(self.cortex_path):
+            conn = sqlite3.connect(self.cortex_path, isolation_level=None)
+            try:
+                conn.execute("PRAGMA busy_timeout=5000;")
+                before = _db_bytes(conn)
+                report["tables"]["readings"] = {"deleted": self._prune_cortex(conn, now)}
+                _incremental_vacuum(conn, self.vacuum_pages, stop=self._stop)
+                report["databases"]["cortex"] = self._db_report(before, _db_bytes(conn))
+            finally:
+                conn.close()
+
+        report["duration_s"] = round(time.monotonic() - started, 3)
+        self.last_report = report
+        log.info(
+            "retention: deleted %s; reclaimed %s bytes",
+            {t: r["deleted"] for t, r in report["tables"].items()},
+            {d: r["reclaimed_bytes"] for d, r in report["databases"].items()},
+        )
+        return report
+
+    @staticmethod
+    def _db_report(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+        return {
+            "bytes_before": before["bytes"],
+            "bytes_after": after["bytes"],
+            "reclaimed_bytes": before["bytes"] - after["bytes"],
+            # pages freed but kept by the file (auto_vacuum off): reused by later inserts
+            "free_bytes": after["free_bytes"],
+        }
+
+    # ---------- lifecycle ----------
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("retention pass failed")
+            self._stop.wait(self.interval_s)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+_ENGINE: Optional[RetentionEngine] = None
+
+
+def start() -> RetentionEngine:
+    """Start the process-wide retention thread (called from main.py startup)."""
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = RetentionEngine()
+        _ENGINE.start()
+    return _ENGINE
+
+
+def stop() -> None:
+    global _ENGINE
+    if _ENGINE is not None:
+        _ENGINE.stop()
+        _ENGINE = None
+
+
+def last_report() -> Optional[Dict[str, Any]]:
+    return _ENGINE.last_report if _ENGINE is not None else None
@@ -5,7 +5,7 @@ import math
 import random
 import threading
 
-from apps.sidecar.repositories.buffers import append
+from apps.sidecar.services.predictive_service import ingest_point
 
 def start(sensor_id: str = "ai_test", period: float = 1.0) -> None:
     """
@@ -23,7 +23,7 @@ def start(sensor_id: str = "ai_test", period: float = 1.0) -> None:
             if random.random() < 0.02:
                 v += random.choice([-12.0, 12.0])
 
-            append(sensor_id, t0 + i * period, float(v))
+            ingest_point(sensor_id, float(v), t0 + i * period)
             time.sleep(period)
             i += 1
 
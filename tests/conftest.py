@@ -0,0 +1,9 @@
+# Settings are read from the environment at import time: point storage at a
+# throwaway data dir before any test imports apps.sidecar.
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="sidecar-tests-")
+os.environ.setdefault("SIDECAR_DATA_DIR", _DATA_DIR)
+os.environ.setdefault("SIDECAR_CORTEX_DB_PATH", os.path.join(_DATA_DIR, "cortex.db"))
+os.environ.setdefault("SIDECAR_RETENTION_ENABLED", "0")
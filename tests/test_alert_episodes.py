@@ -0,0 +1,113 @@
+"""Alert episodes: the tracker's hysteresis (core/episodes.py) and their rows in SQLite (storage/alert_repo.py)."""
+from __future__ import annotations
+
+from apps.sidecar.core.episodes import Episode, EpisodeTracker
+from apps.sidecar.repositories.storage.alert_repo import AlertRepo
+
+
+def _tracker(sensor_id: str = "ep") -> EpisodeTracker:
+    return EpisodeTracker(sensor_id, enter_z=3.0, exit_z=2.0, quiet_s=10.0)
+
+
+def _state(changed):
+    return [(ep.t, ep.n, ep.z, ep.last_t, ep.active, new) for ep, new in changed]
+
+
+# ---------- hysteresis ----------
+
+def test_opens_at_enter_z_and_counts_down_to_exit_z():
+    tr = _tracker()
+    tr.update(0.0, 1.0, 2.5)              # above exit_z, below enter_z: nothing opens
+    assert tr.current is None and tr.drain() == []
+    tr.update(1.0, 5.0, -3.5)             # opens
+    tr.update(2.0, 4.0, 2.5)              # counts (>= exit_z), peak unchanged
+    tr.update(3.0, 9.0, 4.0)              # new peak
+    tr.update(4.0, 0.0, 0.5)              # below exit_z: ignored, does not extend
+    assert _state(tr.drain()) == [(1.0, 3, 4.0, 3.0, True, True)]
+    assert (tr.current.v, tr.current.z) == (9.0, 4.0)
+
+
+def test_hovering_signal_stays_one_episode_and_quiet_gap_closes_it():
+    tr = _tracker()
+    for i, z in enumerate([3.1, 2.9, 1.0, 3.2, 2.1, 0.0, 3.0]):
+        tr.update(float(i), 0.0, z)
+    assert [(t, n) for t, n, *_ in _state(tr.drain())] == [(0.0, 5)]
+    tr.update(16.5, 0.0, 2.5)             # > quiet_s after last_t=6: closes, too weak to open
+    assert _state(tr.drain()) == [(0.0, 5, 3.2, 6.0, False, False)]
+    assert tr.current is None
+    tr.update(17.0, 0.0, 3.0)             # a fresh episode
+    assert _state(tr.drain()) == [(17.0, 1, 3.0, 17.0, True, True)]
+
+
+def test_close_idle_and_restore():
+    tr = _tracker()
+    tr.update(100.0, 0.0, 5.0)
+    drained = tr.drain()
+    tr.restore(drained)                   # its write could not be queued
+    assert _state(tr.drain()) == [(100.0, 1, 5.0, 100.0, True, True)]
+    assert not tr.close_idle(110.0)       # exactly quiet_s: still open
+    assert tr.close_idle(110.5)
+    assert _state(tr.drain()) == [(100.0, 1, 5.0, 100.0, False, False)]
+    assert not tr.wants(1.0) and tr.wants(2.0)
+
+
+# ---------- persistence ----------
+
+def test_updates_hit_the_episode_row_not_legacy_rows_with_the_same_start():
+    repo, sensor = AlertRepo(), "ep-legacy"
+    legacy = [repo.add_alert(sensor, 50.0, 1.0, 4.0, "legacy") for _ in range(2)]
+    tr = _tracker(sensor)
+    tr.update(50.0, 2.0, 3.5)
+    insert = repo.submit_episodes(tr.drain())
+    tr.update(51.0, 3.0, 6.0)
+    tr.update(52.0, 1.0, 2.0)
+    # drained before the insert is known to have committed; queued right behind it
+    repo.submit_episodes(tr.drain()).result()
+    insert.result()
+
+    rows = {r["id"]: r for r in repo.get_alerts(sensor)}
+    assert [rows[i]["msg"] for i in legacy] == ["legacy", "legacy"]
+    assert rows[tr.current.id]["n"] == 3 and rows[tr.current.id]["z"] == 6.0
+    assert len(rows) == 3
+
+
+def test_resumed_episode_carries_its_row_id():
+    repo, sensor = AlertRepo(), "ep-resume"
+    repo.add_alert(sensor, 200.0, 7.0, 9.0, "legacy")  # same (sensor_id, t), inactive
+    tr = _tracker(sensor)
+    tr.update(200.0, 1.0, 4.0)
+    repo.submit_episodes(tr.drain()).result()
+
+    ep = repo.open_episode(sensor)  # after a restart
+    assert ep is not None and ep.id == tr.current.id and (ep.t, ep.n) == (200.0, 1)
+    resumed = _tracker(sensor)
+    resumed.resume(ep)
+    resumed.update(201.0, 1.0, 5.0)
+    repo.submit_episodes(resumed.drain()).result()
+    rows = {r["id"]: r for r in repo.get_alerts(sensor)}
+    assert rows[ep.id]["n"] == 2 and rows[ep.id]["z"] == 5.0
+    assert [(r["msg"], r["z"]) for i, r in rows.items() if i != ep.id] == [("legacy", 9.0)]
+
+
+def test_cursor_returns_each_change_once_in_commit_order():
+    repo, sensor = AlertRepo(), "ep-cursor"
+    tr = _tracker(sensor)
+    start = repo.max_seq(sensor)
+    tr.update(400.0, 1.0, 4.0)
+    repo.submit_episodes(tr.drain()).result()
+    first = repo.get_alerts_after(sensor, start)
+    assert [(r["n"], r["active"]) for r in first] == [(1, True)]
+
+    cursor = first[-1]["seq"]
+    assert repo.get_alerts_after(sensor, cursor) == []
+    tr.update(401.0, 1.0, 2.5)
+    repo.submit_episodes(tr.drain()).result()
+    progressed = repo.get_alerts_after(sensor, cursor)
+    assert [(r["id"], r["n"]) for r in progressed] == [(first[0]["id"], 2)]  # same row, new seq
+
+    cursor = progressed[-1]["seq"]
+    assert sensor in repo.close_idle(401.5)
+    closed = repo.get_alerts_after(sensor, cursor)
+    assert [(r["id"], r["active"]) for r in closed] == [(first[0]["id"], False)]
+    assert repo.max_seq(sensor) == closed[-1]["seq"]
+    assert repo.get_alerts_after(sensor, cursor, min_abs_z=5.0) == []
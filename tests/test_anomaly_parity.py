@@ -0,0 +1,142 @@
+"""
+Parity of the vectorised anomaly kernels (apps/sidecar/core/anomaly.py, and
+the lagged EWMA in apps/sidecar/predictive/predictive.py built on them) with
+the loop implementations they replaced, kept below as the reference.
+"""
+from __future__ import annotations
+
+import math
+from typing import List
+
+import numpy as np
+import pytest
+
+from apps.sidecar.core.anomaly import run_predictions, score_matrix
+from apps.sidecar.predictive import predictive
+
+
+def ref_ewma(series: List[float], alpha: float) -> List[float]:
+    if not series:
+        return []
+    out = [series[0]]
+    a = float(alpha)
+    for x in series[1:]:
+        out.append(a * x + (1 - a) * out[-1])
+    return out
+
+
+def ref_z_scores(vals: List[float], baseline: List[float], window_s: int) -> List[float]:
+    n = len(vals)
+    if n == 0:
+        return []
+    res = [vals[i] - baseline[i] for i in range(n)]
+    w = max(5, min(n, int(window_s)))
+    out: List[float] = []
+    for i in range(n):
+        lo = max(0, i - w + 1)
+        window = res[lo : i + 1]
+        mu = sum(window) / len(window)
+        var = sum((r - mu) ** 2 for r in window) / max(1, (len(window) - 1))
+        sd = math.sqrt(var) if var > 1e-9 else 1e-6
+        out.append((res[i] - mu) / sd)
+    return out
+
+
+def ref_lagged_ewma(y: np.ndarray, alpha: float) -> np.ndarray:
+    out = np.empty_like(y, dtype=float)
+    out[0] = y[0]
+    for i in range(1, y.size):
+        out[i] = alpha * y[i - 1] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def ref_run_predictions(vals: List[float], window_s: int, alpha: float):
+    preds = ref_ewma(vals, alpha) if vals else []
+    z = ref_z_scores(vals, preds, window_s) if vals else []
+    anomalies_idx = [i for i, z_i in enumerate(z) if abs(z_i) >= 3.0]
+    return preds, anomalies_idx, z
+
+
+def _series(kind: str, n: int, offset: float) -> List[float]:
+    rng = np.random.default_rng(n)
+    if kind == "noise":
+        x = rng.normal(0.0, 1.0, n)
+        x[rng.integers(0, n, size=n // 200)] += 8.0  # a few spikes
+    elif kind == "walk":
+        x = np.cumsum(rng.normal(0.0, 0.5, n))
+    elif kind == "step":
+        x = np.where(np.arange(n) < n // 2, 0.0, 5.0)
+    else:  # constant
+        x = np.zeros(n)
+    return (x + offset).tolist()
+
+
+def _tolerances(vals: List[float], alpha: float):
+    """
+    (preds atol, z atol): the EWMA error is absolute, about eps*max|x - x[0]|/alpha;
+    in flat windows z is residual / 1e-6 (the sd floor), so one ulp of |x|
+    in either implementation's residual shows up amplified.
+    """
+    x = np.asarray(vals)
+    eps = np.finfo(np.float64).eps
+    spread = float(np.abs(x - x[0]).max()) if x.size else 0.0
+    big = float(np.abs(x).max()) if x.size else 0.0
+    return 16 * eps * spread / alpha, 1e-6 + 4 * eps * big / 1e-6
+
+
+CASES = [
+    (kind, n, alpha, window, offset)
+    for kind, n in (("noise", 0), ("noise", 1), ("noise", 7), ("noise", 2000), ("walk", 3000),
+                    ("step", 500), ("constant", 300))
+    for alpha, window in ((0.3, 600), (0.01, 5), (0.99, 3), (1.0, 50))
+    for offset in (0.0, 1e6)
+]
+
+
+@pytest.mark.parametrize("kind,n,alpha,window,offset", CASES)
+def test_run_predictions_matches_loop_reference(kind, n, alpha, window, offset):
+    vals = _series(kind, n, offset)
+    ts = [float(i) for i in range(n)]
+    preds, future_ts, future_preds, anomalies, z = run_predictions(ts, vals, window, alpha, 3)
+    ref_preds, ref_anomalies, ref_z = ref_run_predictions(vals, window, alpha)
+    atol_p, atol_z = _tolerances(vals, alpha)
+
+    assert len(preds) == len(z) == n
+    assert future_ts == []
+    np.testing.assert_allclose(future_preds, [ref_preds[-1]] * 3 if n else [], rtol=1e-12, atol=atol_p)
+    np.testing.assert_allclose(preds, ref_preds, rtol=1e-12, atol=atol_p)
+    np.testing.assert_allclose(z, ref_z, rtol=1e-6, atol=atol_z)
+    assert anomalies == ref_anomalies
+
+
+@pytest.mark.parametrize("window,alpha", ((600, 0.3), (5, 0.01), (3, 0.99)))
+def test_score_matrix_rows_match_loop_reference(window, alpha):
+    series = [_series("noise", n, off) for n, off in ((1, 0.0), (40, 3.0), (700, 1e6), (1000, -2.0))]
+    L = max(len(s) for s in series)
+    vals = np.zeros((len(series), L))
+    for i, s in enumerate(series):
+        vals[i, L - len(s):] = s
+    preds, z = score_matrix(vals, np.array([len(s) for s in series]), window, alpha)
+    for i, s in enumerate(series):
+        ref_preds, _ref_anomalies, ref_z = ref_run_predictions(s, window, alpha)
+        atol_p, atol_z = _tolerances(s, alpha)
+        np.testing.assert_allclose(preds[i, L - len(s):], ref_preds, rtol=1e-12, atol=atol_p)
+        np.testing.assert_allclose(z[i, L - len(s):], ref_z, rtol=1e-6, atol=atol_z)
+
+
+@pytest.mark.parametrize("kind,n,alpha,offset", [
+    (kind, n, alpha, offset)
+    for kind, n in (("noise", 1), ("noise", 2), ("noise", 2000), ("walk", 3000), ("step", 500), ("constant", 300))
+    for alpha in (0.3, 0.01, 0.99, 1.0)
+    for offset in (0.0, 1e6)
+])
+def test_predictive_ewma_matches_loop_reference(kind, n, alpha, offset):
+    y = np.asarray(_series(kind, n, offset))
+    with np.errstate(all="raise"):  # no stray overflow/invalid from uninitialised input
+        out = predictive.ewma(y, alpha)
+        preds = predictive.one_step_ahead_preds(y, alpha)
+    ref = ref_lagged_ewma(y, alpha)
+    atol_p, _atol_z = _tolerances(y.tolist(), alpha)
+    np.testing.assert_allclose(out, ref, rtol=1e-12, atol=atol_p)
+    np.testing.assert_allclose(preds[1:], ref[:-1], rtol=1e-12, atol=atol_p)
+    assert preds[0] == ref[0]
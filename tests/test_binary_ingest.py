@@ -0,0 +1,87 @@
+"""Binary frame decoding (apps/sidecar/services/binary_ingest.py) and the ingest endpoints' value checks."""
+from __future__ import annotations
+
+import math
+import struct
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.sidecar.core import metrics
+from apps.sidecar.core.settings import API_TOKEN
+from apps.sidecar.main import app
+from apps.sidecar.services import binary_ingest
+from apps.sidecar.services.binary_ingest import FRAME_DTYPE, FrameError, decode
+from apps.sidecar.workers.mqtt_bridge import parse_payload
+
+NAMES = np.array(["a", "b", "c"], dtype=object)
+NOW = 1_700_000_000.0
+
+
+def _body(*frames) -> bytes:
+    return b"".join(struct.pack("<Idd", i, t, v) for i, t, v in frames)
+
+
+def _rejected() -> float:
+    return metrics.INGEST_REJECTED.labels("frames").value
+
+
+def test_groups_per_sensor_sorted_by_t():
+    groups = decode(_body((1, 20.0, 2.0), (0, 30.0, 3.0), (1, 10.0, 1.0), (0, math.nan, 4.0)), NAMES, now=NOW)
+    assert [(sid, ts.tolist(), vs.tolist()) for sid, ts, vs in groups] == [
+        ("a", [30.0, NOW], [3.0, 4.0]),  # NaN t = server time
+        ("b", [10.0, 20.0], [1.0, 2.0]),
+    ]
+    assert FRAME_DTYPE.itemsize == 20
+
+
+def test_unusable_frames_are_dropped_and_counted():
+    before = _rejected()
+    body = _body(
+        (0, 1.0, 1.0),
+        (0, 2.0, math.nan), (1, 3.0, math.inf), (1, 4.0, -math.inf),  # bad v
+        (2, math.inf, 1.0), (2, -1.0, 1.0), (2, -math.inf, 1.0),      # bad t
+        (2, 5.0, 5.0),
+    )
+    groups = decode(body, NAMES, now=NOW)
+    assert [(sid, ts.tolist(), vs.tolist()) for sid, ts, vs in groups] == [("a", [1.0], [1.0]), ("c", [5.0], [5.0])]
+    assert _rejected() - before == 6
+    assert decode(_body((0, 1.0, math.nan)), NAMES) == []
+
+
+@pytest.mark.parametrize("cut", [1, 19, 21, 39])
+def test_truncated_bodies_are_rejected(cut):
+    body = _body((0, 1.0, 1.0), (1, 2.0, 2.0))
+    with pytest.raises(FrameError):
+        decode(body[:cut], NAMES)
+
+
+def test_empty_body_and_index_outside_the_dictionary():
+    assert decode(b"", NAMES) == []
+    with pytest.raises(FrameError):
+        decode(_body((0, 1.0, 1.0), (3, 2.0, 2.0)), NAMES)
+
+
+def test_endpoints_refuse_non_finite_readings():
+    client = TestClient(app)  # no lifespan: background jobs stay off
+    headers = {"X-API-Key": API_TOKEN or "", "Content-Type": "application/json"}
+    for body in ('{"sensor_id": "bin-json", "v": NaN}', '{"sensor_id": "bin-json", "v": Infinity}',
+                 '{"sensor_id": "bin-json", "v": 1, "t": -5}', '{"sensor_id": "bin-json", "v": 1, "t": Infinity}'):
+        assert client.post("/ingest", content=body, headers=headers).status_code == 422, body
+
+    did = binary_ingest.register(["bin-frames"])
+    r = client.post(
+        "/ingest/frames",
+        content=_body((0, NOW, 1.0), (0, NOW + 1, math.nan), (0, -1.0, 2.0)),
+        headers={"X-API-Key": API_TOKEN or "", "X-Sensor-Dict": did},
+    )
+    assert r.status_code == 200, r.text
+    assert (r.json()["count"], r.json()["dropped"]) == (1, 2)
+
+
+def test_mqtt_payloads_with_non_finite_values_are_unusable():
+    assert parse_payload("sensors/d", b'{"value": NaN}') is None
+    assert parse_payload("sensors/d", b'{"value": "inf"}') is None
+    assert parse_payload("sensors/d", b'{"value": 1, "ts": -3}', now=NOW) == ("d", NOW, 1.0)
+    assert parse_payload("sensors/d", b'{"value": 1, "ts": Infinity}', now=NOW) == ("d", NOW, 1.0)
@@ -0,0 +1,78 @@
+"""Chart downsampling (core/downsample.py) and its use by /predictive/series."""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import pytest
+
+from apps.sidecar.core.downsample import downsample_indices, lttb_indices, minmax_indices, remap_indices
+from apps.sidecar.repositories import sample_store
+from apps.sidecar.services.predictive_service import get_series
+
+
+def _series(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000.0 + np.cumsum(rng.uniform(0.5, 1.5, n))
+    return ts, np.cumsum(rng.normal(0.0, 1.0, n))
+
+
+@pytest.mark.parametrize("n,n_out", [(10, 3), (100, 10), (1000, 37), (5000, 500), (101, 100)])
+def test_lttb_keeps_endpoints_and_exactly_n_out_points(n, n_out):
+    ts, vs = _series(n)
+    idx = lttb_indices(ts, vs, n_out)
+    assert idx.size == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(idx) > 0)  # sorted, unique
+
+
+@pytest.mark.parametrize("n_out", [0, 2, 50, 51])
+def test_lttb_returns_everything_when_there_is_nothing_to_reduce(n_out):
+    ts, vs = _series(50)
+    assert lttb_indices(ts, vs, n_out).tolist() == list(range(50))
+
+
+def test_lttb_keeps_a_lone_spike():
+    ts = np.arange(1000.0)
+    vs = np.zeros(1000)
+    vs[617] = 50.0
+    assert 617 in lttb_indices(ts, vs, 20)
+
+
+@pytest.mark.parametrize("n,n_out", [(1000, 10), (1001, 11), (5000, 400)])
+def test_minmax_keeps_extremes_within_the_budget(n, n_out):
+    ts, vs = _series(n, seed=1)
+    idx = minmax_indices(ts, vs, n_out)
+    assert idx[0] == 0 and idx[-1] == n - 1 and np.all(np.diff(idx) > 0)
+    assert idx.size <= n_out + 2  # two per bucket, plus the endpoints
+    assert int(np.argmax(vs)) in idx and int(np.argmin(vs)) in idx
+
+
+def test_kept_indices_are_added_on_top_of_the_budget():
+    ts, vs = _series(2000)
+    keep = [5, 999, 1998, -3, 5000]  # out of range ones are ignored
+    idx = downsample_indices(ts, vs, 100, keep=keep)
+    assert {5, 999, 1998} <= set(idx.tolist())
+    assert idx.size <= 100 + 3 and idx[0] == 0 and idx[-1] == 1999
+    assert remap_indices(idx, [5, 1998]).tolist() == [idx.tolist().index(5), idx.tolist().index(1998)]
+
+
+@pytest.mark.parametrize("mode", ["lttb", "minmax"])
+def test_series_downsampled_to_max_points_keeps_anomalies_and_ends(mode):
+    sensor, now = f"downsample-{mode}", time.time()
+    n = 3000
+    vals = np.sin(np.arange(n) / 50.0)
+    vals[1500] = 40.0  # an anomaly the budget alone might skip
+    ts = now - n + np.arange(n, dtype=float)
+    sample_store.submit_grouped([(sensor, ts, vals)]).result()
+
+    full = get_series(sensor, window_s=n + 10, alpha=0.3, future_steps=0)
+    small = get_series(sensor, window_s=n + 10, alpha=0.3, future_steps=0, max_points=200, downsample=mode)
+    assert len(full.ts) == n
+    assert len(small.ts) <= 200 + 2 + len(full.anomalies_idx)
+    assert len(small.ts) == len(small.vals) == len(small.preds)
+    assert (small.ts[0], small.ts[-1]) == (full.ts[0], full.ts[-1])
+    assert 1500 in full.anomalies_idx
+    # anomaly indices point at the same samples in the reduced series
+    assert [small.ts[i] for i in small.anomalies_idx] == [full.ts[i] for i in full.anomalies_idx]
+    assert small.vals[small.ts.index(full.ts[1500])] == 40.0
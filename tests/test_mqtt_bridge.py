@@ -0,0 +1,122 @@
+"""MQTT bridge against a fake paho client: messages through to committed samples, and when they are acked."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from apps.sidecar.core import metrics
+from apps.sidecar.repositories.storage.sample_repo import SampleRepo
+from apps.sidecar.services.ingest_service import ingest_many
+from apps.sidecar.workers.mqtt_bridge import MqttBridge
+
+
+class FakeClient:
+    """
+    Just enough of paho.mqtt.client.Client (manual_ack mode) for MqttBridge,
+    plus a broker-side inflight window: like mosquitto (max_inflight_messages
+    20) it stops delivering QoS1 messages while `window` are unacked.
+    """
+
+    def __init__(self, window: int = 20):
+        self.on_connect = None
+        self.on_message = None
+        self.subscribed = []
+        self.acked = []
+        self.unacked = set()
+        self.window = window
+        self._lock = threading.Lock()
+
+    def connect_async(self, host, port, keepalive=60):
+        self.addr = (host, port)
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, 0, None)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        self.subscribed.append((topic, qos))
+
+    def ack(self, mid, qos):
+        with self._lock:
+            self.unacked.discard(mid)
+            self.acked.append(mid)
+
+    def deliver(self, topic, payload, mid, qos=1):
+        """Deliver one message; False if the inflight window is full (the broker holds it back)."""
+        if qos > 0:
+            with self._lock:
+                if len(self.unacked) >= self.window:
+                    return False
+                self.unacked.add(mid)
+        self.on_message(self, None, SimpleNamespace(topic=topic, payload=payload, mid=mid, qos=qos))
+        return True
+
+
+def _payload(device, metric, value, ts):
+    return json.dumps({"device_id": device, "metric": metric, "value": value, "ts": ts}).encode()
+
+
+def test_messages_are_acked_after_their_batch_commits():
+    client = FakeClient()
+    early = []
+
+    def sink(readings):
+        # none of the batch may be acked before it is stored
+        early.extend(int(v) + 1 for _sid, _t, v in readings if int(v) + 1 in client.acked)
+        return ingest_many(readings)
+
+    bridge = MqttBridge(topic="sensors/#", qos=1, batch_ms=1.0, sink=sink, client_factory=lambda: client)
+    assert bridge.start()
+    assert client.subscribed == [("sensors/#", 1)]
+
+    t0 = time.time() - 100
+    for i in range(20):
+        assert client.deliver("sensors/pump-7", _payload("pump-7", "flow", float(i), t0 + i), mid=i + 1)
+    bridge.stop()
+
+    assert early == []
+    assert sorted(client.acked) == list(range(1, 21)) and not client.unacked
+    assert (bridge.received, bridge.ingested, bridge.invalid, bridge.dropped) == (20, 20, 0, 0)
+    rows = SampleRepo().get_series("pump-7.flow", t0 - 1, t0 + 100)
+    assert [(t - t0, v) for t, v in rows] == [(float(i), float(i)) for i in range(20)]
+
+
+def test_drops_beyond_the_inflight_window_do_not_stall_delivery():
+    client = FakeClient(window=20)
+    # no flush thread yet: the one-slot queue stays full, so everything else is dropped
+    bridge = MqttBridge(queue_max=1, block_s=0.0, client_factory=lambda: client)
+    client.on_message = bridge._on_message
+
+    delivered = [client.deliver("sensors/a", _payload("a", "x", float(i), float(i)), mid=i + 1) for i in range(100)]
+    assert client.deliver("sensors/a", b"not json", mid=1000)
+    client.deliver("sensors/a", _payload("a", "x", 0.5, 0.5), mid=2000, qos=0)
+
+    assert all(delivered)
+    assert bridge.dropped == 99 + 1 and bridge.invalid == 1
+    assert client.unacked == {1}  # only the queued reading waits for its commit
+    before = metrics.MQTT_MESSAGES.labels("dropped").value
+    client.deliver("sensors/a", _payload("a", "x", 9.0, 9.0), mid=3000)
+    assert metrics.MQTT_MESSAGES.labels("dropped").value == before + 1
+
+
+def test_failed_batch_is_acked_and_counted():
+    client = FakeClient()
+
+    def sink(readings):
+        raise OSError("disk full")
+
+    bridge = MqttBridge(batch_ms=1.0, sink=sink, client_factory=lambda: client)
+    assert bridge.start()
+    for i in range(15):
+        assert client.deliver("sensors/b", _payload("b", "x", float(i), float(i)), mid=i + 1)
+    bridge.stop()
+
+    assert not client.unacked and sorted(client.acked) == list(range(1, 16))
+    assert bridge.failed == 15 and bridge.ingested == 0
@@ -0,0 +1,111 @@
+"""NotifyDispatcher: retries during shutdown, dead-lettering, and which SMTP failures are retried."""
+from __future__ import annotations
+
+import json
+import os
+import smtplib
+import threading
+
+from apps.sidecar.services.notify import NotifyDispatcher, SmtpChannel
+
+
+class FlakyChannel:
+    """Fails the first `failures` sends, then succeeds."""
+
+    def __init__(self, failures: int = 1, block: threading.Event = None):
+        self.failures = failures
+        self.block = block
+        self.sent = []
+
+    def send(self, payload):
+        if self.block is not None:
+            self.block.wait()
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("temporary failure")
+        self.sent.append(payload)
+
+    def close(self):
+        pass
+
+
+def _dead_letters(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_stop_retries_queued_jobs(tmp_path):
+    channel = FlakyChannel(failures=1)
+    dl = tmp_path / "dead.jsonl"
+    d = NotifyDispatcher(workers=1, backoff_s=0.01, max_attempts=3, deadletter_path=str(dl),
+                         channel_factory={"webhook": lambda: channel})
+    d.enqueue("webhook", {"n": 1})
+    d.stop(timeout=5.0)
+    assert channel.sent == [{"n": 1}]
+    assert (d.sent, d.failed) == (1, 0)
+    assert _dead_letters(dl) == []
+
+
+def test_stop_dead_letters_what_misses_the_deadline(tmp_path):
+    release = threading.Event()
+    channel = FlakyChannel(failures=0, block=release)
+    dl = tmp_path / "dead.jsonl"
+    d = NotifyDispatcher(workers=1, deadletter_path=str(dl), channel_factory={"webhook": lambda: channel})
+    d.enqueue("webhook", {"n": 1})  # stuck in send until released
+    d.enqueue("webhook", {"n": 2})
+    threading.Timer(0.3, release.set).start()
+    d.stop(timeout=0.1, grace=2.0)
+    assert channel.sent == [{"n": 1}]
+    assert [(r["payload"], r["error"]) for r in _dead_letters(dl)] == [({"n": 2}, "shutdown")]
+
+
+class FakeSmtp:
+    """smtplib.SMTP stand-in: send_message raises the queued errors, then succeeds."""
+
+    def __init__(self, errors, log):
+        self.errors = errors
+        self.log = log
+
+    def send_message(self, msg):
+        self.log.append(msg["Subject"])
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def quit(self):
+        pass
+
+
+def _smtp_channel(errors, sends, connects):
+    ch = SmtpChannel(host="smtp.invalid")
+
+    def connect():
+        connects.append(1)
+        return FakeSmtp(errors, sends)
+
+    ch._connect = connect
+    return ch
+
+
+def test_smtp_permanent_rejection_is_sent_once_and_dead_lettered(tmp_path):
+    sends, connects = [], []
+    errors = [smtplib.SMTPRecipientsRefused({"ops@example.com": (550, b"no such user")})]
+    dl = tmp_path / "dead.jsonl"
+    d = NotifyDispatcher(workers=1, backoff_s=0.01, max_attempts=4, deadletter_path=str(dl),
+                         channel_factory={"email": lambda: _smtp_channel(errors, sends, connects)})
+    d.enqueue("email", {"subject": "s", "body": "b"})
+    d.stop(timeout=5.0)
+
+    assert len(sends) == 1 and len(connects) == 1
+    assert [(r["attempts"], r["payload"]["subject"]) for r in _dead_letters(dl)] == [(1, "s")]
+
+
+def test_smtp_transient_errors_are_retried():
+    sends, connects = [], []
+    errors = [smtplib.SMTPServerDisconnected("idle"), smtplib.SMTPDataError(451, b"try later")]
+    d = NotifyDispatcher(workers=1, backoff_s=0.01, max_attempts=4, deadletter_path=os.devnull,
+                         channel_factory={"email": lambda: _smtp_channel(errors, sends, connects)})
+    d.enqueue("email", {"subject": "s", "body": "b"})
+    d.stop(timeout=5.0)
+
+    # dropped session: reconnect + resend in the channel; 4xx reply: one dispatcher retry
+    assert len(sends) == 3 and len(connects) == 2
+    assert (d.sent, d.failed) == (1, 0)
@@ -0,0 +1,84 @@
+"""Shared response cache and conditional GETs (services/response_cache.py, /predictive/series, /alerts)."""
+from __future__ import annotations
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.sidecar.api import predictive as predictive_api
+from apps.sidecar.core.settings import API_TOKEN
+from apps.sidecar.main import app
+from apps.sidecar.services.response_cache import ResponseCache, etag_matches
+
+AUTH = {"X-API-Key": API_TOKEN or ""}
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)  # no lifespan: background jobs stay off
+
+
+def _ingest(client, sensor_id, values, t0):
+    items = [{"sensor_id": sensor_id, "t": t0 + i, "v": v} for i, v in enumerate(values)]
+    r = client.post("/ingest/batch", json={"items": items}, headers=AUTH)
+    assert r.status_code == 200, r.text
+
+
+def test_series_revalidates_until_an_ingest_moves_the_version(client, monkeypatch):
+    calls = []
+    real = predictive_api.get_series
+    monkeypatch.setattr(predictive_api, "get_series", lambda *a, **k: calls.append(a) or real(*a, **k))
+    sensor, now = "cache-series", time.time()
+    _ingest(client, sensor, [1.0, 2.0, 3.0], now - 10)
+    url = f"/predictive/series?sensor_id={sensor}&window_s=600"
+
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert client.get(url).content == first.content
+    assert len(calls) == 1  # one computation for every viewer
+
+    _ingest(client, sensor, [4.0], now - 5)
+    after = client.get(url, headers={"If-None-Match": etag})
+    assert after.status_code == 200 and after.headers["etag"] != etag
+    assert len(after.json()["vals"]) == 4 and len(calls) == 2
+    assert client.get(url, headers={"If-None-Match": after.headers["etag"]}).status_code == 304
+
+
+def test_alerts_etag_moves_once_an_alert_commits(client):
+    sensor, now = "cache-alerts", time.time()
+    _ingest(client, sensor, [10.0 + (i % 2) * 0.1 for i in range(30)], now - 100)
+    url = f"/alerts?sensor_id={sensor}"
+    first = client.get(url)
+    assert first.status_code == 200 and first.json()["items"] == []
+    etag = first.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    _ingest(client, sensor, [1000.0], now - 50)  # opens an episode (ingest waits for the commit)
+    after = client.get(url, headers={"If-None-Match": etag})
+    assert after.status_code == 200 and after.headers["etag"] != etag
+    assert [a["v"] for a in after.json()["items"]] == [1000.0]
+
+
+def test_etag_comparison():
+    tag = '"abc-1"'
+    assert etag_matches(tag, tag) and etag_matches(f'"x", W/{tag}', tag) and etag_matches("*", tag)
+    assert not etag_matches(None, tag) and not etag_matches('"abc-2"', tag)
+
+
+def test_cache_invalidation_ttl_and_lru_bound(monkeypatch):
+    cache = ResponseCache(max_entries=2, ttl_s=60.0)
+    cache.put("a", 1, b"A", '"a"')
+    assert cache.get("a", 1) == (b"A", '"a"')
+    assert cache.get("a", 2) is None  # version moved
+    cache.put("b", 1, b"B", '"b"')
+    cache.get("a", 1)                 # a is now the most recent
+    cache.put("c", 1, b"C", '"c"')    # evicts b
+    assert len(cache) == 2 and cache.get("b", 1) is None and cache.get("a", 1) is not None
+    expired = ResponseCache(ttl_s=0.0)
+    expired.put("a", 1, b"A", '"a"')
+    monkeypatch.setattr(time, "monotonic", lambda: 1e12)
+    assert expired.get("a", 1) is None
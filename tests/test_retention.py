@@ -0,0 +1,45 @@
+"""Retention pass: alert episodes expire by their last sample and never while open; vacuum goes through the writer."""
+from __future__ import annotations
+
+import time
+
+from apps.sidecar.repositories.storage.alert_repo import AlertRepo
+from apps.sidecar.repositories.storage.sqlite import get_read_conn
+from apps.sidecar.repositories.storage.writer import get_writer
+from apps.sidecar.workers.retention import RetentionEngine
+
+_INSERT = "INSERT INTO alerts (sensor_id, t, v, z, msg, n, last_t, active) VALUES (?, ?, 1, 5, 'm', 1, ?, ?)"
+
+
+def test_alert_episodes_expire_by_last_sample_and_only_when_closed():
+    now = time.time()
+    old, recent = now - 10 * 3600, now - 60
+    get_writer().submit(_INSERT, [
+        ("ret-open", old, recent, 1),      # started long ago, still open: kept
+        ("ret-open-idle", old, old, 1),    # open (the sweep closes it first): kept
+        ("ret-long", old, recent, 0),      # closed, last sample recent: kept
+        ("ret-done", old, old + 60, 0),    # closed long ago: deleted
+        ("ret-legacy", old, None, 0),      # pre-episode row: by t, deleted
+    ], many=True).result()
+
+    report = RetentionEngine(alerts_hours=1, samples_hours=0, rollup_1m_hours=0, cold_hours=0,
+                             sensor_hours={}).run_once(now)
+
+    kept = {r[0] for r in get_read_conn().execute("SELECT sensor_id FROM alerts WHERE sensor_id LIKE 'ret-%'")}
+    assert kept == {"ret-open", "ret-open-idle", "ret-long"}
+    assert report["tables"]["alerts"]["deleted"] >= 2
+    assert AlertRepo().open_episode("ret-open") is not None
+
+
+def test_vacuum_returns_free_pages_through_the_writer():
+    conn = get_read_conn()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    rows = [("vac", float(i), 1.0) for i in range(20000)]
+    get_writer().submit("INSERT OR REPLACE INTO samples (sensor_id, t, v) VALUES (?, ?, ?)", rows, many=True).result()
+    get_writer().submit("DELETE FROM samples WHERE sensor_id = 'vac'").result()
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+    RetentionEngine(samples_hours=0, alerts_hours=0, rollup_1m_hours=0, cold_hours=0,
+                    vacuum_pages=16, sensor_hours={}).run_once()
+
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
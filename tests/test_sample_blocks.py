@@ -0,0 +1,63 @@
+"""Cold-sample blocks: the gorilla codec, and rollups that stay exact when compressed data is written into."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from apps.sidecar.core import gorilla
+from apps.sidecar.repositories.storage.block_repo import BlockRepo
+from apps.sidecar.repositories.storage.rollup_repo import RollupRepo
+from apps.sidecar.repositories.storage.sample_repo import SqliteSampleRepo
+
+
+def _bits(a):
+    return np.asarray(a, dtype="<f8").view("<u8")
+
+
+@pytest.mark.parametrize("ts,vs", [
+    ([], []),
+    ([1.7e9], [42.0]),
+    ([1.0, 2.0, 3.0, 4.0], [np.nan, np.inf, -np.inf, -0.0]),
+    ([5.0, 5.0, 5.0, 6.0], [1.0, 2.0, 1.0, 0.0]),              # duplicate t
+    ([-3.5, 0.0, 1e-300, 1.7e9], [5e-324, -1e308, 0.0, 1.0]),   # sign changes, subnormal
+    ([3.0, 1.0, 2.0], [1.0, 2.0, 3.0]),                         # unsorted still lossless
+])
+def test_codec_roundtrip_is_bit_exact(ts, vs):
+    out_ts, out_vs = gorilla.decode(gorilla.encode(np.array(ts, dtype=float), np.array(vs, dtype=float)))
+    assert np.array_equal(_bits(out_ts), _bits(ts))
+    assert np.array_equal(_bits(out_vs), _bits(vs))  # NaN payload and -0.0 sign preserved
+
+
+def test_codec_regular_series_roundtrip_and_size():
+    ts = 1.7e9 + np.arange(3600, dtype=float)
+    vs = np.round(20.0 + np.cumsum(np.random.default_rng(1).normal(0, 0.05, ts.size)), 2)
+    blob = gorilla.encode(ts, vs)
+    out_ts, out_vs = gorilla.decode(blob)
+    assert np.array_equal(out_ts, ts) and np.array_equal(out_vs, vs)
+    assert len(blob) < 16 * ts.size / 2
+
+
+def test_codec_rejects_foreign_or_truncated_blobs():
+    blob = gorilla.encode(np.arange(10.0), np.arange(10.0))
+    with pytest.raises(ValueError):
+        gorilla.decode(b"XXXX" + blob[4:])
+    with pytest.raises(Exception):
+        gorilla.decode(blob[:-3])
+
+
+def test_write_into_split_bucket_keeps_the_1m_rollup_exact():
+    repo, sensor = SqliteSampleRepo(), "blocks-split-bucket"
+    base = 1_000_020.0  # 1m bucket [1_000_020, 1_000_080)
+    repo.add_samples([(sensor, base + i, float(i)) for i in range(20)])
+    # 10 samples per block: the bucket is split across two blocks
+    windows, moved = BlockRepo().compress_before(sensor, base + 3600, block_s=3600, max_samples=10)
+    assert moved == 20
+    assert [n for _t0, _t1, n in BlockRepo().overlapping(sensor)] == [10, 10]
+
+    # lands inside the second block only
+    repo.add_sample(sensor, base + 15.5, 100.0)
+
+    rollup = RollupRepo().get_rollup(sensor, "1m", base, base + 59)
+    assert [(t, n, vmin, vmax) for t, n, vmin, vmax, _mean, _last in rollup] == [(base, 21, 0.0, 100.0)]
+    ts, vs = repo.get_arrays(sensor)
+    assert ts.size == 21 and vs.max() == 100.0
@@ -0,0 +1,134 @@
+"""The mirrored ring buffer (repositories/buffers.py) and buffer hydration from storage (repositories/sample_store.py)."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from apps.sidecar.repositories import buffers, sample_store
+from apps.sidecar.repositories.buffers import RingBuffer
+from apps.sidecar.repositories.storage.sample_repo import SqliteSampleRepo
+
+
+# ---------- ring buffer ----------
+
+def _mirrored(buf: RingBuffer) -> bool:
+    cap = buf.capacity
+    return np.array_equal(buf._t[:cap], buf._t[cap:]) and np.array_equal(buf._v[:cap], buf._v[cap:])
+
+
+def test_wraparound_keeps_the_newest_window_contiguous():
+    buf = RingBuffer(5, "float64")
+    for i in range(12):
+        buf.append(float(i), float(-i))
+        ts, _vs = buf.view()
+        assert ts.tolist() == [float(j) for j in range(max(0, i - 4), i + 1)]
+        assert ts.base is not None  # a slice of the ring, not a copy
+    assert _mirrored(buf) and len(buf) == 5 and buf.seq == 12
+    assert buf.view()[1].tolist() == [-7.0, -8.0, -9.0, -10.0, -11.0]
+
+
+def test_extend_longer_than_capacity_and_windows():
+    buf = RingBuffer(4, "float32")
+    buf.append(0.0, 0.0)
+    buf.extend(np.arange(1.0, 11.0), np.arange(1.0, 11.0))
+    assert buf.view()[0].tolist() == [7.0, 8.0, 9.0, 10.0] and buf.seq == 11 and _mirrored(buf)
+    assert buf.view(8.5)[0].tolist() == [9.0, 10.0]
+    assert buf.view(10.5, min_points=3)[0].tolist() == [8.0, 9.0, 10.0]
+    assert buf.view(0.0, min_points=9)[0].tolist() == [7.0, 8.0, 9.0, 10.0]
+
+
+def test_out_of_order_data_falls_back_to_a_mask():
+    buf = RingBuffer(8, "float64")
+    buf.extend(np.array([1.0, 5.0, 3.0, 7.0]), np.array([1.0, 5.0, 3.0, 7.0]))
+    assert not buf._sorted
+    assert buf.view(3.0)[0].tolist() == [5.0, 3.0, 7.0]
+    assert buf.view(8.0, min_points=2)[0].tolist() == [3.0, 7.0]
+
+
+def test_merge_unions_by_t_and_the_buffered_sample_wins():
+    buf = RingBuffer(5, "float64")
+    buf.extend(np.array([10.0, 11.0, 12.0]), np.array([1.0, 1.0, 1.0]))
+    buf.append(9.0, 1.0)  # late: unsorted until merged
+    buf.merge(np.array([7.0, 8.0, 9.0, 10.0]), np.array([0.0, 0.0, 0.0, 0.0]))
+    ts, vs = buf.view()
+    assert ts.tolist() == [8.0, 9.0, 10.0, 11.0, 12.0]  # newest `capacity`, one per t
+    assert vs.tolist() == [0.0, 1.0, 1.0, 1.0, 1.0]
+    assert buf._sorted and _mirrored(buf)
+
+
+def test_snapshot_is_an_owned_copy():
+    buf = RingBuffer(3, "float32")
+    buf.extend(np.arange(3.0), np.arange(3.0))
+    ts, vs = buf.snapshot()
+    buf.extend(np.arange(3.0, 6.0), np.arange(3.0, 6.0))
+    assert ts.tolist() == [0.0, 1.0, 2.0] and vs.dtype == np.float64
+
+
+# ---------- hydration ----------
+
+class _CountingRepo:
+    """SampleRepo stand-in that counts storage probes (everything else passes through)."""
+
+    def __init__(self):
+        self.probes = 0
+
+    def __call__(self):
+        return self
+
+    def get_arrays(self, *args, **kwargs):
+        self.probes += 1
+        return SqliteSampleRepo().get_arrays(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(SqliteSampleRepo(), name)
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    counting = _CountingRepo()
+    monkeypatch.setattr(sample_store, "SampleRepo", counting)
+    return counting
+
+
+def test_first_access_hydrates_once_and_keeps_written_samples(repo):
+    sensor, now = "store-hydrate", 1_700_000_000.0
+    SqliteSampleRepo().add_samples([(sensor, now - 100 + i, float(i)) for i in range(10)])
+    buffers.append(sensor, now, 99.0)  # written through before anyone read the sensor
+
+    assert sample_store.hydrate(sensor, now=now) == 10
+    ts, vs = sample_store.snapshot(sensor)
+    assert ts.size == 11 and vs[-1] == 99.0 and vs[:10].tolist() == [float(i) for i in range(10)]
+    sample_store.version(sensor)
+    assert repo.probes == 1
+    assert sample_store._HYDRATE_LOCKS == {}
+
+
+def test_unknown_ids_are_probed_once_per_ttl(repo, monkeypatch):
+    sensor = "store-unknown"
+    for _ in range(50):
+        assert sample_store.version(sensor) == (0, 0)
+        assert sample_store.snapshot(sensor)[0].size == 0
+    assert repo.probes == 1
+
+    monkeypatch.setattr(sample_store, "SAMPLE_MISS_TTL_S", 0.0)  # expired: probe again
+    sample_store.version(sensor)
+    assert repo.probes == 2
+
+
+def test_a_write_forgets_the_miss(repo):
+    sensor = "store-miss-then-write"
+    sample_store.version(sensor)
+    sample_store.append(sensor, 1_700_000_000.0, 1.0).result()
+    assert sensor not in sample_store._MISSES
+    assert sample_store.snapshot(sensor)[1].tolist() == [1.0]
+    assert repo.probes == 2 and sensor in sample_store._HYDRATED
+
+
+def test_miss_cache_is_bounded(repo, monkeypatch):
+    monkeypatch.setattr(sample_store, "SAMPLE_MISS_MAX", 3)
+    for i in range(6):
+        sample_store.hydrate(f"store-bounded-{i}")
+    assert list(sample_store._MISSES)[-3:] == [f"store-bounded-{i}" for i in (3, 4, 5)]
+    assert len(sample_store._MISSES) == 3
+    sample_store.hydrate("store-bounded-0")  # evicted: probed again
+    assert repo.probes == 7
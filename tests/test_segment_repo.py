@@ -0,0 +1,107 @@
+"""Segment sample storage (apps/sidecar/repositories/storage/segment_repo.py)."""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pytest
+
+from apps.sidecar.repositories.storage import segment_repo
+from apps.sidecar.repositories.storage.segment_repo import SegmentSampleRepo
+from apps.sidecar.repositories.storage.sample_repo import SqliteSampleRepo
+
+BASE = 1_700_000_000.0
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_repo, "SEGMENT_SPAN_S", 100.0)
+    monkeypatch.setattr(segment_repo, "SEGMENT_INDEX_STRIDE", 8)
+    return SegmentSampleRepo(str(tmp_path / "segments"))
+
+
+def _put(repo, sensor, ts, vs):
+    repo.submit_samples([(sensor, float(t), float(v)) for t, v in zip(ts, vs)]).result()
+
+
+def _segs(repo, sensor):
+    series = repo._series(sensor)
+    series.refresh()
+    return series.segments
+
+
+def test_append_rolls_segments_and_range_reads(repo):
+    ts = BASE + np.arange(350.0)
+    _put(repo, "seg-range", ts, ts - BASE)
+    assert [s.count for s in _segs(repo, "seg-range")] == [100, 100, 100, 50]
+
+    got_t, got_v = repo.get_arrays("seg-range")
+    assert np.array_equal(got_t, ts) and np.array_equal(got_v, ts - BASE)
+    got_t, _ = repo.get_arrays("seg-range", BASE + 95.0, BASE + 205.0)  # across three segments
+    assert got_t.tolist() == (BASE + np.arange(95.0, 206.0)).tolist()
+    got_t, _ = repo.get_arrays("seg-range", BASE + 10.5, BASE + 19.5)  # inside one: zero-copy view
+    assert got_t.tolist() == (BASE + np.arange(11.0, 20.0)).tolist() and not got_t.flags.owndata
+    got_t, _ = repo.get_arrays("seg-range", BASE + 90.0, limit=5)
+    assert got_t.tolist() == (BASE + np.arange(345.0, 350.0)).tolist()
+    assert repo.get_latest("seg-range") == (BASE + 349.0, 349.0)
+    chunks = list(repo.iter_series("seg-range", BASE + 50.0, BASE + 149.0, chunk_rows=30))
+    assert [c[0].size for c in chunks] == [30, 20, 30, 20]
+    assert "seg-range" in repo.sensor_ids()
+
+
+def test_rewrite_wins_and_replays_are_dropped(repo):
+    ts = BASE + np.arange(20.0)
+    _put(repo, "seg-rewrite", ts, np.zeros(20))
+    _put(repo, "seg-rewrite", ts, np.zeros(20))  # retried batch
+    assert len(_segs(repo, "seg-rewrite")) == 1
+    _put(repo, "seg-rewrite", [BASE + 5.0], [7.0])  # late rewrite: newer segment
+    assert len(_segs(repo, "seg-rewrite")) == 2
+    _t, vs = repo.get_arrays("seg-rewrite")
+    assert vs.size == 20 and vs[5] == 7.0 and vs.sum() == 7.0
+
+
+def test_compaction_merges_overlaps_keeping_the_newest_values(repo):
+    _put(repo, "seg-compact", BASE + np.arange(50.0), np.zeros(50))
+    _put(repo, "seg-compact", BASE + np.arange(10.0, 20.0), np.ones(10))
+    _put(repo, "seg-compact", [BASE + 200.0], [2.0])  # not overlapping: left alone
+    before = repo.get_arrays("seg-compact")
+    assert len(_segs(repo, "seg-compact")) == 3
+
+    assert repo.compact("seg-compact") == 1
+    assert [s.count for s in _segs(repo, "seg-compact")] == [50, 1]
+    after = repo.get_arrays("seg-compact")
+    assert np.array_equal(before[0], after[0]) and np.array_equal(before[1], after[1])
+    assert after[1][10:20].tolist() == [1.0] * 10
+    assert repo.compact("seg-compact") == 0
+
+
+def test_torn_tail_is_ignored_then_truncated(repo):
+    _put(repo, "seg-torn", BASE + np.arange(10.0), np.arange(10.0))
+    path = _segs(repo, "seg-torn")[-1].path
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03\x04\x05")  # crashed mid-record
+    segment_repo._SERIES.clear()  # as after a restart
+
+    ts, _ = repo.get_arrays("seg-torn")
+    assert ts.size == 10
+    _put(repo, "seg-torn", [BASE + 10.0], [10.0])
+    assert os.path.getsize(path) == 11 * segment_repo.REC.itemsize
+    ts, vs = repo.get_arrays("seg-torn")
+    assert ts.tolist() == (BASE + np.arange(11.0)).tolist() and vs.tolist() == list(np.arange(11.0))
+
+
+def test_import_does_not_override_samples_ingested_meanwhile(repo):
+    sensor = "seg-import"
+    SqliteSampleRepo().add_samples([(sensor, BASE + i, 0.0) for i in range(10)])
+    _put(repo, sensor, [BASE + 5.0], [99.0])  # live ingest started before the import ran
+
+    assert repo.import_sqlite() >= 9
+    ts, vs = repo.get_arrays(sensor)
+    assert ts.tolist() == (BASE + np.arange(10.0)).tolist()
+    assert vs[5] == 99.0 and vs.sum() == 99.0
+
+    os.unlink(os.path.join(repo.root, ".imported"))  # interrupted before the marker: rerun
+    n = len(_segs(repo, sensor))
+    repo.import_sqlite()
+    assert len(_segs(repo, sensor)) == n
+    assert repo.get_arrays(sensor)[1].sum() == 99.0